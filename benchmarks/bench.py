@@ -0,0 +1,305 @@
+"""
+
+    Benchmark suite for the recommender system.
+
+    Author: Explore Data Science Academy.
+
+    Description: Measures `load_movie_titles`, `content_model`,
+    `collab_model`, their batch variants and model training on the
+    bundled data and on synthetic MovieLens-like datasets of 1M, 10M and
+    25M ratings. Every job runs in a fresh process with the dataset as
+    its working directory, so "cold" latencies include the lazy loading a
+    newly started app pays, and peak RSS is per job. Results are written
+    as JSON (commit, machine and one record per metric) so runs from two
+    commits can be compared with `--compare`.
+
+    Usage: python -m benchmarks.bench [--datasets bundled,1m] [--repeat 50]
+               [--batch 1000] [--train] [--output results.json]
+               [--compare baseline.json]
+
+"""
+# Script dependencies
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'data')
+SCALES = {'1m': 1000000, '10m': 10000000, '25m': 25000000}
+GENRES = ('Action', 'Adventure', 'Animation', 'Children', 'Comedy', 'Crime', 'Documentary',
+          'Drama', 'Fantasy', 'Film-Noir', 'Horror', 'IMAX', 'Musical', 'Mystery', 'Romance',
+          'Sci-Fi', 'Thriller', 'War', 'Western')
+
+
+def _peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def _latency_summary(samples):
+    """Percentiles (ms) of a list of latencies in seconds."""
+    ms = np.asarray(samples) * 1000
+    return {'p50_ms': float(np.percentile(ms, 50)), 'p90_ms': float(np.percentile(ms, 90)),
+            'p99_ms': float(np.percentile(ms, 99)), 'mean_ms': float(ms.mean()),
+            'n': int(ms.shape[0])}
+
+
+def make_synthetic(n_ratings, directory, seed=0, chunk_size=1000000):
+    """Write a MovieLens-like dataset under `directory/resources/data`.
+
+    User and movie popularity follow Zipf-like distributions and ratings
+    are a noisy sum of user and movie biases, on the MovieLens half-star
+    scale. Ratings are generated and written chunk by chunk.
+
+    Parameters
+    ----------
+    n_ratings : int
+        Number of ratings to generate.
+    directory : str
+        Dataset root, used as the working directory of benchmark jobs.
+    seed : int
+        Random seed.
+    chunk_size : int
+        Ratings generated per chunk.
+
+    """
+    data_dir = os.path.join(directory, 'resources', 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    # Roughly the MovieLens 25M proportions of users and movies
+    n_users = max(1000, n_ratings // 150)
+    n_items = max(500, int(12 * np.sqrt(n_ratings)))
+
+    years = rng.integers(1920, 2020, n_items)
+    n_genres = rng.integers(1, 4, n_items)
+    genres = ['|'.join(rng.choice(GENRES, size=k, replace=False)) for k in n_genres]
+    pd.DataFrame({'movieId': np.arange(1, n_items + 1),
+                  'title': [f"Synthetic Movie {i} ({year})" for i, year in enumerate(years, start=1)],
+                  'genres': genres}).to_csv(os.path.join(data_dir, 'movies.csv'), index=False)
+
+    def popularity(n):
+        weights = 1.0 / (np.arange(n) + 10.0) ** 0.9
+        return rng.permutation(weights / weights.sum())
+
+    user_p, item_p = popularity(n_users), popularity(n_items)
+    user_bias = rng.normal(0, 0.5, n_users)
+    item_bias = rng.normal(0, 0.7, n_items)
+    ratings_path = os.path.join(data_dir, 'ratings.csv')
+    tmp_path = ratings_path + '.tmp'
+    written = 0
+    while written < n_ratings:
+        size = min(chunk_size, n_ratings - written)
+        users = rng.choice(n_users, size=size, p=user_p)
+        items = rng.choice(n_items, size=size, p=item_p)
+        raw = 3.5 + user_bias[users] + item_bias[items] + rng.normal(0, 0.8, size)
+        ratings = np.clip(np.round(raw * 2) / 2, 0.5, 5.0)
+        pd.DataFrame({'userId': users + 1, 'movieId': items + 1, 'rating': ratings,
+                      'timestamp': rng.integers(789652009, 1574327703, size)}).to_csv(
+            tmp_path, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+        written += size
+    os.replace(tmp_path, ratings_path)
+
+
+def _queries(n, size=3, seed=0):
+    """`n` random favourite lists drawn from the rated movies."""
+    from utils.registry import registry
+    rng = np.random.default_rng(seed)
+    rated = pd.unique(registry.get('ratings')['movieId'])
+    catalog = registry.get('catalog')
+    return [catalog.titles(rng.choice(rated, size=size, replace=False)) for _ in range(n)]
+
+
+def run_serving(repeat=50, batch=1000, top_n=10):
+    """Serving benchmarks, run inside a job process."""
+    results = {}
+    start = time.perf_counter()
+    from utils.data_loader import MOVIES_PATH, load_movie_titles
+    from recommenders.content_based import content_model, content_model_batch
+    from recommenders.collaborative_based import collab_model, collab_model_batch
+    results['startup'] = {'import_s': time.perf_counter() - start}
+
+    samples = []
+    for _ in range(repeat + 1):
+        tick = time.perf_counter()
+        load_movie_titles(MOVIES_PATH)
+        samples.append(time.perf_counter() - tick)
+    results['load_movie_titles'] = {'cold_ms': samples[0] * 1000, **_latency_summary(samples[1:])}
+
+    queries = _queries(max(repeat, batch) + 1)
+    for name, model, model_batch in (('content_model', content_model, content_model_batch),
+                                     ('collab_model', collab_model, collab_model_batch)):
+        samples = []
+        for movie_list in queries[:repeat + 1]:
+            tick = time.perf_counter()
+            model(movie_list, top_n)
+            samples.append(time.perf_counter() - tick)
+        results[name] = {'cold_ms': samples[0] * 1000, **_latency_summary(samples[1:])}
+        tick = time.perf_counter()
+        model_batch(queries[1:batch + 1], top_n=top_n)
+        elapsed = time.perf_counter() - tick
+        results[name + '_batch'] = {'queries': batch, 'seconds': elapsed,
+                                    'queries_per_s': batch / max(elapsed, 1e-9)}
+    results['startup']['ready_s'] = time.perf_counter() - start
+    return results
+
+
+def run_training(epochs=2, factors=32, export=True):
+    """Training benchmark, run inside a job process.
+
+    With `export`, the model is written as the dataset's model bundle so
+    the serving job has a collaborative model to load.
+
+    """
+    from utils.data_loader import load_ratings
+    from recommenders.mf_trainer import train, training_meta
+    from recommenders.model_bundle import BUNDLE_DIR, export_bundle
+    tick = time.perf_counter()
+    ratings_df = load_ratings(columns=['userId', 'movieId', 'rating', 'timestamp'])
+    load_s = time.perf_counter() - tick
+    tick = time.perf_counter()
+    scorer = train(ratings_df, n_factors=factors, n_epochs=epochs, verbose=False)
+    train_s = time.perf_counter() - tick
+    if export:
+        export_bundle(scorer, BUNDLE_DIR, extra=training_meta(ratings_df))
+    return {'train': {'ratings': int(len(ratings_df)), 'epochs': epochs, 'factors': factors,
+                      'load_s': load_s, 'train_s': train_s, 'epoch_s': train_s / epochs,
+                      'ratings_per_s': len(ratings_df) * epochs / max(train_s, 1e-9)}}
+
+
+def _run_job(job, cwd, args):
+    """Run one benchmark job in a fresh interpreter and return its results."""
+    command = [sys.executable, '-m', 'benchmarks.bench', '--job', job,
+               '--repeat', str(args.repeat), '--batch', str(args.batch),
+               '--epochs', str(args.epochs), '--factors', str(args.factors)]
+    if cwd == REPO_ROOT:
+        command.append('--no-export')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [REPO_ROOT] + [p for p in [os.environ.get('PYTHONPATH')] if p]))
+    # Benchmark the models themselves, not the result cache or warm-up
+    env['RECOMMENDER_WARM_UP'] = '0'
+    env.pop('RECOMMENDER_RESULT_CACHE', None)
+    tick = time.perf_counter()
+    completed = subprocess.run(command, cwd=cwd, env=env, stdout=subprocess.PIPE, check=True,
+                               universal_newlines=True)
+    wall_s = time.perf_counter() - tick
+    results = json.loads(completed.stdout.strip().splitlines()[-1])
+    results['process'] = {'wall_s': wall_s, 'peak_rss_mb': results.pop('peak_rss_mb')}
+    return results
+
+
+def _dataset_dir(name, data_dir):
+    if name == 'bundled':
+        return REPO_ROOT
+    directory = os.path.join(data_dir, name)
+    if not os.path.exists(os.path.join(directory, 'resources', 'data', 'ratings.csv')):
+        print(f"Generating the {name} dataset in: {directory}", file=sys.stderr)
+        make_synthetic(SCALES[name], directory)
+    return directory
+
+
+def _records(dataset, job, results):
+    # Flatten {benchmark: {metric: value}} into one record per metric
+    return [{'dataset': dataset, 'job': job, 'benchmark': benchmark, 'metric': metric,
+             'value': value}
+            for benchmark, metrics in results.items() for metric, value in metrics.items()]
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    """Run every requested dataset and job; returns the report dict."""
+    report = {'commit': _commit(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'platform': platform.platform(),
+              'cpus': os.cpu_count(), 'results': []}
+    for dataset in args.datasets:
+        cwd = _dataset_dir(dataset, args.data_dir)
+        jobs = ['serve']
+        if dataset != 'bundled':
+            # Synthetic datasets need a trained bundle before serving
+            jobs.insert(0, 'train')
+        elif args.train:
+            jobs.append('train')
+        for job in jobs:
+            print(f"Running {job} on {dataset}", file=sys.stderr)
+            report['results'].extend(_records(dataset, job, _run_job(job, cwd, args)))
+    return report
+
+
+def compare(report, baseline_path, threshold=0.1):
+    """Print metrics that changed by more than `threshold` vs a baseline."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = {(r['dataset'], r['job'], r['benchmark'], r['metric']): r['value']
+           for r in baseline['results']}
+    print(f"Comparing {report['commit']} against {baseline.get('commit')}:")
+    for record in report['results']:
+        key = (record['dataset'], record['job'], record['benchmark'], record['metric'])
+        before, after = old.get(key), record['value']
+        if not before or not isinstance(after, (int, float)) or key[3] in ('n', 'queries'):
+            continue
+        change = after / before - 1
+        if abs(change) > threshold:
+            print(f"  {'/'.join(key)}: {before:.4g} -> {after:.4g} ({change:+.0%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the recommender system.')
+    parser.add_argument('--datasets', default='bundled',
+                        help="Comma-separated subset of: bundled, " + ', '.join(SCALES))
+    parser.add_argument('--data-dir', default=DATA_DIR,
+                        help='Where synthetic datasets are generated and kept.')
+    parser.add_argument('--repeat', type=int, default=50, help='Warm calls per entry point.')
+    parser.add_argument('--batch', type=int, default=1000, help='Queries per batch call.')
+    parser.add_argument('--train', action='store_true',
+                        help='Also benchmark training on the bundled data.')
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--factors', type=int, default=32)
+    parser.add_argument('--output', default=None, help='JSON results file (default: stdout).')
+    parser.add_argument('--compare', default=None, help='Baseline results to compare against.')
+    parser.add_argument('--job', choices=('serve', 'train'), default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--no-export', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.job is not None:
+        # Inside a job process: print the results as the last line
+        if args.job == 'serve':
+            results = run_serving(repeat=args.repeat, batch=args.batch)
+        else:
+            results = run_training(epochs=args.epochs, factors=args.factors,
+                                   export=not args.no_export)
+        results['peak_rss_mb'] = _peak_rss_mb()
+        print(json.dumps(results))
+        return
+
+    args.datasets = [name.strip().lower() for name in args.datasets.split(',') if name.strip()]
+    unknown = [name for name in args.datasets if name != 'bundled' and name not in SCALES]
+    if unknown:
+        parser.error(f"Unknown datasets: {', '.join(unknown)}")
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to: {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+
+    Load test for the local recommendation service.
+
+    Author: Explore Data Science Academy.
+
+    Description: Fires random three-movie favourite lists at a running
+    `recommenders.service` from a number of concurrent clients and
+    reports throughput, client-side latency percentiles, errors and the
+    service's own batch statistics (from /latency) as JSON. Start the
+    service first, e.g. `python -m recommenders.service`.
+
+    Usage: python -m benchmarks.load_test [--url http://127.0.0.1:8502]
+               [--concurrency 16] [--requests 2000]
+               [--algorithm collab|content|mixed] [--output results.json]
+
+"""
+# Script dependencies
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench import _latency_summary
+from recommenders.service_client import ServiceClient, ServiceError
+from utils.data_loader import MOVIES_PATH
+
+
+def make_queries(n, movies_path=MOVIES_PATH, size=3, algorithm='collab', seed=0):
+    """`n` (algorithm, favourite titles) pairs drawn from the catalogue."""
+    rng = np.random.default_rng(seed)
+    titles = pd.read_csv(movies_path, usecols=['title'])['title'].to_numpy()
+    algorithms = ('collab', 'content') if algorithm == 'mixed' else (algorithm,)
+    return [(algorithms[i % len(algorithms)],
+             list(rng.choice(titles, size=size, replace=False))) for i in range(n)]
+
+
+def run(url, queries, concurrency=16, top_n=10, timeout=60.0):
+    """Send every query with `concurrency` clients; returns a report dict."""
+    client = ServiceClient(url, timeout=timeout)
+    health = client.health()
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+
+    def send(query):
+        algorithm, movies = query
+        start = time.perf_counter()
+        try:
+            client.recommend(algorithm, movies, top_n)
+        except ServiceError as error:
+            with lock:
+                key = str(error).split(':')[0]
+                errors[key] = errors.get(key, 0) + 1
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, queries))
+    wall = time.perf_counter() - start
+    report = {'url': url, 'concurrency': concurrency, 'requests': len(queries),
+              'ok': len(latencies), 'errors': errors, 'wall_s': wall,
+              'requests_per_s': len(queries) / wall, 'health_before': health}
+    if latencies:
+        report['latency'] = _latency_summary(latencies)
+    report['service'] = client.latency()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the recommendation service.')
+    parser.add_argument('--url', default='http://127.0.0.1:8502')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--algorithm', choices=('collab', 'content', 'mixed'),
+                        default='mixed')
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the report here instead of stdout.')
+    args = parser.parse_args(argv)
+    queries = make_queries(args.requests, algorithm=args.algorithm, seed=args.seed)
+    report = run(args.url, queries, concurrency=args.concurrency, top_n=args.top_n)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    print(f"{report['requests_per_s']:.0f} requests/s, "
+          f"p99 {report.get('latency', {}).get('p99_ms', float('nan')):.1f} ms",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -33,19 +33,170 @@ import pandas as pd
 import numpy as np
 
 # Custom Libraries
+import os
+import uuid
 from utils.data_loader import load_movie_titles
-from recommenders.collaborative_based import collab_model
-from recommenders.content_based import content_model
+from utils.registry import registry
+from recommenders.collaborative_based import collab_model as local_collab_model
+from recommenders.content_based import content_model as local_content_model
+from utils.result_cache import cached_model
+from utils.instrumentation import instrumentation
+from utils import speculation
+from utils.shared_store import shared_store
+from recommenders.service_client import ServiceClient
+
+# With RECOMMENDER_SERVICE_URL set (e.g. http://127.0.0.1:8502, see
+# recommenders/service.py) the app is a thin client: recommendations come
+# from the shared service and no models are loaded in this process.
+SERVICE_URL = os.environ.get('RECOMMENDER_SERVICE_URL')
+service = ServiceClient(SERVICE_URL) if SERVICE_URL else None
+collab_impl = service.model('collab') if SERVICE_URL else local_collab_model
+content_impl = service.model('content') if SERVICE_URL else local_content_model
+
+# Serve repeated favourite combinations from the recommendation cache
+collab_model = cached_model('collab', collab_impl)
+content_model = cached_model('content', content_impl)
+
+def search_titles(query, limit=10):
+    """Catalogue titles matching a query, from the service when there is one."""
+    if service is not None:
+        return service.search(query, limit)
+    return registry.get('title_search').search(query, limit=limit)
 
 # Data Loading
-title_list = load_movie_titles('resources/data/movies.csv')
+registry.register('title_list', lambda: load_movie_titles('resources/data/movies.csv'))
+
+# The favourite selectboxes below only offer fixed slices of `title_list`:
+# label, start and stop of each. The labels are the selectboxes' own
+# (spelling included), so the search box names the widget the user sees.
+FAVOURITE_SLOTS = (('Fisrt Option', 14930, 15200),
+                   ('Second Option', 25055, 25255),
+                   ('Third Option', 21100, 21200))
+
+def favourite_title_list(titles, searched):
+    """Title list whose favourite slices start with the searched titles.
+
+    Titles found with the search box lead the options of the selectbox
+    they were added to, so any movie can be picked without sending all
+    titles to the browser. Each slice keeps its length: titles at its
+    end make room for the searched ones.
+
+    Parameters
+    ----------
+    titles : list (str)
+        Every movie title.
+    searched : dict
+        Slot number -> titles added to that selectbox, newest first.
+
+    Returns
+    -------
+    list (str)
+        Copy of `titles` with the favourite slices rearranged.
+
+    """
+    options = list(titles)
+    for slot, (_, start, stop) in enumerate(FAVOURITE_SLOTS):
+        picks = searched.get(slot, [])
+        if picks:
+            ordered = picks + [title for title in titles[start:stop] if title not in picks]
+            options[start:stop] = ordered[:stop - start]
+    return options
+
+# Rebuilt on every rerun of the script from this session's searched titles
+title_list = favourite_title_list(registry.get('title_list'),
+                                  st.session_state.get('searched_titles', {}))
+# Models and datasets load lazily on first use; unless disabled, start
+# loading them on a background thread so the first recommendation is fast.
+if os.environ.get('RECOMMENDER_WARM_UP', '1') == '1' and not SERVICE_URL:
+    registry.warm_up(background=True)
+# While favourites are being picked, compute both algorithms' results for
+# the current selection in the background; the Recommend button then
+# finds them in (or waits on) the recommendation cache.
+speculator = None
+if os.environ.get('RECOMMENDER_SPECULATE', '1') == '1':
+    # The process-wide instance, so reruns keep each session's job to cancel
+    speculator = speculation.speculator
+    speculator.register('Content Based Filtering', content_model)
+    speculator.register('Collaborative Based Filtering', collab_model)
+
+def session_id():
+    """Stable identifier of the current browser session."""
+    if 'session_id' not in st.session_state:
+        st.session_state['session_id'] = uuid.uuid4().hex
+    return st.session_state['session_id']
+
+def add_searched_title(title, slot):
+    """Offer `title` first in favourite selectbox number `slot`."""
+    searched = st.session_state.setdefault('searched_titles', {})
+    picks = [title] + [pick for pick in searched.get(slot, []) if pick != title]
+    searched[slot] = picks[:10]
+
+def title_search_box():
+    """Search every title and add a match to a favourite selectbox."""
+    st.write('### Looking for another movie?')
+    query = st.text_input("Search all movies", key='title_query')
+    if not query:
+        return
+    matches = search_titles(query, limit=10)
+    if not matches:
+        st.write("No matching movies found.")
+        return
+    title = st.selectbox("Matching movies", matches, key='title_match')
+    slot = st.selectbox("Offer it as", range(len(FAVOURITE_SLOTS)),
+                        format_func=lambda i: FAVOURITE_SLOTS[i][0], key='title_slot')
+    st.button("Add to favourite options", on_click=add_searched_title, args=(title, slot))
+
+def diagnostics_page():
+    """Per-stage timings, resource loads and cache statistics."""
+    st.title("Diagnostics")
+    enabled = st.checkbox("Record stage timings and memory", value=instrumentation.enabled)
+    instrumentation.set_enabled(enabled)
+
+    st.write("### Stage timings")
+    stages = pd.DataFrame(instrumentation.snapshot())
+    if stages.empty:
+        st.write("Nothing recorded yet - request some recommendations first.")
+    else:
+        st.dataframe(stages.set_index('stage').round(2))
+
+    st.write("### Resource loads (seconds)")
+    loads = registry.timings()
+    st.dataframe(pd.Series(loads, name='seconds', dtype=float).round(3))
+    st.write("### Recommendation cache")
+    st.json(collab_model.cache.stats())
+    if SERVICE_URL:
+        st.write("### Recommendation service")
+        try:
+            st.json({'health': service.health(), 'latency': service.latency()})
+        except Exception as error:
+            st.error(f"Recommendation service unavailable: {error}")
+    st.write("### Shared array segments")
+    segments = pd.DataFrame(shared_store.segments())
+    if segments.empty:
+        st.write("No arrays published to the shared store yet.")
+    else:
+        st.dataframe(segments.round(2))
+    if speculator is not None:
+        st.write("### Speculative precomputation")
+        st.json(speculator.stats())
+
+    st.download_button("Export as JSON", instrumentation.export_json(),
+                       file_name='stage_timings.json', mime='application/json')
+    st.download_button("Export as Prometheus text", instrumentation.prometheus_text(),
+                       file_name='stage_timings.prom', mime='text/plain')
+    if st.button("Reset timings"):
+        instrumentation.reset()
 
 # App declaration
 def main():
 
     # DO NOT REMOVE the 'Recommender System' option below, however,
     # you are welcome to add more options to enrich your app.
-    page_options = ["Recommender System","Solution Overview"]
+    page_options = ["Recommender System","Solution Overview","Diagnostics"]
+    # The title search feeds the favourite selectboxes, so it sits at the
+    # top of the page, above the title; it is filled in below, once the
+    # page is known.
+    search_area = st.container()
 
     # -------------------------------------------------------------------
     # ----------- !! THIS CODE MUST NOT BE ALTERED !! -------------------
@@ -100,10 +251,21 @@ def main():
     # -------------------------------------------------------------------
 
     # ------------- SAFE FOR ALTERING/EXTENSION -------------------
+    if page_selection == "Recommender System" and speculator is not None:
+        # Every selectbox change reruns the script; start on the new
+        # selection (cancelling this session's stale work) right away.
+        speculator.speculate(session_id(), fav_movies, top_n=10)
+    if page_selection == "Recommender System":
+        with search_area:
+            title_search_box()
+
     if page_selection == "Solution Overview":
         st.title("Solution Overview")
         st.write("Describe your winning approach on this page")
 
+    if page_selection == "Diagnostics":
+        diagnostics_page()
+
     # You may want to add more sections here for aspects such as an EDA,
     # or to provide your business pitch.
 
@@ -0,0 +1,279 @@
+"""
+
+    Approximate nearest-neighbour index over SVD item factors.
+
+    Author: Explore Data Science Academy.
+
+    Description: An IVF (inverted file) index over the `qi` item factor
+    matrix of the SVD model. Items are clustered with spherical k-means
+    into `n_lists` coarse cells; a query only scans the items of the
+    `n_probe` cells closest to it, so query time grows with the size of a
+    few cells rather than the whole catalogue. `n_probe` is the recall vs
+    latency knob: probing every cell is an exact search.
+
+    The index is stored as plain `.npy` arrays in a directory next to the
+    model so it can be memory-mapped and shared between processes; a
+    rebuilt index is swapped in atomically (see `utils.atomic_dir`).
+
+"""
+# Script dependencies
+import os
+import json
+import numpy as np
+
+from recommenders.svd_engine import top_k
+from utils.atomic_dir import new_version, publish, resolve, write_lock
+
+INDEX_DIR = 'resources/models/ann_index'
+FORMAT_VERSION = 1
+
+
+def _normalise(vectors):
+    """Scale rows to unit length, leaving all-zero rows untouched."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _assign(vectors, centroids, chunk_size=65536):
+    """Index of the most similar centroid for each (unit) vector."""
+    labels = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], chunk_size):
+        block = vectors[start:start + chunk_size]
+        labels[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+class IVFIndex:
+    """Inverted file index over unit-normalised item vectors.
+
+    Parameters
+    ----------
+    centroids : np.ndarray
+        Unit-normalised cell centroids, shape (n_lists, n_factors).
+    list_offsets : np.ndarray
+        Start of each cell within `list_items`, shape (n_lists + 1,).
+    list_items : np.ndarray
+        Item positions grouped by cell.
+    vectors : np.ndarray
+        Unit-normalised item vectors, shape (n_items, n_factors).
+    raw_iids : np.ndarray
+        MovieLens movie id of each item position.
+    n_probe : int
+        Default number of cells scanned per query.
+
+    """
+
+    def __init__(self, centroids, list_offsets, list_items, vectors, raw_iids,
+                 n_probe=8, fingerprint=None):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_items = list_items
+        self.vectors = vectors
+        self.raw_iids = raw_iids
+        self.n_probe = n_probe
+        self.fingerprint = fingerprint
+        self._positions = None
+
+    @property
+    def n_lists(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, item_factors, raw_iids, n_lists=None, n_iter=10,
+              sample_size=20000, n_probe=8, seed=0, fingerprint=None):
+        """Cluster the item factors and build the inverted lists.
+
+        Parameters
+        ----------
+        item_factors : np.ndarray
+            The SVD `qi` matrix, one row per item.
+        raw_iids : np.ndarray
+            MovieLens movie id of each row.
+        n_lists : int, optional
+            Number of cells, defaults to about 4 * sqrt(n_items).
+        n_iter : int
+            Spherical k-means iterations.
+        sample_size : int
+            Number of items the centroids are trained on.
+        n_probe : int
+            Default number of cells scanned per query.
+        seed : int
+            Seed for centroid initialisation and sampling.
+
+        Returns
+        -------
+        IVFIndex
+            The built index.
+
+        """
+        vectors = _normalise(item_factors)
+        n_items = vectors.shape[0]
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(n_items))
+        n_lists = max(1, min(n_lists, n_items))
+
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if n_items > sample_size:
+            sample = vectors[rng.choice(n_items, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            labels = _assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            # Empty cells keep their previous centroid
+            filled = counts > 0
+            centroids[filled] = _normalise(sums[filled])
+
+        labels = _assign(vectors, centroids)
+        list_items = np.argsort(labels, kind='stable').astype(np.int32)
+        counts = np.bincount(labels, minlength=n_lists)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(counts, out=list_offsets[1:])
+        return cls(centroids, list_offsets, list_items, vectors,
+                   np.asarray(raw_iids), n_probe=n_probe, fingerprint=fingerprint)
+
+    def positions(self, raw_iids):
+        """Item positions of the given movie ids (-1 where unknown)."""
+        if self._positions is None:
+            self._positions = {raw: pos for pos, raw in enumerate(np.asarray(self.raw_iids).tolist())}
+        return np.array([self._positions.get(raw, -1) for raw in raw_iids], dtype=np.int64)
+
+    def search(self, query, k=10, n_probe=None, exclude=None):
+        """Approximate top-k items by cosine similarity to `query`.
+
+        Parameters
+        ----------
+        query : np.ndarray
+            Query vector in item factor space.
+        k : int
+            Number of items to return.
+        n_probe : int, optional
+            Cells to scan, overriding the index default. Higher values
+            trade latency for recall.
+        exclude : iterable (int), optional
+            Item positions never returned (e.g. the query items).
+
+        Returns
+        -------
+        tuple (np.ndarray, np.ndarray)
+            Item positions and similarities, best first.
+
+        """
+        n_probe = self.n_probe if n_probe is None else n_probe
+        query = _normalise(query).ravel()
+        cells = top_k(self.centroids @ query, min(n_probe, self.n_lists))
+        candidates = np.concatenate(
+            [self.list_items[self.list_offsets[c]:self.list_offsets[c + 1]] for c in cells])
+        if exclude is not None and len(exclude):
+            candidates = candidates[~np.isin(candidates, np.asarray(exclude))]
+        sims = self.vectors[candidates] @ query
+        best = top_k(sims, k)
+        return candidates[best].astype(np.int64), sims[best]
+
+    def similar_items(self, raw_iids, k=10, n_probe=None):
+        """Items most similar to a set of favourite movies.
+
+        The query is the mean of the favourites' unit vectors and the
+        favourites themselves are excluded from the results.
+
+        Parameters
+        ----------
+        raw_iids : list (int)
+            MovieLens ids of the favourite movies.
+        k : int
+            Number of items to return.
+        n_probe : int, optional
+            Cells to scan per query.
+
+        Returns
+        -------
+        tuple (np.ndarray, np.ndarray)
+            MovieLens ids and similarities, best first.
+
+        """
+        seeds = self.positions(raw_iids)
+        seeds = seeds[seeds >= 0]
+        if seeds.shape[0] == 0:
+            return np.empty(0, dtype=np.asarray(self.raw_iids).dtype), np.empty(0, dtype=np.float32)
+        query = np.asarray(self.vectors[seeds]).mean(axis=0)
+        items, sims = self.search(query, k=k, n_probe=n_probe, exclude=seeds)
+        return np.asarray(self.raw_iids)[items], sims
+
+    def save(self, directory=INDEX_DIR):
+        """Write the index as `.npy` arrays plus a small JSON header.
+
+        Everything is written to a new version directory, and `directory`
+        is switched to it in one step, so readers never mix the arrays of
+        two builds.
+
+        """
+        arrays = {'centroids': self.centroids, 'list_offsets': self.list_offsets,
+                  'list_items': self.list_items, 'vectors': self.vectors,
+                  'raw_iids': np.asarray(self.raw_iids)}
+        meta = {'version': FORMAT_VERSION, 'n_probe': int(self.n_probe),
+                'fingerprint': None if self.fingerprint is None else [str(v) for v in self.fingerprint]}
+        with write_lock(directory):
+            tmp_dir = new_version(directory)
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, name + '.npy'), np.ascontiguousarray(array))
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            publish(tmp_dir, directory)
+
+    @classmethod
+    def load(cls, directory=INDEX_DIR, mmap_mode='r'):
+        """Load an index written by `save`, memory-mapped by default."""
+        directory = resolve(directory)
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported ANN index version: {meta.get('version')}")
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in ('centroids', 'list_offsets', 'list_items', 'vectors', 'raw_iids')}
+        fingerprint = meta.get('fingerprint')
+        return cls(n_probe=meta['n_probe'],
+                   fingerprint=None if fingerprint is None else np.array(fingerprint, dtype=str),
+                   **arrays)
+
+
+def load_ann_index(scorer, fingerprint, directory=INDEX_DIR, persist=True):
+    """Load the ANN index for the current model.
+
+    A saved index is memory-mapped when it was built from the model with
+    `fingerprint`, otherwise one is built from `scorer` and saved. The
+    registry's 'ann_index' entry calls this once per model version.
+
+    Parameters
+    ----------
+    scorer : recommenders.svd_engine.SVDScorer
+        Scorer holding the model's item factors.
+    fingerprint : np.ndarray
+        `source_fingerprint` of the model files `scorer` was loaded from.
+    directory : str
+        Location of the saved index.
+    persist : bool
+        Save a freshly built index to `directory`.
+
+    Returns
+    -------
+    IVFIndex
+        ANN index over the model's item factors.
+
+    """
+    if os.path.exists(os.path.join(directory, 'meta.json')):
+        try:
+            index = IVFIndex.load(directory)
+            if np.array_equal(index.fingerprint, fingerprint):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+    index = IVFIndex.build(scorer.qi, scorer.raw_iids, fingerprint=fingerprint)
+    if persist:
+        try:
+            index.save(directory)
+        except OSError:
+            pass
+    return index
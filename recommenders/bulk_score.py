@@ -0,0 +1,122 @@
+"""
+
+    Offline bulk recommendation scoring.
+
+    Author: Explore Data Science Academy.
+
+    Description: Streams favourite-movie sets from a file, scores them in
+    batches with `collab_model_batch` / `content_model_batch` and writes
+    ranked recommendations to an output file, e.g. for nightly email
+    campaigns. With `--workers N` batches are scored on a pool of N
+    processes; the model bundle is memory-mapped, so workers share it.
+
+    Input: one query per line, either a JSON list of titles, a JSON
+    object {"id": ..., "movies": [...]}, or tab-separated titles.
+    Output: one JSON object per line, in input order:
+    {"id": ..., "movies": [...], "recommendations": [...]}
+    ("recommendations" is null when a favourite could not be resolved).
+
+    Usage: python -m recommenders.bulk_score input.jsonl output.jsonl
+               [--algorithm collab|content] [--top-n 10]
+               [--batch-size 1024] [--workers 1]
+
+"""
+# Script dependencies
+import sys
+import json
+import time
+import argparse
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def parse_line(line, line_no):
+    """Parse one input line into a (query id, favourite titles) pair."""
+    line = line.strip()
+    if line.startswith('{'):
+        record = json.loads(line)
+        return record.get('id', line_no), list(record['movies'])
+    if line.startswith('['):
+        return line_no, list(json.loads(line))
+    return line_no, [title for title in line.split('\t') if title]
+
+
+def read_batches(f, batch_size):
+    """Yield lists of (query id, titles) pairs, skipping blank lines."""
+    queries = (parse_line(line, line_no) for line_no, line in enumerate(f, start=1)
+               if line.strip())
+    while True:
+        batch = list(itertools.islice(queries, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def score_batch(algorithm, batch, top_n):
+    """Score one batch of queries; runs in the main or a worker process."""
+    if algorithm == 'collab':
+        from recommenders.collaborative_based import collab_model_batch as model_batch
+    else:
+        from recommenders.content_based import content_model_batch as model_batch
+    results = model_batch([movies for _, movies in batch], top_n=top_n)
+    return [{'id': query_id, 'movies': movies, 'recommendations': recommended}
+            for (query_id, movies), recommended in zip(batch, results)]
+
+
+def run(input_path, output_path, algorithm='collab', top_n=10, batch_size=1024, workers=1):
+    """Score every query in `input_path` and write `output_path`.
+
+    At most 2 * workers batches are in flight, so memory stays bounded
+    regardless of the input size.
+
+    Returns
+    -------
+    int
+        Number of queries written.
+
+    """
+    written = 0
+    start = time.perf_counter()
+    with open(input_path) as f_in, open(output_path, 'w') as f_out:
+        batches = read_batches(f_in, batch_size)
+
+        def write(records):
+            nonlocal written
+            for record in records:
+                f_out.write(json.dumps(record) + '\n')
+            written += len(records)
+            rate = written / max(time.perf_counter() - start, 1e-9)
+            print(f"{written} queries scored ({rate:.0f}/s)", file=sys.stderr)
+
+        if workers <= 1:
+            for batch in batches:
+                write(score_batch(algorithm, batch, top_n))
+            return written
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.submit(score_batch, algorithm, batch, top_n))
+                if len(pending) >= 2 * workers:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-score favourite movie sets.')
+    parser.add_argument('input', help='Favourite sets, one per line.')
+    parser.add_argument('output', help='Where to write JSON lines of recommendations.')
+    parser.add_argument('--algorithm', choices=('collab', 'content'), default='collab')
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args(argv)
+    run(args.input, args.output, algorithm=args.algorithm, top_n=args.top_n,
+        batch_size=args.batch_size, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,87 +22,164 @@
 
     ---------------------------------------------------------------------
 
-    Description: Provided within this file is a baseline collaborative
-    filtering algorithm for rating predictions on Movie data.
+    Description: Collaborative filtering on the factors of the trained
+    SVD model. The app user is folded into the model as a new user (a
+    regularised least-squares fit against the favourites' item factors)
+    and every movie is scored with one matrix-vector product;
+    `collab_model_batch` does the same for many queries per matrix
+    product. RECOMMENDER_ANN=1 answers instead from an approximate
+    nearest-neighbour index of the item factors, and
+    RECOMMENDER_NEIGHBOURS=1 from precomputed item-item neighbours.
+    Favourites the model has never seen give no user vector to fold in;
+    the most rated movies are recommended instead.
 
 """
 
 # Script dependencies
-import streamlit as st
-import pandas as pd
+import os
+import functools
 import numpy as np
-import scipy as sp
 import pickle
-import copy
-from surprise import Reader, Dataset, SVD
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer
+from recommenders.svd_engine import top_k, top_k_rows
+from recommenders.model_bundle import BUNDLE_DIR, load_scorer
+from utils.data_loader import RATINGS_PATH, source_fingerprint
+from recommenders.ann_index import load_ann_index
+from recommenders.item_neighbours import get_neighbour_table
+from utils.registry import registry
+from utils.instrumentation import stage, timed
 
 # Importing data
-#movies_df = pd.read_csv('/home/explore-student/unsupervised_data/unsupervised_movie_data/movies.csv',sep = ',',delimiter=',')
-#ratings_df = pd.read_csv('/home/explore-student/unsupervised_data/unsupervised_movie_data/train.csv')
-movies_df = pd.read_csv('resources/data/movies.csv',sep = ',')
-ratings_df = pd.read_csv('resources/data/ratings.csv')
-ratings_df.drop(['timestamp'], axis=1, inplace=True)
+# Data and the model are loaded lazily through the resource registry, the
+# first time a recommendation needs them, rather than at import time.
+MODEL_PATH = 'resources/models/SVD.pkl'
 
-# We make use of an SVD model trained on a subset of the MovieLens 10k dataset.
-model=pickle.load(open('resources/models/SVD.pkl', 'rb'))
+@functools.lru_cache(maxsize=1)
+def _load_model():
+    # We make use of an SVD model trained on a subset of the MovieLens 10k dataset.
+    with open(MODEL_PATH, 'rb') as f:
+        return pickle.load(f)
 
-def prediction_item(item_id):
-    """Map a given favourite movie to users within the
-       MovieLens dataset with the same preference.
+# Biases, float32 factors and id maps, memory-mapped from the compact model
+# bundle (exported from SVD.pkl on first use) for vectorised scoring. The
+# scorer is reloaded whenever the pickle or the bundle is replaced, e.g. by
+# an incremental `mf_trainer --update`.
+def _model_version():
+    return source_fingerprint((MODEL_PATH, os.path.join(BUNDLE_DIR, 'meta.json')))
+
+registry.register('svd_scorer', lambda: load_scorer(MODEL_PATH), version=_model_version)
+
+_RESOURCES = {'movies_df': 'movies', 'ratings_df': 'ratings', 'catalog': 'catalog',
+              'scorer': 'svd_scorer'}
+
+def __getattr__(name):
+    # Keep `collaborative_based.model` etc. working as lazy attributes.
+    if name in _RESOURCES:
+        return registry.get(_RESOURCES[name])
+    if name == 'model':
+        return _load_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Set RECOMMENDER_ANN=1 to answer collab_model from the item-factor ANN index.
+USE_ANN_INDEX = os.environ.get('RECOMMENDER_ANN', '0') == '1'
+# Set RECOMMENDER_NEIGHBOURS=1 to answer it from precomputed item-item neighbours.
+USE_NEIGHBOUR_TABLE = os.environ.get('RECOMMENDER_NEIGHBOURS', '0') == '1'
+
+# Built from (or paired with) the current model's item factors; only
+# warmed up when it is actually used.
+registry.register('ann_index', lambda: load_ann_index(registry.get('svd_scorer'), _model_version()),
+                  version=_model_version, warm=USE_ANN_INDEX)
+
+# Building the table is a pass over every rating: only warm it up (ahead
+# of the first request) when it is actually used.
+registry.register('item_neighbours', get_neighbour_table,
+                  version=lambda: source_fingerprint((RATINGS_PATH,)),
+                  warm=USE_NEIGHBOUR_TABLE)
+
+def _movie_popularity():
+    # Movie ids, most rated first (lowest id first on ties)
+    counts = np.bincount(registry.get('ratings')['movieId'].to_numpy())
+    rated = np.flatnonzero(counts)
+    return rated[np.argsort(-counts[rated], kind='stable')]
+
+# Only needed when no favourite is known to the model
+registry.register('movie_popularity', _movie_popularity,
+                  version=lambda: source_fingerprint((RATINGS_PATH,)), warm=False)
+
+@timed('popular')
+def popular_recommendations(movie_list, top_n=10):
+    """Recommend the most rated movies, for favourites the model has
+       no factors for.
 
     Parameters
     ----------
-    item_id : int
-        A MovieLens Movie ID.
+    movie_list : list (str)
+        Favorite movies chosen by the app user.
+    top_n : int
+        Number of top recommendations to return to the user.
 
     Returns
     -------
-    list
-        User IDs of users with similar high ratings for the given movie.
+    list (str)
+        Titles of the top-n most rated movies, favourites excluded.
 
     """
-    # Data preprosessing
-    reader = Reader(rating_scale=(0, 5))
-    load_df = Dataset.load_from_df(ratings_df,reader)
-    a_train = load_df.build_full_trainset()
+    catalog = registry.get('catalog')
+    popular = registry.get('movie_popularity')
+    favourites = catalog.movie_ids(movie_list)
+    candidates = popular[:top_n + len(favourites)]
+    return catalog.titles(candidates[~np.isin(candidates, favourites)][:top_n])
+
+@timed('ann')
+def ann_recommendations(movie_list, top_n=10, n_probe=None):
+    """Recommend the movies whose SVD item factors are closest to the
+       favourites, using the approximate nearest-neighbour index.
+
+    Parameters
+    ----------
+    movie_list : list (str)
+        Favorite movies chosen by the app user.
+    top_n : int
+        Number of top recommendations to return to the user.
+    n_probe : int, optional
+        Index cells scanned per query; higher is slower but more exact.
+
+    Returns
+    -------
+    list (str)
+        Titles of the top-n movie recommendations to the user.
 
-    predictions = []
-    for ui in a_train.all_users():
-        predictions.append(model.predict(iid=item_id,uid=ui, verbose = False))
-    return predictions
+    """
+    catalog = registry.get('catalog')
+    movie_ids = catalog.movie_ids(movie_list)
+    index = registry.get('ann_index')
+    similar_ids, _ = index.similar_items(movie_ids, k=top_n, n_probe=n_probe)
+    return catalog.titles(similar_ids)
 
-def pred_movies(movie_list):
-    """Maps the given favourite movies selected within the app to corresponding
-    users within the MovieLens dataset.
+@timed('neighbours')
+def neighbour_recommendations(movie_list, top_n=10):
+    """Recommend by merging precomputed item-item neighbour lists.
 
     Parameters
     ----------
-    movie_list : list
-        Three favourite movies selected by the app user.
+    movie_list : list (str)
+        Favorite movies chosen by the app user.
+    top_n : int
+        Number of top recommendations to return to the user.
 
     Returns
     -------
-    list
-        User-ID's of users with similar high ratings for each movie.
+    list (str)
+        Titles of the top-n movie recommendations to the user.
 
     """
-    # Store the id of users
-    id_store=[]
-    # For each movie selected by a user of the app,
-    # predict a corresponding user within the dataset with the highest rating
-    for i in movie_list:
-        predictions = prediction_item(item_id = i)
-        predictions.sort(key=lambda x: x.est, reverse=True)
-        # Take the top 10 user id's from each movie with highest rankings
-        for pred in predictions[:10]:
-            id_store.append(pred.uid)
-    # Return a list of user id's
-    return id_store
+    catalog = registry.get('catalog')
+    table = registry.get('item_neighbours')
+    neighbour_ids, _ = table.recommend(catalog.movie_ids(movie_list), top_n=top_n)
+    return catalog.titles(neighbour_ids)
 
 # !! DO NOT CHANGE THIS FUNCTION SIGNATURE !!
 # You are, however, encouraged to change its content.
+@timed('collab_model')
 def collab_model(movie_list,top_n=10):
     """Performs Collaborative filtering based upon a list of movies supplied
        by the app user.
@@ -120,60 +197,96 @@ def collab_model(movie_list,top_n=10):
         Titles of the top-n movie recommendations to the user.
 
     """
-    names = movies_df.copy()
-    names.set_index('movieId',inplace=True)
-    indices = pd.Series(names['title'])
-    users_ids = pred_movies(movie_list)
-    # Get movie IDs and ratings for top users
-    df_init_users = ratings_df[ratings_df['userId']==users_ids[0]]
-    for i in users_ids[1:]:
-        df_init_users = df_init_users.append(ratings_df[ratings_df['userId']==i])
-    # Include predictions for chosen movies
-    for j in movie_list:
-        a = pd.DataFrame(prediction_item(j))
-        for i in set(df_init_users['userId']):
-            mid = indices[indices == j].index[0]
-            est = a['est'][a['uid']==i].values[0]
-            df_init_users = df_init_users.append(pd.Series([int(i),int(mid),est], index=['userId','movieId','rating']), ignore_index=True)
-    # Remove duplicate entries
-    df_init_users.drop_duplicates(inplace=True)
-    #Create pivot table
-    util_matrix = df_init_users.pivot_table(index=['userId'], columns=['movieId'], values='rating')
-    # Fill Nan values with 0's and save the utility matrix in scipy's sparse matrix format
-    util_matrix.fillna(0, inplace=True)
-    util_matrix_sparse = sp.sparse.csr_matrix(util_matrix.values)
-    # Compute the similarity matrix using the cosine similarity metric
-    user_similarity = cosine_similarity(util_matrix_sparse.T)
-    # Save the matrix as a dataframe to allow for easier indexing
-    user_sim_df = pd.DataFrame(user_similarity, index = util_matrix.columns, columns = util_matrix.columns)
-    user_similarity = cosine_similarity(np.array(df_init_users), np.array(df_init_users))
-    user_sim_df = pd.DataFrame(user_similarity, index = df_init_users['movieId'].values.astype(int), columns = df_init_users['movieId'].values.astype(int))
-    # Remove duplicate rows from matrix
-    user_sim_df = user_sim_df.loc[~user_sim_df.index.duplicated(keep='first')]
-    # Transpose matrix
-    user_sim_df = user_sim_df.T
-    # Find IDs of chosen load_movie_titles
-    idx_1 = indices[indices == movie_list[0]].index[0]
-    idx_2 = indices[indices == movie_list[1]].index[0]
-    idx_3 = indices[indices == movie_list[2]].index[0]
-    # Creating a Series with the similarity scores in descending order
-    rank_1 = user_sim_df[idx_1]
-    rank_2 = user_sim_df[idx_2]
-    rank_3 = user_sim_df[idx_3]
-    # Calculating the scores
-    score_series_1 = pd.Series(rank_1).sort_values(ascending = False)
-    score_series_2 = pd.Series(rank_2).sort_values(ascending = False)
-    score_series_3 = pd.Series(rank_3).sort_values(ascending = False)
-    # Appending the names of movies
-    listings = score_series_1.append(score_series_2).append(score_series_3).sort_values(ascending = False)
-    # Choose top 50
-    top_50_indexes = list(listings.iloc[1:50].index)
-    # Removing chosen movies
-    top_indexes = np.setdiff1d(top_50_indexes,[idx_1,idx_2,idx_3])
+    if USE_ANN_INDEX:
+        return ann_recommendations(movie_list, top_n)
+    if USE_NEIGHBOUR_TABLE:
+        return neighbour_recommendations(movie_list, top_n)
+    with stage('load'):
+        catalog = registry.get('catalog')
+        scorer = registry.get('svd_scorer')
+    # Favourites known to the model
+    with stage('resolve_titles'):
+        seeds = scorer.inner_iids(catalog.movie_ids(movie_list))
+        seeds = seeds[seeds >= 0]
+    if seeds.shape[0] == 0:
+        return popular_recommendations(movie_list, top_n)
+    # Fold the app user into the model: a small regularised least-squares
+    # fit of a user vector against the favourites' item factors
+    with stage('fold_in'):
+        pu, bu = scorer.fold_in([seeds])
+    # Score every item with one matrix-vector product
+    with stage('score'):
+        scores = scorer.rank_scores(pu, bu)[0]
+    # Never recommend the favourites themselves
+    with stage('top_k'):
+        scores[seeds] = -np.inf
+        top_indexes = top_k(scores, top_n)
     # Get titles of recommended movies
-    recommended_movies = []
-    for i in top_indexes[:top_n]:
-        recommended_movies.append(list(movies_df[movies_df['movieId']==i]['title']))
-    # Return list of movies
-    recommended_movies = [val for sublist in recommended_movies for val in sublist]
+    with stage('titles'):
+        recommended_movies = catalog.titles(scorer.raw_iids[top_indexes])
     return recommended_movies
+
+@timed('collab_model_batch')
+def collab_model_batch(movie_lists, top_n=10, chunk_size=256):
+    """Collaborative filtering for many favourite lists at once.
+
+    Every query is folded in as a new user, as in `collab_model`, and a
+    whole chunk of user vectors is scored against every item with one
+    matrix product; `top_k_rows` breaks ties exactly like the `top_k` of
+    `collab_model`. Queries without a favourite known to the model, and
+    every query under RECOMMENDER_ANN / RECOMMENDER_NEIGHBOURS, are
+    answered by the function `collab_model` uses instead.
+
+    Parameters
+    ----------
+    movie_lists : list (list (str))
+        Favourite movies of each query.
+    top_n : int
+        Number of top recommendations per query.
+    chunk_size : int
+        Number of queries scored in one matrix product.
+
+    Returns
+    -------
+    list (list (str) or None)
+        Recommended titles per query, `None` where a title is not in
+        the catalogue.
+
+    """
+    if USE_ANN_INDEX or USE_NEIGHBOUR_TABLE:
+        # Index lookups and neighbour merges are cheap per query
+        recommend = ann_recommendations if USE_ANN_INDEX else neighbour_recommendations
+        results = []
+        for movie_list in movie_lists:
+            try:
+                results.append(recommend(movie_list, top_n))
+            except KeyError:
+                results.append(None)
+        return results
+    catalog = registry.get('catalog')
+    scorer = registry.get('svd_scorer')
+    seed_lists, positions = [], []
+    results = [None] * len(movie_lists)
+    for pos, movie_list in enumerate(movie_lists):
+        try:
+            seeds = scorer.inner_iids(catalog.movie_ids(movie_list))
+        except KeyError:
+            continue
+        seeds = seeds[seeds >= 0]
+        if seeds.shape[0] == 0:
+            results[pos] = popular_recommendations(movie_list, top_n)
+            continue
+        seed_lists.append(seeds)
+        positions.append(pos)
+
+    for start in range(0, len(seed_lists), chunk_size):
+        chunk = seed_lists[start:start + chunk_size]
+        lengths = np.array([seeds.shape[0] for seeds in chunk])
+        flat = np.concatenate(chunk)
+        pu, bu = scorer.fold_in(chunk)
+        scores = scorer.rank_scores(pu, bu)
+        # Never recommend a query's own favourites
+        scores[np.repeat(np.arange(len(chunk)), lengths), flat] = -np.inf
+        for pos, best in zip(positions[start:start + chunk_size], top_k_rows(scores, top_n)):
+            results[pos] = catalog.titles(scorer.raw_iids[best])
+    return results
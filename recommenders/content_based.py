@@ -22,24 +22,37 @@
 
     ---------------------------------------------------------------------
 
-    Description: Provided within this file is a baseline content-based
-    filtering algorithm for rating predictions on Movie data.
+    Description: Content-based filtering on movie genres. Every movie's
+    genres are a bitmask (see `recommenders.content_index`), and the
+    catalogue is ranked by the genre cosine similarity of each movie to
+    the favourites, computed with bitwise ANDs and popcounts.
 
 """
 
 # Script dependencies
-import os
-import pandas as pd
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer
+from recommenders.content_index import load_content_index
+from utils.data_loader import MOVIES_PATH, source_fingerprint
+from utils.registry import registry
+from utils.instrumentation import stage, timed
 
 # Importing data
-movies = pd.read_csv('resources/data/movies.csv', sep = ',')
-ratings = pd.read_csv('resources/data/ratings.csv', sep = ',')
-movies.dropna(inplace=True)
-
-
+# Movies and the genre index are loaded lazily through the resource
+# registry, the first time a recommendation needs them.
+registry.register('content_index', lambda: load_content_index(registry.get('movies'),
+                                                              registry.get('genre_vocabulary'),
+                                                              MOVIES_PATH),
+                  version=lambda: source_fingerprint((MOVIES_PATH,)))
+
+def __getattr__(name):
+    # Keep `content_based.movies` / `content_based.ratings` as lazy attributes.
+    if name == 'movies':
+        return registry.get('movies').dropna()
+    if name == 'ratings':
+        return registry.get('ratings')
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@timed('content_model')
 def content_model(movie_list,top_n=10):
     """Performs Content filtering based upon a list of movies supplied
        by the app user.
@@ -57,37 +70,55 @@ def content_model(movie_list,top_n=10):
         Titles of the top-n movie recommendations to the user.
 
     """
-    # Split genre data into individual words.
-    movies['keyWords'] = movies['genres'].str.replace('|', ' ')
-    # Subset of the data
-    data = movies[13000:27000]
-
-    # Instantiating and generating the count matrix
-    count_vec = CountVectorizer()
-    count_matrix = count_vec.fit_transform(data['keyWords'])
-    indices = pd.Series(data['title'])
-    cosine_sim = cosine_similarity(count_matrix, count_matrix)
-    cosine_sim = pd.DataFrame(cosine_sim, index = data.index, columns = data.index)
-    # Getting the index of the movie that matches the title
-    idx_1 = indices[indices == movie_list[0]].index[0]
-    idx_2 = indices[indices == movie_list[1]].index[0]
-    idx_3 = indices[indices == movie_list[2]].index[0]
-    # Creating a Series with the similarity scores in descending order
-    rank_1 = cosine_sim[idx_1]
-    rank_2 = cosine_sim[idx_2]
-    rank_3 = cosine_sim[idx_3]
-    # Calculating the scores
-    score_series_1 = pd.Series(rank_1).sort_values(ascending = False)
-    score_series_2 = pd.Series(rank_2).sort_values(ascending = False)
-    score_series_3 = pd.Series(rank_3).sort_values(ascending = False)
-    # Getting the indexes of the 10 most similar movies
-    listings = score_series_1.append(score_series_2).append(score_series_3).sort_values(ascending = False)
-    # Store movie names
-    recommended_movies = []
-    # Appending the names of movies
-    top_50_indexes = list(listings.iloc[1:50].index)
-    # Removing chosen movies
-    top_indexes = np.setdiff1d(top_50_indexes,[idx_1,idx_2,idx_3])
-    for i in top_indexes[:top_n]:
-        recommended_movies.append(list(movies['title'])[i])
+    # The genre bitmask index over the full catalogue is built once per
+    # version of the movie database
+    with stage('load'):
+        index = registry.get('content_index')
+        catalog = registry.get('catalog')
+    # Getting the rows of the movies that match the titles
+    with stage('resolve_titles'):
+        seeds = index.rows_for_ids(catalog.movie_ids(movie_list))
+    # Bitmask cosine of the seed movies against the catalogue, keeping the top-n
+    with stage('similarity'):
+        top_rows = index.recommend(seeds, top_n=top_n)
+    with stage('titles'):
+        recommended_movies = list(index.titles[top_rows])
     return recommended_movies
+
+
+@timed('content_model_batch')
+def content_model_batch(movie_lists, top_n=10, chunk_size=32):
+    """Content filtering for many favourite lists at once.
+
+    Parameters
+    ----------
+    movie_lists : list (list (str))
+        Favourite movies of each query.
+    top_n : int
+        Number of top recommendations per query.
+    chunk_size : int
+        Number of queries whose bitmask similarities are computed at once.
+
+    Returns
+    -------
+    list (list (str) or None)
+        Recommended titles per query, `None` where a favourite title
+        is not in the catalogue.
+
+    """
+    index = registry.get('content_index')
+    catalog = registry.get('catalog')
+    seed_lists, positions = [], []
+    for pos, movie_list in enumerate(movie_lists):
+        try:
+            seeds = index.rows_for_ids(catalog.movie_ids(movie_list))
+        except KeyError:
+            continue
+        if seeds.shape[0]:
+            seed_lists.append(seeds)
+            positions.append(pos)
+    results = [None] * len(movie_lists)
+    top_rows = index.recommend_batch(seed_lists, top_n=top_n, chunk_size=chunk_size)
+    for pos, rows in zip(positions, top_rows):
+        results[pos] = list(index.titles[rows])
+    return results
@@ -0,0 +1,275 @@
+"""
+
+    Precomputed item-item neighbour tables for collaborative filtering.
+
+    Author: Explore Data Science Academy.
+
+    Description: An offline stage computes, for every movie in the
+    ratings, its top-K most similar movies by cosine similarity of their
+    rating columns. Similarities are computed block by block with sparse
+    CSR products, so only a (block_size x n_items) slice is ever dense,
+    and the result is stored as compact int32/float32 arrays next to the
+    model. Online, recommendations for any favourite list are a merge of
+    the favourites' precomputed neighbour lists.
+
+    Building the table is a full pass over the ratings, so run it offline
+    (or let the app and service warm-up build it while
+    RECOMMENDER_NEIGHBOURS=1); without a current saved table, the first
+    request for neighbours waits for the build. A rebuilt table is
+    swapped in atomically (see `utils.atomic_dir`).
+
+    Usage: python -m recommenders.item_neighbours [--k 50] [--block-size 512]
+
+"""
+# Script dependencies
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import scipy as sp
+import scipy.sparse
+from sklearn.preprocessing import normalize
+
+from recommenders.svd_engine import top_k, top_k_rows
+from utils.atomic_dir import new_version, publish, resolve, write_lock
+from utils.data_loader import RATINGS_PATH, source_fingerprint
+from utils.ratings_stream import get_ratings_matrix
+
+TABLE_DIR = 'resources/models/item_neighbours'
+FORMAT_VERSION = 1
+
+
+class NeighbourTable:
+    """Top-K neighbours and similarities of every item.
+
+    Parameters
+    ----------
+    neighbours : np.ndarray
+        int32 (n_items, K) neighbour positions, -1 for empty slots.
+    similarities : np.ndarray
+        float32 (n_items, K) cosine similarities, best first.
+    raw_iids : np.ndarray
+        MovieLens movie id of each item position.
+    fingerprint : np.ndarray, optional
+        Fingerprint of the ratings file the table was built from.
+
+    """
+
+    def __init__(self, neighbours, similarities, raw_iids, fingerprint=None):
+        self.neighbours = neighbours
+        self.similarities = similarities
+        self.raw_iids = np.asarray(raw_iids)
+        self.fingerprint = fingerprint
+        self._order = np.argsort(self.raw_iids, kind='stable')
+
+    @classmethod
+    def build(cls, ratings_df, k=50, block_size=512, fingerprint=None, verbose=False):
+        """Compute the neighbour table from a ratings frame.
+
+        Parameters
+        ----------
+        ratings_df : pd.DataFrame
+            Ratings with `userId`, `movieId` and `rating` columns.
+        k, block_size, fingerprint, verbose
+            As for `from_matrix`.
+
+        Returns
+        -------
+        NeighbourTable
+            The built table.
+
+        """
+        user_idx, _ = pd.factorize(ratings_df['userId'], sort=False)
+        item_idx, raw_iids = pd.factorize(ratings_df['movieId'], sort=False)
+        ratings = sp.sparse.csr_matrix(
+            (ratings_df['rating'].to_numpy(dtype=np.float32), (item_idx, user_idx)),
+            shape=(len(raw_iids), user_idx.max() + 1 if len(user_idx) else 0))
+        return cls.from_matrix(ratings, np.asarray(raw_iids), k=k, block_size=block_size,
+                               fingerprint=fingerprint, verbose=verbose)
+
+    @classmethod
+    def from_matrix(cls, ratings, raw_iids, k=50, block_size=512, fingerprint=None,
+                    verbose=False):
+        """Compute the neighbour table from a sparse items x users matrix.
+
+        Parameters
+        ----------
+        ratings : scipy.sparse matrix
+            Ratings with one row per item, in the order of `raw_iids`.
+        raw_iids : np.ndarray
+            MovieLens movie id of each row.
+        k : int
+            Neighbours kept per item.
+        block_size : int
+            Items whose similarities are computed per sparse product; peak
+            memory is about block_size * n_items * 4 bytes (float32).
+        fingerprint : np.ndarray, optional
+            Fingerprint of the source ratings file.
+        verbose : bool
+            Print progress after every block.
+
+        Returns
+        -------
+        NeighbourTable
+            The built table.
+
+        """
+        n_items = ratings.shape[0]
+        # Unit-length rating rows turn cosine similarity into a dot product
+        ratings = normalize(ratings.tocsr(), norm='l2', axis=1)
+        ratings_t = ratings.T.tocsr()
+
+        k = max(0, min(k, n_items - 1))
+        neighbours = np.full((n_items, k), -1, dtype=np.int32)
+        similarities = np.zeros((n_items, k), dtype=np.float32)
+        start = time.perf_counter()
+        for lo in range(0, n_items, block_size):
+            hi = min(lo + block_size, n_items)
+            block = (ratings[lo:hi] @ ratings_t).toarray()
+            # An item is never its own neighbour
+            block[np.arange(hi - lo), np.arange(lo, hi)] = -np.inf
+            best = top_k_rows(block, k)
+            sims = np.take_along_axis(block, best, axis=1)
+            keep = sims > 0
+            neighbours[lo:hi] = np.where(keep, best, -1)
+            similarities[lo:hi] = np.where(keep, sims, 0.0)
+            if verbose:
+                print(f"{hi}/{n_items} items ({time.perf_counter() - start:.1f}s)")
+        return cls(neighbours, similarities, np.asarray(raw_iids), fingerprint=fingerprint)
+
+    def positions(self, raw_iids):
+        """Item positions of the given movie ids (-1 where unknown)."""
+        query = np.atleast_1d(np.asarray(raw_iids))
+        if self.raw_iids.shape[0] == 0 or query.shape[0] == 0:
+            return np.full(query.shape[0], -1, dtype=np.int64)
+        sorted_ids = self.raw_iids[self._order]
+        pos = np.clip(np.searchsorted(sorted_ids, query), 0, sorted_ids.shape[0] - 1)
+        return np.where(sorted_ids[pos] == query, self._order[pos], -1).astype(np.int64)
+
+    def recommend(self, raw_iids, top_n=10):
+        """Merge the favourites' neighbour lists into a ranking.
+
+        Each candidate scores the sum of its similarities to the
+        favourites it neighbours; the favourites themselves are excluded.
+
+        Parameters
+        ----------
+        raw_iids : list (int)
+            MovieLens ids of the favourite movies.
+        top_n : int
+            Number of movies to return.
+
+        Returns
+        -------
+        tuple (np.ndarray, np.ndarray)
+            MovieLens ids and merged scores, best first.
+
+        """
+        seeds = self.positions(raw_iids)
+        seeds = seeds[seeds >= 0]
+        candidates = np.asarray(self.neighbours[seeds]).ravel()
+        weights = np.asarray(self.similarities[seeds]).ravel()
+        keep = (candidates >= 0) & ~np.isin(candidates, seeds)
+        items, inverse = np.unique(candidates[keep], return_inverse=True)
+        totals = np.bincount(inverse, weights=weights[keep], minlength=items.shape[0])
+        best = top_k(totals, top_n)
+        return self.raw_iids[items[best]], totals[best]
+
+    def save(self, directory=TABLE_DIR):
+        """Write the table as `.npy` arrays plus a JSON header.
+
+        Everything is written to a new version directory, and `directory`
+        is switched to it in one step, so readers never mix the arrays of
+        two builds.
+
+        """
+        arrays = {'neighbours': self.neighbours, 'similarities': self.similarities,
+                  'raw_iids': self.raw_iids}
+        meta = {'version': FORMAT_VERSION, 'k': int(self.neighbours.shape[1]),
+                'fingerprint': None if self.fingerprint is None else [str(v) for v in self.fingerprint]}
+        with write_lock(directory):
+            tmp_dir = new_version(directory)
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, name + '.npy'), np.ascontiguousarray(array))
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            publish(tmp_dir, directory)
+
+    @classmethod
+    def load(cls, directory=TABLE_DIR, mmap_mode='r'):
+        """Load a table written by `save`, memory-mapped by default."""
+        directory = resolve(directory)
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported neighbour table version: {meta.get('version')}")
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in ('neighbours', 'similarities', 'raw_iids')}
+        fingerprint = meta.get('fingerprint')
+        return cls(fingerprint=None if fingerprint is None else np.array(fingerprint, dtype=str),
+                   **arrays)
+
+
+def _build_streaming(ratings_path, **kwargs):
+    # Ratings streamed into a sparse matrix shared by every process
+    matrix = get_ratings_matrix(ratings_path)
+    return NeighbourTable.from_matrix(matrix.tocsr().T, matrix.item_ids, **kwargs)
+
+
+def get_neighbour_table(ratings_path=RATINGS_PATH, directory=TABLE_DIR, build=True):
+    """Load the neighbour table for the current ratings file.
+
+    Building a missing or stale table takes a full pass over the ratings;
+    the registry's warm-up calls this ahead of the first request when
+    RECOMMENDER_NEIGHBOURS=1.
+
+    Parameters
+    ----------
+    ratings_path : str
+        Ratings file the table must have been built from.
+    directory : str
+        Location of the saved table.
+    build : bool
+        Build (and save) the table when it is missing or stale.
+
+    Returns
+    -------
+    NeighbourTable
+        Neighbour table for the current ratings.
+
+    """
+    fingerprint = source_fingerprint((ratings_path,))
+    if os.path.exists(os.path.join(directory, 'meta.json')):
+        try:
+            table = NeighbourTable.load(directory)
+            if np.array_equal(table.fingerprint, fingerprint):
+                return table
+        except (OSError, ValueError, KeyError):
+            pass
+    if not build:
+        raise FileNotFoundError(f"No current item neighbour table in: {directory}")
+    table = _build_streaming(ratings_path, fingerprint=fingerprint)
+    try:
+        table.save(directory)
+    except OSError:
+        pass
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Precompute item-item neighbour tables.')
+    parser.add_argument('--ratings', default=RATINGS_PATH)
+    parser.add_argument('--k', type=int, default=50)
+    parser.add_argument('--block-size', type=int, default=512)
+    parser.add_argument('--output', default=TABLE_DIR)
+    args = parser.parse_args(argv)
+    table = _build_streaming(args.ratings, k=args.k, block_size=args.block_size,
+                             fingerprint=source_fingerprint((args.ratings,)), verbose=True)
+    table.save(args.output)
+    print(f"Saved neighbours of {table.neighbours.shape[0]} items to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
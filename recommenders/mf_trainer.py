@@ -0,0 +1,416 @@
+"""
+
+    Parallel biased matrix-factorisation trainer.
+
+    Author: Explore Data Science Academy.
+
+    Description: A NumPy replacement for `train_colbased.svd_pp` that fits
+    the same biased model as `surprise.SVD`
+
+        r_ui ~ mu + b_u + b_i + p_u . q_i
+
+    with alternating least squares. Each half-epoch solves every user (then
+    every item) independently given the other side, so rows are split into
+    blocks and solved on a process pool. Ratings, factors and biases live
+    in `multiprocessing.shared_memory`, so workers read and write them in
+    place without copying. Progress and training RMSE are reported after
+    every epoch, and the result is exported as a model bundle that the
+    app's collaborative path loads directly.
+
+    `update` refreshes an existing bundle from only the ratings newer than
+    the last ones it was trained on: a few SGD epochs over the delta in
+    shuffled minibatches, warm-started from the bundle's factors, with
+    fresh factors for unseen users and items. The bundle is replaced
+    atomically, so a running app picks the new model up on its next
+    request.
+
+    Usage: python -m recommenders.mf_trainer [--ratings resources/data/ratings.csv]
+               [--factors 200] [--epochs 15] [--reg 0.05] [--workers 4]
+               [--output resources/models/svd_bundle]
+           python -m recommenders.mf_trainer --update [--since TIMESTAMP]
+               [--ratings new_ratings.csv] [--epochs 3] [--reg 0.02]
+
+    A bundle exported from SVD.pkl records no rating timestamp, so its
+    first `--update` needs `--since`.
+
+"""
+# Script dependencies
+import os
+import time
+import argparse
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+import pandas as pd
+
+from recommenders.svd_engine import SVDScorer
+from recommenders.model_bundle import BUNDLE_DIR, export_bundle, load_bundle, read_meta
+from utils.atomic_dir import write_lock
+from utils.data_loader import RATINGS_PATH, load_ratings
+
+# Arrays attached by each worker process
+_arrays = None
+_segments = []
+
+
+def _create_shared(arrays):
+    """Copy arrays into new shared memory segments.
+
+    Returns
+    -------
+    tuple (dict, dict, list)
+        Shared views by name, specs for `_attach`, and the segments.
+
+    """
+    views, specs, segments = {}, {}, []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        view[...] = array
+        views[name] = view
+        specs[name] = (shm.name, array.shape, array.dtype.str)
+        segments.append(shm)
+    return views, specs, segments
+
+
+def _attach(specs):
+    """Worker initialiser: map the shared arrays into this process."""
+    global _arrays
+    _arrays = {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        # The parent owns (and unlinks) the segments; stop this process's
+        # resource tracker from also claiming them.
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        _segments.append(shm)
+        _arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _solve_rows(side, start, stop, reg):
+    """Solve the factors and bias of rows [start, stop) of one side.
+
+    Each row is a ridge regression of its residual ratings
+    (r - mu - other bias) on the other side's factors plus a constant
+    column for the row's own bias, regularised by `reg` * n_ratings.
+
+    """
+    a = _arrays
+    if side == 'user':
+        indptr, cols, values = a['u_indptr'], a['u_items'], a['u_ratings']
+        other, other_bias, own, own_bias = a['qi'], a['bi'], a['pu'], a['bu']
+    else:
+        indptr, cols, values = a['i_indptr'], a['i_users'], a['i_ratings']
+        other, other_bias, own, own_bias = a['pu'], a['bu'], a['qi'], a['bi']
+    mu = float(a['mu'][0])
+    k = other.shape[1]
+    eye = np.eye(k + 1)
+    for row in range(start, stop):
+        lo, hi = indptr[row], indptr[row + 1]
+        if lo == hi:
+            own[row] = 0.0
+            own_bias[row] = 0.0
+            continue
+        idx = cols[lo:hi]
+        x = np.empty((hi - lo, k + 1))
+        x[:, :k] = other[idx]
+        x[:, k] = 1.0
+        y = values[lo:hi] - mu - other_bias[idx]
+        solution = np.linalg.solve(x.T @ x + reg * (hi - lo) * eye, x.T @ y)
+        own[row] = solution[:k]
+        own_bias[row] = solution[k]
+
+
+def _compressed(rows, cols, values, n_rows):
+    """CSR arrays (indptr, cols, values) grouped by `rows`."""
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32), values[order]
+
+
+def rmse(arrays, user_idx, item_idx, ratings, chunk_size=200000):
+    """Root mean squared error of the current model on the given ratings."""
+    mu = float(arrays['mu'][0])
+    total = 0.0
+    for start in range(0, ratings.shape[0], chunk_size):
+        u = user_idx[start:start + chunk_size]
+        i = item_idx[start:start + chunk_size]
+        est = (mu + arrays['bu'][u] + arrays['bi'][i]
+               + np.einsum('ij,ij->i', arrays['pu'][u], arrays['qi'][i]))
+        total += float(np.sum((ratings[start:start + chunk_size] - est) ** 2))
+    return np.sqrt(total / max(ratings.shape[0], 1))
+
+
+def _blocks(n_rows, n_blocks):
+    edges = np.linspace(0, n_rows, n_blocks + 1).astype(np.int64)
+    return [(int(lo), int(hi)) for lo, hi in zip(edges[:-1], edges[1:]) if hi > lo]
+
+
+def train(ratings_df, n_factors=200, n_epochs=15, reg=0.05, init_std_dev=0.05,
+          workers=None, seed=0, init=None, verbose=True):
+    """Fit a biased matrix-factorisation model with parallel ALS.
+
+    Parameters
+    ----------
+    ratings_df : pd.DataFrame
+        Ratings with `userId`, `movieId` and `rating` columns.
+    n_factors : int
+        Number of latent factors.
+    n_epochs : int
+        Number of ALS epochs (a user pass and an item pass each).
+    reg : float
+        Regularisation, scaled by each row's number of ratings.
+    init_std_dev : float
+        Standard deviation of the initial factors.
+    workers : int, optional
+        Worker processes, defaults to the CPU count; 1 trains in-process.
+    seed : int
+        Seed for factor initialisation.
+    init : SVDScorer, optional
+        Model whose factors and biases warm-start known users/items.
+    verbose : bool
+        Print progress and RMSE after every epoch.
+
+    Returns
+    -------
+    SVDScorer
+        The fitted model.
+
+    """
+    global _arrays
+    user_idx, raw_uids = pd.factorize(ratings_df['userId'], sort=False)
+    item_idx, raw_iids = pd.factorize(ratings_df['movieId'], sort=False)
+    values = ratings_df['rating'].to_numpy(dtype=np.float32)
+    n_users, n_items = len(raw_uids), len(raw_iids)
+    mu = float(values.mean())
+
+    rng = np.random.default_rng(seed)
+    pu = rng.normal(0, init_std_dev, (n_users, n_factors)).astype(np.float32)
+    qi = rng.normal(0, init_std_dev, (n_items, n_factors)).astype(np.float32)
+    bu = np.zeros(n_users, dtype=np.float32)
+    bi = np.zeros(n_items, dtype=np.float32)
+    if init is not None:
+        # Warm start: copy the factors of users/items the old model knows
+        for own, own_bias, raw, lookup, old, old_bias in (
+                (pu, bu, raw_uids, init.inner_uids, init.pu, init.bu),
+                (qi, bi, raw_iids, init.inner_iids, init.qi, init.bi)):
+            old_rows = lookup(np.asarray(raw))
+            known = old_rows >= 0
+            if old.shape[1] == n_factors:
+                own[known] = old[old_rows[known]]
+            own_bias[known] = old_bias[old_rows[known]]
+
+    u_indptr, u_items, u_ratings = _compressed(user_idx, item_idx, values, n_users)
+    i_indptr, i_users, i_ratings = _compressed(item_idx, user_idx, values, n_items)
+    arrays, specs, segments = _create_shared({
+        'u_indptr': u_indptr, 'u_items': u_items, 'u_ratings': u_ratings,
+        'i_indptr': i_indptr, 'i_users': i_users, 'i_ratings': i_ratings,
+        'pu': pu, 'qi': qi, 'bu': bu, 'bi': bi, 'mu': np.array([mu])})
+    del u_items, u_ratings, i_users, i_ratings
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    pool = None
+    try:
+        if workers > 1:
+            pool = mp.get_context('spawn').Pool(workers, initializer=_attach, initargs=(specs,))
+        else:
+            _arrays = arrays
+        for epoch in range(1, n_epochs + 1):
+            start = time.perf_counter()
+            for side, n_rows in (('user', n_users), ('item', n_items)):
+                tasks = [(side, lo, hi, reg) for lo, hi in _blocks(n_rows, max(workers, 1) * 4)]
+                if pool is not None:
+                    pool.starmap(_solve_rows, tasks)
+                else:
+                    for task in tasks:
+                        _solve_rows(*task)
+            error = rmse(arrays, user_idx, item_idx, values)
+            if verbose:
+                print(f"Epoch {epoch}/{n_epochs}: RMSE {error:.4f} "
+                      f"({time.perf_counter() - start:.1f}s)")
+        scorer = SVDScorer(global_mean=mu,
+                           bu=arrays['bu'].copy(), bi=arrays['bi'].copy(),
+                           pu=arrays['pu'].copy(), qi=arrays['qi'].copy(),
+                           raw_uids=np.asarray(raw_uids), raw_iids=np.asarray(raw_iids),
+                           rating_scale=(float(values.min()), float(values.max())))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        _arrays = None
+        del arrays
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+    return scorer
+
+
+def training_meta(ratings_df):
+    """Bundle metadata describing the ratings a model was trained on."""
+    meta = {'n_ratings': int(len(ratings_df))}
+    if 'timestamp' in ratings_df.columns and len(ratings_df):
+        meta['max_timestamp'] = int(ratings_df['timestamp'].max())
+    return meta
+
+
+def _extend(scorer, raw_uids, raw_iids, init_std_dev, rng):
+    """Copy a scorer's parameters, appending fresh rows for unseen ids."""
+    grown = {}
+    for side, raw, known_raw, factors, bias in (
+            ('u', raw_uids, scorer.raw_uids, scorer.pu, scorer.bu),
+            ('i', raw_iids, scorer.raw_iids, scorer.qi, scorer.bi)):
+        lookup = scorer.inner_uids if side == 'u' else scorer.inner_iids
+        unseen = pd.unique(np.asarray(raw)[lookup(raw) < 0])
+        n_new, n_factors = len(unseen), factors.shape[1]
+        grown[side] = (
+            np.concatenate([np.asarray(known_raw), unseen.astype(np.asarray(known_raw).dtype)]),
+            np.concatenate([np.asarray(factors, dtype=np.float32),
+                            rng.normal(0, init_std_dev, (n_new, n_factors)).astype(np.float32)]),
+            np.concatenate([np.asarray(bias, dtype=np.float32), np.zeros(n_new, dtype=np.float32)]))
+    (raw_u, pu, bu), (raw_i, qi, bi) = grown['u'], grown['i']
+    return SVDScorer(scorer.global_mean, bu, bi, pu, qi, raw_u, raw_i,
+                     rating_scale=scorer.rating_scale, biased=scorer.biased)
+
+
+def update(ratings_df, bundle_dir=BUNDLE_DIR, since=None, n_epochs=3, lr=0.005,
+           reg=0.02, init_std_dev=0.05, seed=0, batch_size=256, output=None, verbose=True):
+    """Warm-start an existing model bundle from new ratings only.
+
+    Parameters
+    ----------
+    ratings_df : pd.DataFrame
+        Ratings with `userId`, `movieId`, `rating` and `timestamp`
+        columns; only those newer than `since` are used.
+    bundle_dir : str
+        Bundle holding the current model.
+    since : int, optional
+        Ratings with a timestamp at or below this are skipped; defaults
+        to the newest timestamp recorded in the bundle.
+    n_epochs : int
+        SGD epochs over the new ratings.
+    lr, reg : float
+        SGD learning rate and regularisation (as in `train_colbased`).
+    init_std_dev : float
+        Standard deviation of factors for unseen users and items.
+    seed : int
+        Seed for new factors and the rating order.
+    batch_size : int
+        Ratings per SGD step. A user or item rated several times in one
+        batch gets the sum of their steps, so `lr * batch_size` should
+        stay below 1.
+    output : str, optional
+        Bundle to write, `bundle_dir` by default. Its write lock is held
+        from loading the current model to publishing the new one, so
+        concurrent updates never overwrite each other's ratings.
+    verbose : bool
+        Print progress and RMSE on the new ratings after every epoch.
+
+    Returns
+    -------
+    SVDScorer or None
+        The updated model, `None` when there were no new ratings.
+
+    """
+    output = output or bundle_dir
+    with write_lock(output):
+        return _update(ratings_df, bundle_dir, since, n_epochs, lr, reg, init_std_dev, seed,
+                       batch_size, output, verbose)
+
+
+def _update(ratings_df, bundle_dir, since, n_epochs, lr, reg, init_std_dev, seed, batch_size,
+            output, verbose):
+    """`update` with the output bundle's write lock held."""
+    meta = read_meta(bundle_dir)
+    since = meta.get('max_timestamp') if since is None else since
+    if since is None:
+        raise ValueError("The bundle records no rating timestamp (e.g. it was exported "
+                         "from SVD.pkl); pass `since` explicitly.")
+    delta = ratings_df[ratings_df['timestamp'] > since]
+    if delta.empty:
+        if verbose:
+            print(f"No ratings newer than {since}; model unchanged.")
+        return None
+
+    rng = np.random.default_rng(seed)
+    raw_u = delta['userId'].to_numpy()
+    raw_i = delta['movieId'].to_numpy()
+    scorer = _extend(load_bundle(bundle_dir, mmap_mode=None), raw_u, raw_i, init_std_dev, rng)
+    users, items = scorer.inner_uids(raw_u), scorer.inner_iids(raw_i)
+    values = delta['rating'].to_numpy(dtype=np.float64)
+
+    # Keep the global mean consistent with the enlarged rating set; when
+    # the bundle does not record how many ratings it was trained on, the
+    # old mean is kept rather than replaced by the mean of the delta
+    n_old = meta.get('n_ratings')
+    if n_old is None:
+        mu = scorer.global_mean
+    else:
+        mu = (scorer.global_mean * n_old + values.sum()) / (n_old + len(values))
+    pu, qi, bu, bi = scorer.pu, scorer.qi, scorer.bu, scorer.bi
+    for epoch in range(1, n_epochs + 1):
+        start = time.perf_counter()
+        squared = 0.0
+        order = rng.permutation(len(values))
+        for lo in range(0, len(values), batch_size):
+            batch = order[lo:lo + batch_size]
+            u, i = users[batch], items[batch]
+            pu_u, qi_i = pu[u], qi[i]
+            err = values[batch] - (mu + bu[u] + bi[i] + np.einsum('ij,ij->i', pu_u, qi_i))
+            squared += float(err @ err)
+            np.add.at(bu, u, lr * (err - reg * bu[u]))
+            np.add.at(bi, i, lr * (err - reg * bi[i]))
+            np.add.at(pu, u, lr * (err[:, None] * qi_i - reg * pu_u))
+            np.add.at(qi, i, lr * (err[:, None] * pu_u - reg * qi_i))
+        if verbose:
+            print(f"Epoch {epoch}/{n_epochs}: RMSE on {len(values)} new ratings "
+                  f"{np.sqrt(squared / len(values)):.4f} ({time.perf_counter() - start:.1f}s)")
+
+    lower, upper = scorer.rating_scale
+    updated = SVDScorer(mu, bu, bi, pu, qi, scorer.raw_uids, scorer.raw_iids,
+                        rating_scale=(min(lower, float(values.min())), max(upper, float(values.max()))),
+                        biased=scorer.biased)
+    extra = {'max_timestamp': int(delta['timestamp'].max())}
+    if n_old is not None:
+        extra['n_ratings'] = n_old + len(values)
+    export_bundle(updated, output, extra=extra, locked=True)
+    return updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train a biased MF model with parallel ALS.')
+    parser.add_argument('--ratings', default=RATINGS_PATH)
+    parser.add_argument('--factors', type=int, default=200)
+    parser.add_argument('--epochs', type=int, default=None,
+                        help='Defaults to 15 for training and 3 for --update.')
+    parser.add_argument('--reg', type=float, default=None,
+                        help='Defaults to 0.05 for training and 0.02 for --update.')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=BUNDLE_DIR)
+    parser.add_argument('--update', action='store_true',
+                        help='Warm-start the bundle at --output from new ratings only.')
+    parser.add_argument('--since', type=int, default=None,
+                        help='With --update, only use ratings newer than this timestamp; '
+                             'required for bundles exported from SVD.pkl.')
+    args = parser.parse_args(argv)
+    ratings_df = load_ratings(args.ratings)
+    if args.update:
+        try:
+            updated = update(ratings_df, bundle_dir=args.output, since=args.since,
+                             n_epochs=3 if args.epochs is None else args.epochs,
+                             reg=0.02 if args.reg is None else args.reg)
+        except ValueError as error:
+            parser.error(str(error))
+        if updated is not None:
+            print(f"Update completed. Model bundle saved to: {args.output}")
+        return
+    scorer = train(ratings_df, n_factors=args.factors,
+                   n_epochs=15 if args.epochs is None else args.epochs,
+                   reg=0.05 if args.reg is None else args.reg, workers=args.workers)
+    export_bundle(scorer, args.output, extra=training_meta(ratings_df))
+    print(f"Training completed. Model bundle saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+
+    Compact, memory-mappable SVD model bundle.
+
+    Author: Explore Data Science Academy.
+
+    Description: The pickled `surprise` SVD carries its whole trainset and
+    float64 factors, and every process unpickles a private copy. A bundle
+    holds only what scoring needs - global mean, biases, float32 factor
+    matrices and the raw <-> inner id maps - as one `.npy` file per array
+    plus a versioned `meta.json`. Arrays are loaded with `mmap_mode='r'`,
+    so Streamlit worker processes on one host share the same physical
+    pages. Bundles are written under a lock to a new version directory
+    and switched in atomically (see `utils.atomic_dir`).
+
+    Usage: python -m recommenders.model_bundle [SVD.pkl] [bundle_dir]
+
+"""
+# Script dependencies
+import os
+import sys
+import json
+import pickle
+import numpy as np
+
+from recommenders.svd_engine import SVDScorer
+from utils.atomic_dir import new_version, publish, resolve, write_lock
+from utils.data_loader import source_fingerprint
+
+MODEL_PATH = 'resources/models/SVD.pkl'
+BUNDLE_DIR = 'resources/models/svd_bundle'
+FORMAT_VERSION = 1
+
+_ARRAYS = ('bu', 'bi', 'pu', 'qi', 'raw_uids', 'raw_iids')
+
+
+def export_bundle(scorer, bundle_dir=BUNDLE_DIR, source_path=None, dtype=np.float32,
+                  extra=None, locked=False):
+    """Write a scorer's parameters as a model bundle.
+
+    The bundle is written to a new version directory and `bundle_dir`
+    is switched to it with one atomic rename, so readers never see a
+    partially written bundle, or none at all.
+
+    Parameters
+    ----------
+    scorer : SVDScorer or surprise.SVD
+        Model parameters to export.
+    bundle_dir : str
+        Destination directory.
+    source_path : str, optional
+        Model artifact the bundle was exported from; its fingerprint is
+        recorded so stale bundles can be detected.
+    dtype : np.dtype
+        Storage type of biases and factors.
+    extra : dict, optional
+        JSON-serialisable training metadata stored in `meta.json`
+        (e.g. the newest rating timestamp seen).
+    locked : bool
+        The caller already holds `write_lock(bundle_dir)`.
+
+    Returns
+    -------
+    str
+        The bundle directory.
+
+    """
+    if not locked:
+        with write_lock(bundle_dir):
+            return export_bundle(scorer, bundle_dir, source_path, dtype, extra, locked=True)
+    n_ratings = None
+    if not isinstance(scorer, SVDScorer):
+        # Size of the training set, so `mf_trainer.update` can keep the
+        # global mean weighted correctly
+        n_ratings = int(scorer.trainset.n_ratings)
+        scorer = SVDScorer.from_model(scorer)
+    tmp_dir = new_version(bundle_dir)
+    arrays = {'bu': scorer.bu.astype(dtype), 'bi': scorer.bi.astype(dtype),
+              'pu': scorer.pu.astype(dtype), 'qi': scorer.qi.astype(dtype),
+              'raw_uids': scorer.raw_uids, 'raw_iids': scorer.raw_iids}
+    for name, array in arrays.items():
+        if array.dtype == object:
+            raise ValueError(f"Bundle ids must be numeric, got object ids for {name}")
+        np.save(os.path.join(tmp_dir, name + '.npy'), np.ascontiguousarray(array))
+    meta = {'version': FORMAT_VERSION,
+            'global_mean': scorer.global_mean,
+            'rating_scale': list(scorer.rating_scale),
+            'biased': bool(scorer.biased),
+            'n_users': int(scorer.pu.shape[0]),
+            'n_items': int(scorer.qi.shape[0]),
+            'n_factors': int(scorer.qi.shape[1]),
+            'source_fingerprint': None if source_path is None
+            else [str(v) for v in source_fingerprint((source_path,))]}
+    if n_ratings is not None:
+        meta['n_ratings'] = n_ratings
+    meta.update(extra or {})
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    publish(tmp_dir, bundle_dir)
+    return bundle_dir
+
+
+def read_meta(bundle_dir=BUNDLE_DIR):
+    """Read and validate a bundle's `meta.json`."""
+    with open(os.path.join(bundle_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model bundle version: {meta.get('version')}")
+    return meta
+
+
+def load_bundle(bundle_dir=BUNDLE_DIR, mmap_mode='r'):
+    """Load a model bundle as an `SVDScorer`.
+
+    Parameters
+    ----------
+    bundle_dir : str
+        Bundle directory written by `export_bundle`.
+    mmap_mode : str or None
+        Passed to `np.load`; 'r' shares pages between processes.
+
+    Returns
+    -------
+    SVDScorer
+        Scorer over the (memory-mapped) bundle arrays.
+
+    """
+    # Every file comes from the version the bundle pointed to right now
+    bundle_dir = resolve(bundle_dir)
+    meta = read_meta(bundle_dir)
+    arrays = {name: np.load(os.path.join(bundle_dir, name + '.npy'), mmap_mode=mmap_mode)
+              for name in _ARRAYS}
+    return SVDScorer(global_mean=meta['global_mean'],
+                     rating_scale=tuple(meta['rating_scale']),
+                     biased=meta['biased'], **arrays)
+
+
+def is_stale(bundle_dir=BUNDLE_DIR, model_path=MODEL_PATH):
+    """Whether the bundle is missing or older than the pickled model.
+
+    A bundle exported from the pickle is stale once the pickle's content
+    changes. A bundle without a recorded source (e.g. written by a
+    trainer) is stale once the pickle is modified after the bundle was
+    published.
+
+    """
+    bundle_dir = resolve(bundle_dir)
+    try:
+        meta = read_meta(bundle_dir)
+    except (OSError, ValueError):
+        return True
+    if not os.path.exists(model_path):
+        return False
+    recorded = meta.get('source_fingerprint')
+    if recorded is None:
+        return os.path.getmtime(model_path) > os.path.getmtime(os.path.join(bundle_dir, 'meta.json'))
+    return not np.array_equal(np.array(recorded, dtype=str), source_fingerprint((model_path,)))
+
+
+def load_scorer(model_path=MODEL_PATH, bundle_dir=BUNDLE_DIR, export=True):
+    """Load the scoring model, preferring a current bundle.
+
+    Falls back to unpickling `model_path` (and exporting a bundle from it
+    for the next start) when the bundle is missing or stale. The export
+    only happens when no other writer (e.g. a trainer) holds the bundle
+    lock, and only if the bundle is still stale once the lock is held.
+
+    Parameters
+    ----------
+    model_path : str
+        Pickled `surprise` SVD model.
+    bundle_dir : str
+        Model bundle directory.
+    export : bool
+        Export a bundle after falling back to the pickle.
+
+    Returns
+    -------
+    SVDScorer
+        Scorer for the current model.
+
+    """
+    if not is_stale(bundle_dir, model_path):
+        return load_bundle(bundle_dir)
+    with open(model_path, 'rb') as f:
+        scorer = SVDScorer.from_model(pickle.load(f))
+    if export:
+        try:
+            with write_lock(bundle_dir, blocking=False) as acquired:
+                if acquired and is_stale(bundle_dir, model_path):
+                    export_bundle(scorer, bundle_dir, source_path=model_path, locked=True)
+            if not is_stale(bundle_dir, model_path):
+                return load_bundle(bundle_dir)
+        except (OSError, ValueError):
+            pass
+    return scorer
+
+
+if __name__ == '__main__':
+    model_path = sys.argv[1] if len(sys.argv) > 1 else MODEL_PATH
+    bundle_dir = sys.argv[2] if len(sys.argv) > 2 else BUNDLE_DIR
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    export_bundle(model, bundle_dir, source_path=model_path)
+    print(f"Exported {model_path} to: {bundle_dir}")
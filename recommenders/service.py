@@ -0,0 +1,307 @@
+"""
+
+    Local HTTP/JSON recommendation service with request micro-batching.
+
+    Author: Explore Data Science Academy.
+
+    Description: Keeps the models loaded once in a single process and
+    serves `collab_model` / `content_model` over HTTP on localhost, so
+    Streamlit sessions (and anything else) share one copy of the models.
+    Requests arriving within a few milliseconds of each other are
+    coalesced per algorithm into one call of `collab_model_batch` /
+    `content_model_batch`, i.e. one batched matrix computation. Results
+    go through the recommendation cache first, so repeated favourite
+    sets never reach the batcher.
+
+    Endpoints:
+        POST /recommend  {"algorithm": "collab"|"content",
+                          "movies": [...], "top_n": 10}
+                         -> {"recommendations": [...]}
+        POST /search     {"query": "matr", "limit": 10}
+                         -> {"titles": [...]}  (title search)
+        GET  /health     model load state and uptime
+        GET  /latency    request latency percentiles and batch sizes
+
+    Usage: python -m recommenders.service [--port 8502]
+               [--max-batch 64] [--max-wait-ms 5]
+
+"""
+# Script dependencies
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.registry import registry
+from utils.result_cache import recommendation_cache
+from utils.instrumentation import StageStats
+
+HOST = '127.0.0.1'
+PORT = 8502
+# Resources the batched recommenders need
+SERVED_RESOURCES = ('catalog', 'svd_scorer', 'content_index')
+
+
+def served_resources():
+    """`SERVED_RESOURCES` plus those the collaborative switches add."""
+    from recommenders.collaborative_based import USE_ANN_INDEX, USE_NEIGHBOUR_TABLE
+    return (SERVED_RESOURCES + (('ann_index',) if USE_ANN_INDEX else ())
+            + (('item_neighbours',) if USE_NEIGHBOUR_TABLE else ()))
+
+
+class UnknownTitleError(KeyError):
+    """A favourite title is not in the catalogue."""
+
+
+class MicroBatcher:
+    """Coalesces concurrent single queries into batched model calls.
+
+    The first query to arrive opens a batch; the batch is run once it
+    holds `max_batch` queries or `max_wait` seconds have passed,
+    whichever is first. Queries with different `top_n` in one batch are
+    run as separate calls.
+
+    Parameters
+    ----------
+    batch_fn : callable
+        `batch_fn(movie_lists, top_n=...)` returning one result (or
+        `None` for unresolvable titles) per favourite list.
+    max_batch : int
+        Most queries per batch.
+    max_wait : float
+        Seconds a batch stays open for more queries.
+
+    """
+
+    def __init__(self, batch_fn, max_batch=64, max_wait=0.005):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batch_sizes = deque(maxlen=1000)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, movie_list, top_n=10):
+        """Queue one query; returns a Future of its recommendations."""
+        future = Future()
+        self._queue.put((list(movie_list), top_n, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            self.batch_sizes.append(len(batch))
+            by_top_n = {}
+            for query in batch:
+                by_top_n.setdefault(query[1], []).append(query)
+            for top_n, queries in by_top_n.items():
+                self._run(top_n, queries)
+
+    def _run(self, top_n, queries):
+        try:
+            results = self.batch_fn([movies for movies, _, _ in queries], top_n=top_n)
+        except Exception as error:
+            for _, _, future in queries:
+                future.set_exception(error)
+            return
+        for (movies, _, future), result in zip(queries, results):
+            if result is None:
+                future.set_exception(UnknownTitleError(movies))
+            else:
+                future.set_result(list(result))
+
+    def stats(self):
+        sizes = list(self.batch_sizes)
+        return {'batches': len(sizes), 'mean_batch': sum(sizes) / max(len(sizes), 1),
+                'max_batch': max(sizes, default=0), 'queued': self._queue.qsize()}
+
+
+class RecommendationService:
+    """Batched, cached recommenders plus latency bookkeeping.
+
+    Parameters
+    ----------
+    max_batch : int
+        Most queries per batched model call.
+    max_wait : float
+        Seconds a batch stays open for more queries.
+    timeout : float
+        Seconds a request waits for its batch.
+
+    """
+
+    def __init__(self, max_batch=64, max_wait=0.005, timeout=30.0):
+        from recommenders.collaborative_based import collab_model_batch
+        from recommenders.content_based import content_model_batch
+        self.timeout = timeout
+        self.started = time.time()
+        self.batchers = {'collab': MicroBatcher(collab_model_batch, max_batch, max_wait),
+                         'content': MicroBatcher(content_model_batch, max_batch, max_wait)}
+        self.latency = {name: StageStats(name) for name in self.batchers}
+        self._lock = threading.Lock()
+
+    def recommend(self, algorithm, movie_list, top_n=10):
+        """Recommendations for one favourite list.
+
+        Raises
+        ------
+        KeyError
+            For an unknown algorithm.
+        UnknownTitleError
+            When a favourite is not in the catalogue.
+
+        """
+        batcher = self.batchers[algorithm]
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = recommendation_cache.get_or_compute(
+                algorithm, movie_list, top_n,
+                lambda movies, n: batcher.submit(movies, n).result(self.timeout))
+            failed = False
+            return result
+        finally:
+            with self._lock:
+                self.latency[algorithm].add(time.perf_counter() - start, 0, 0, failed)
+
+    def search(self, query, limit=10):
+        """Best matching catalogue titles for a (partial) query."""
+        return registry.get('title_search').search(query, limit=limit)
+
+    def health(self):
+        loaded = {name: registry.is_loaded(name) for name in served_resources()}
+        return {'status': 'ok' if all(loaded.values()) else 'loading', 'loaded': loaded,
+                'uptime_s': time.time() - self.started}
+
+    def latency_report(self):
+        with self._lock:
+            requests = {name: stats.summary() for name, stats in self.latency.items()}
+        return {'requests': requests,
+                'batches': {name: batcher.stats() for name, batcher in self.batchers.items()},
+                'cache': recommendation_cache.stats()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    service = None
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, self.service.health())
+        elif self.path == '/latency':
+            self._send(200, self.service.latency_report())
+        else:
+            self._send(404, {'error': f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        if self.path == '/search':
+            self._search()
+            return
+        if self.path != '/recommend':
+            self._send(404, {'error': f"Unknown endpoint {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+            algorithm = request.get('algorithm', 'collab')
+            movies = [str(title) for title in request['movies']]
+            top_n = int(request.get('top_n', 10))
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            self._send(400, {'error': f"Malformed request: {error}"})
+            return
+        if algorithm not in self.service.batchers:
+            self._send(400, {'error': f"Unknown algorithm {algorithm!r}"})
+            return
+        try:
+            recommendations = self.service.recommend(algorithm, movies, top_n)
+        except UnknownTitleError:
+            self._send(404, {'error': 'A favourite movie is not in the catalogue'})
+        except Exception as error:
+            self._send(500, {'error': repr(error)})
+        else:
+            self._send(200, {'recommendations': recommendations})
+
+    def _search(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+            query = str(request['query'])
+            limit = int(request.get('limit', 10))
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            self._send(400, {'error': f"Malformed request: {error}"})
+            return
+        try:
+            titles = self.service.search(query, limit)
+        except Exception as error:
+            self._send(500, {'error': repr(error)})
+        else:
+            self._send(200, {'titles': [str(title) for title in titles]})
+
+    def log_message(self, format, *args):
+        # Per-request logging would dominate the cost of a cached request
+        pass
+
+
+def serve(port=PORT, max_batch=64, max_wait=0.005, warm_up=True):
+    """Run the service on localhost until interrupted.
+
+    With `warm_up` the models load on a background thread while the
+    server already answers; /health reports "loading" until they are in.
+
+    """
+    service = RecommendationService(max_batch=max_batch, max_wait=max_wait)
+    if warm_up:
+        registry.warm_up(served_resources(), background=True)
+    handler = type('Handler', (_Handler,), {'service': service})
+    server = ThreadingHTTPServer((HOST, port), handler)
+    server.daemon_threads = True
+    print(f"Serving recommendations on http://{HOST}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local recommendation service.')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--no-warm-up', action='store_true',
+                        help='Load models on the first request instead of at start.')
+    args = parser.parse_args(argv)
+    serve(port=args.port, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000,
+          warm_up=not args.no_warm_up)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+
+    Client of the local recommendation service.
+
+    Author: Explore Data Science Academy.
+
+    Description: Thin HTTP/JSON client of `recommenders.service`. Its
+    `model(...)` functions have the same signature as `collab_model` and
+    `content_model`, so the app can call the service in their place, and
+    `search` stands in for the title search index.
+    Only the standard library is used; nothing is loaded locally.
+
+"""
+# Script dependencies
+import json
+import urllib.error
+import urllib.request
+
+
+class ServiceError(RuntimeError):
+    """The service rejected a request or could not be reached."""
+
+
+class ServiceClient:
+    """Calls a running recommendation service.
+
+    Parameters
+    ----------
+    url : str
+        Base URL, e.g. http://127.0.0.1:8502.
+    timeout : float
+        Seconds to wait for a response.
+
+    """
+
+    def __init__(self, url, timeout=30.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode('utf-8')
+        request = urllib.request.Request(self.url + path, data=data,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            try:
+                message = json.loads(error.read()).get('error', error.reason)
+            except ValueError:
+                message = error.reason
+            raise ServiceError(f"{error.code}: {message}") from error
+        except urllib.error.URLError as error:
+            raise ServiceError(f"Recommendation service unreachable: {error.reason}") from error
+
+    def recommend(self, algorithm, movie_list, top_n=10):
+        """Recommended titles for one favourite list."""
+        response = self._request('/recommend', {'algorithm': algorithm,
+                                                'movies': list(movie_list), 'top_n': top_n})
+        return response['recommendations']
+
+    def search(self, query, limit=10):
+        """Best matching catalogue titles for a (partial) query."""
+        return self._request('/search', {'query': query, 'limit': limit})['titles']
+
+    def health(self):
+        return self._request('/health')
+
+    def latency(self):
+        return self._request('/latency')
+
+    def model(self, algorithm):
+        """A `model(movie_list, top_n=10)` function backed by the service."""
+
+        def remote_model(movie_list, top_n=10):
+            return self.recommend(algorithm, movie_list, top_n)
+
+        remote_model.__name__ = f"{algorithm}_model"
+        return remote_model
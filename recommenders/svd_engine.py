@@ -0,0 +1,358 @@
+"""
+
+    Vectorised scoring engine for a trained SVD model.
+
+    Author: Explore Data Science Academy.
+
+    Description: Pulls the global mean, user/item biases and the `pu`/`qi`
+    factor matrices out of a fitted `surprise` SVD model once, and scores
+    any number of items against any number of users with a single NumPy
+    matrix product. Estimates follow `SVD.predict` exactly (unknown users
+    or items drop their bias and factor terms, and results are clipped to
+    the rating scale), so rankings match the `model.predict` path.
+
+"""
+# Script dependencies
+import numpy as np
+
+
+def _as_id_array(ids):
+    """Convert a sequence of raw ids into a one dimensional array.
+
+    Parameters
+    ----------
+    ids : iterable
+        Raw user or item ids.
+
+    Returns
+    -------
+    np.ndarray
+        Array of ids, `object` typed when the ids are not numeric.
+
+    """
+    if isinstance(ids, (str, bytes)) or not hasattr(ids, '__iter__'):
+        ids = [ids]
+    elif not isinstance(ids, (list, tuple, np.ndarray)):
+        ids = list(ids)
+    arr = np.asarray(ids)
+    if arr.ndim == 0:
+        arr = arr.reshape(1)
+    return arr
+
+
+def top_k(scores, k):
+    """Select the indices of the `k` highest scores.
+
+    Ties are broken by position, exactly like a stable descending sort,
+    but only the candidates at or above the k-th largest value are sorted.
+
+    Parameters
+    ----------
+    scores : np.ndarray
+        One dimensional array of scores.
+    k : int
+        Number of indices to return.
+
+    Returns
+    -------
+    np.ndarray
+        Indices of the top-k scores, best first.
+
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind='stable')
+    threshold = np.partition(scores, n - k)[n - k]
+    candidates = np.flatnonzero(scores >= threshold)
+    order = np.argsort(-scores[candidates], kind='stable')
+    return candidates[order[:k]]
+
+
+def top_k_rows(scores, k):
+    """Select the indices of the `k` highest scores in every row.
+
+    Row by row this is exactly `top_k`: every score above the row's k-th
+    largest value is kept, the remaining places go to the scores equal
+    to it in order of position, and the selection is ordered by
+    descending score (ties by position).
+
+    Parameters
+    ----------
+    scores : np.ndarray
+        Two dimensional array of scores, one query per row.
+    k : int
+        Number of indices per row.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (n_rows, min(k, n_cols)), best first.
+
+    """
+    scores = np.asarray(scores)
+    n_rows, n_cols = scores.shape
+    k = min(k, n_cols)
+    if k <= 0:
+        return np.empty((n_rows, 0), dtype=np.int64)
+    if k < n_cols:
+        threshold = np.partition(scores, n_cols - k, axis=1)[:, n_cols - k, None]
+        above = scores > threshold
+        tied = scores == threshold
+        # Earliest tied positions fill the places left after `above`
+        room = k - above.sum(axis=1, keepdims=True)
+        selected = above | (tied & (np.cumsum(tied, axis=1) <= room))
+        picked = np.nonzero(selected)[1].reshape(n_rows, k)
+    else:
+        picked = np.broadcast_to(np.arange(n_cols), (n_rows, n_cols))
+    picked_scores = np.take_along_axis(scores, picked, axis=1)
+    order = np.lexsort((picked, -picked_scores), axis=-1)
+    return np.take_along_axis(picked, order, axis=1)
+
+
+class SVDScorer:
+    """Matrix form of a biased SVD model.
+
+    Parameters
+    ----------
+    global_mean : float
+        Mean of all ratings in the training set.
+    bu, bi : np.ndarray
+        User and item biases, indexed by inner id.
+    pu, qi : np.ndarray
+        User and item factor matrices, indexed by inner id.
+    raw_uids, raw_iids : np.ndarray
+        Raw ids ordered by inner id.
+    rating_scale : tuple
+        (lowest, highest) rating used to clip estimates.
+    biased : bool
+        Whether the model was fitted with baselines.
+
+    """
+
+    def __init__(self, global_mean, bu, bi, pu, qi, raw_uids, raw_iids,
+                 rating_scale=(0.5, 5.0), biased=True):
+        self.global_mean = float(global_mean)
+        self.bu = np.asarray(bu)
+        self.bi = np.asarray(bi)
+        self.pu = np.asarray(pu)
+        self.qi = np.asarray(qi)
+        self.raw_uids = _as_id_array(raw_uids)
+        self.raw_iids = _as_id_array(raw_iids)
+        self.rating_scale = tuple(rating_scale)
+        self.biased = biased
+        self._uid_lookup = self._build_lookup(self.raw_uids)
+        self._iid_lookup = self._build_lookup(self.raw_iids)
+
+    @classmethod
+    def from_model(cls, model):
+        """Extract the scoring parameters from a fitted `surprise` SVD.
+
+        Parameters
+        ----------
+        model : surprise.SVD
+            A fitted SVD model (with its `trainset` attached).
+
+        Returns
+        -------
+        SVDScorer
+            Scorer sharing the model's parameters.
+
+        """
+        trainset = model.trainset
+        raw_uids = [trainset.to_raw_uid(u) for u in range(trainset.n_users)]
+        raw_iids = [trainset.to_raw_iid(i) for i in range(trainset.n_items)]
+        return cls(global_mean=trainset.global_mean,
+                   bu=model.bu, bi=model.bi, pu=model.pu, qi=model.qi,
+                   raw_uids=raw_uids, raw_iids=raw_iids,
+                   rating_scale=trainset.rating_scale,
+                   biased=model.biased)
+
+    @staticmethod
+    def _build_lookup(raw_ids):
+        """Build a raw -> inner id lookup for the given raw ids.
+
+        Numeric ids are resolved with a sorted array and `searchsorted`,
+        anything else falls back to a dictionary.
+
+        """
+        if raw_ids.dtype.kind in 'iuf':
+            order = np.argsort(raw_ids, kind='stable')
+            return ('sorted', raw_ids[order], order)
+        return ('dict', {raw: inner for inner, raw in enumerate(raw_ids.tolist())})
+
+    @staticmethod
+    def _resolve(lookup, ids):
+        """Map raw ids to inner ids, returning -1 for unknown ids."""
+        ids = _as_id_array(ids)
+        kind = lookup[0]
+        if kind == 'sorted' and ids.dtype.kind in 'iuf':
+            sorted_ids, order = lookup[1], lookup[2]
+            if sorted_ids.shape[0] == 0:
+                return np.full(ids.shape[0], -1, dtype=np.int64)
+            pos = np.searchsorted(sorted_ids, ids)
+            pos = np.clip(pos, 0, sorted_ids.shape[0] - 1)
+            found = sorted_ids[pos] == ids
+            return np.where(found, order[pos], -1).astype(np.int64)
+        if kind == 'sorted':
+            # Non numeric query against numeric ids (e.g. a title).
+            mapping = dict(zip(lookup[1].tolist(), lookup[2].tolist()))
+        else:
+            mapping = lookup[1]
+        return np.fromiter((mapping.get(raw, -1) for raw in ids.tolist()),
+                           dtype=np.int64, count=ids.shape[0])
+
+    def fold_in(self, seed_lists, rating=None, reg=0.1):
+        """Fit user vectors for new users from the items they like.
+
+        Each user is a regularised least-squares fit of (factors, bias)
+        against the item factors of their seed items, all treated as
+        rated `rating`. With only a handful of seeds the problem is solved
+        in its dual form, a tiny (n_seeds x n_seeds) system.
+
+        Parameters
+        ----------
+        seed_lists : list (np.ndarray)
+            Inner ids of each user's liked items (may be empty).
+        rating : float, optional
+            Rating given to every seed, the top of the scale by default.
+        reg : float
+            Ridge regularisation of the factors and bias.
+
+        Returns
+        -------
+        tuple (np.ndarray, np.ndarray)
+            User factors (n_users, n_factors) and biases (n_users,).
+
+        """
+        rating = self.rating_scale[1] if rating is None else rating
+        n_factors = self.qi.shape[1]
+        pu = np.zeros((len(seed_lists), n_factors))
+        bu = np.zeros(len(seed_lists))
+        for row, seeds in enumerate(seed_lists):
+            seeds = np.asarray(seeds, dtype=np.int64)
+            if seeds.shape[0] == 0:
+                continue
+            x = np.ones((seeds.shape[0], n_factors + 1))
+            x[:, :n_factors] = self.qi[seeds]
+            y = np.full(seeds.shape[0], float(rating))
+            if self.biased:
+                y = y - self.global_mean - self.bi[seeds]
+            if seeds.shape[0] <= n_factors:
+                w = x.T @ np.linalg.solve(x @ x.T + reg * np.eye(seeds.shape[0]), y)
+            else:
+                w = np.linalg.solve(x.T @ x + reg * np.eye(n_factors + 1), x.T @ y)
+            pu[row] = w[:n_factors]
+            bu[row] = w[n_factors] if self.biased else 0.0
+        return pu, bu
+
+    def rank_scores(self, pu, bu=None):
+        """Unclipped estimates of every item for the given user vectors.
+
+        Clipping is skipped so that items above the top of the rating
+        scale still rank in order.
+
+        Parameters
+        ----------
+        pu : np.ndarray
+            User factors, shape (n_users, n_factors).
+        bu : np.ndarray, optional
+            User biases, shape (n_users,).
+
+        Returns
+        -------
+        np.ndarray
+            Estimates of shape (n_users, n_items).
+
+        """
+        scores = np.atleast_2d(pu) @ np.asarray(self.qi).T
+        if self.biased:
+            scores += self.global_mean + np.asarray(self.bi)[None, :]
+            if bu is not None:
+                scores += np.asarray(bu)[:, None]
+        return scores
+
+    def inner_uids(self, raw_uids):
+        """Inner user ids for `raw_uids` (-1 where unknown)."""
+        return self._resolve(self._uid_lookup, raw_uids)
+
+    def inner_iids(self, raw_iids):
+        """Inner item ids for `raw_iids` (-1 where unknown)."""
+        return self._resolve(self._iid_lookup, raw_iids)
+
+    def score_inner(self, inner_iids, inner_uids):
+        """Estimate ratings for every (item, user) pair of inner ids.
+
+        Parameters
+        ----------
+        inner_iids : np.ndarray
+            Inner item ids, -1 for unknown items.
+        inner_uids : np.ndarray
+            Inner user ids, -1 for unknown users.
+
+        Returns
+        -------
+        np.ndarray
+            Estimates of shape (n_items, n_users).
+
+        """
+        inner_iids = np.asarray(inner_iids, dtype=np.int64)
+        inner_uids = np.asarray(inner_uids, dtype=np.int64)
+        known_i = inner_iids >= 0
+        known_u = inner_uids >= 0
+        ii = np.where(known_i, inner_iids, 0)
+        uu = np.where(known_u, inner_uids, 0)
+
+        qi = self.qi[ii] * known_i[:, None]
+        pu = self.pu[uu] * known_u[:, None]
+        est = qi @ pu.T
+        if self.biased:
+            est = est + np.where(known_i, self.bi[ii], 0.0)[:, None]
+            est = est + np.where(known_u, self.bu[uu], 0.0)[None, :]
+            est = est + self.global_mean
+        lower, upper = self.rating_scale
+        return np.clip(est, lower, upper)
+
+    def score(self, raw_iids, raw_uids):
+        """Estimate ratings for every (item, user) pair of raw ids.
+
+        Parameters
+        ----------
+        raw_iids : iterable
+            Raw item ids (MovieLens movie ids).
+        raw_uids : iterable
+            Raw user ids.
+
+        Returns
+        -------
+        np.ndarray
+            Estimates of shape (n_items, n_users).
+
+        """
+        return self.score_inner(self.inner_iids(raw_iids),
+                                self.inner_uids(raw_uids))
+
+    def top_users(self, raw_iid, raw_uids, k=10):
+        """Return the `k` users with the highest estimate for one item.
+
+        Parameters
+        ----------
+        raw_iid : int
+            Raw item id.
+        raw_uids : iterable
+            Candidate raw user ids.
+        k : int
+            Number of users to return.
+
+        Returns
+        -------
+        tuple (np.ndarray, np.ndarray)
+            Raw user ids and their estimates, best first.
+
+        """
+        raw_uids = _as_id_array(raw_uids)
+        est = self.score([raw_iid], raw_uids)[0]
+        best = top_k(est, k)
+        return raw_uids[best], est[best]
@@ -16,8 +16,9 @@ import surprise
 import pickle
 
 # Importing datasets
-ratings = pd.read_csv('ratings.csv')
-ratings.drop('timestamp',axis=1,inplace=True)
+# Only the needed columns are parsed, with compact dtypes
+ratings = pd.read_csv('ratings.csv', usecols=['userId', 'movieId', 'rating'],
+                      dtype={'userId': np.int32, 'movieId': np.int32, 'rating': np.float32})
 
 def svd_pp(save_path):
     # Check the range of the rating
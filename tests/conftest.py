@@ -0,0 +1,17 @@
+"""
+
+    Shared pytest configuration.
+
+    Author: Explore Data Science Academy.
+
+    Description: Makes the repository root importable, so tests run with
+    `python -m pytest` from the root resolve `recommenders` and `utils`.
+
+"""
+# Script dependencies
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
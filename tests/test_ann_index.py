@@ -0,0 +1,61 @@
+"""
+
+    Tests of the approximate nearest-neighbour index.
+
+    Author: Explore Data Science Academy.
+
+    Description: Probing every cell is an exact search, the default
+    probes keep most of the exact top-k, and a saved index is only
+    reused for the model it was built from.
+
+"""
+# Script dependencies
+import numpy as np
+
+from recommenders.ann_index import IVFIndex, load_ann_index
+from recommenders.svd_engine import SVDScorer, top_k
+
+N_ITEMS, N_FACTORS = 2000, 16
+
+
+def item_factors(seed=0):
+    rng = np.random.default_rng(seed)
+    # Clustered factors, like those of a trained model
+    centres = rng.normal(size=(20, N_FACTORS))
+    return (centres[rng.integers(0, 20, N_ITEMS)]
+            + rng.normal(0, 0.5, (N_ITEMS, N_FACTORS))).astype(np.float32)
+
+
+def test_recall_against_exact_top_k():
+    qi = item_factors()
+    index = IVFIndex.build(qi, np.arange(N_ITEMS))
+    unit = qi / np.linalg.norm(qi, axis=1, keepdims=True)
+    rng = np.random.default_rng(1)
+    recalls = []
+    for _ in range(50):
+        favourites = rng.choice(N_ITEMS, 3, replace=False)
+        sims = unit @ unit[favourites].mean(axis=0)
+        sims[favourites] = -np.inf
+        exact = top_k(sims, 10)
+        full, _ = index.similar_items(favourites, k=10, n_probe=index.n_lists)
+        np.testing.assert_array_equal(full, exact)
+        approximate, _ = index.similar_items(favourites, k=10)
+        recalls.append(len(set(approximate) & set(exact)) / 10)
+    assert np.mean(recalls) >= 0.85
+
+
+def scorer(qi):
+    n_users = 3
+    return SVDScorer(3.5, np.zeros(n_users), np.zeros(qi.shape[0]), np.zeros((n_users, N_FACTORS)),
+                     qi, np.arange(1, n_users + 1), np.arange(N_ITEMS))
+
+
+def test_saved_index_is_reused_for_its_model_only(tmp_path):
+    directory = str(tmp_path / 'ann_index')
+    first = load_ann_index(scorer(item_factors(0)), np.array(['a', 'b']), directory)
+    reused = load_ann_index(scorer(item_factors(1)), np.array(['a', 'b']), directory)
+    np.testing.assert_array_equal(reused.centroids, first.centroids)
+    assert not reused.vectors.flags.owndata
+    rebuilt = load_ann_index(scorer(item_factors(1)), np.array(['a', 'c']), directory)
+    assert not np.array_equal(rebuilt.centroids, first.centroids)
+    np.testing.assert_array_equal(IVFIndex.load(directory).fingerprint, ['a', 'c'])
@@ -0,0 +1,59 @@
+"""
+
+    Tests of offline bulk recommendation scoring.
+
+    Author: Explore Data Science Academy.
+
+    Description: The command line writes, in input order and for every
+    input format, what `collab_model` recommends for each query.
+
+"""
+# Script dependencies
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from recommenders import collaborative_based
+from recommenders.bulk_score import main
+from recommenders.svd_engine import SVDScorer
+from utils.catalog_index import CatalogIndex
+from utils.registry import ResourceRegistry
+
+N_USERS, N_ITEMS = 20, 25
+MOVIES = pd.DataFrame({'movieId': np.arange(1, N_ITEMS + 1),
+                       'title': [f"Movie {i} ({1980 + i})" for i in range(N_ITEMS)]})
+
+
+@pytest.fixture
+def models(monkeypatch):
+    rng = np.random.default_rng(0)
+    scorer = SVDScorer(3.5, rng.normal(0, 0.3, N_USERS), rng.normal(0, 0.3, N_ITEMS),
+                       rng.normal(0, 0.3, (N_USERS, 3)), rng.normal(0, 0.3, (N_ITEMS, 3)),
+                       np.arange(1, N_USERS + 1), MOVIES['movieId'].to_numpy())
+    registry = ResourceRegistry()
+    registry.register('catalog', lambda: CatalogIndex.from_movies(MOVIES))
+    registry.register('svd_scorer', lambda: scorer)
+    monkeypatch.setattr(collaborative_based, 'registry', registry)
+    monkeypatch.setattr(collaborative_based, 'USE_ANN_INDEX', False)
+    monkeypatch.setattr(collaborative_based, 'USE_NEIGHBOUR_TABLE', False)
+    return collaborative_based
+
+
+def test_cli_matches_collab_model(models, tmp_path):
+    titles = MOVIES['title'].tolist()
+    queries = [titles[0:3], titles[5:6], titles[10:14], titles[20:23], titles[7:9]]
+    lines = [json.dumps({'id': 'a', 'movies': queries[0]}), json.dumps(queries[1]),
+             '\t'.join(queries[2]), '', json.dumps({'id': 'd', 'movies': queries[3]}),
+             '\t'.join(queries[4]), json.dumps(['Not A Movie (2099)'])]
+    input_path, output_path = tmp_path / 'queries.txt', tmp_path / 'out.jsonl'
+    input_path.write_text('\n'.join(lines) + '\n')
+    main([str(input_path), str(output_path), '--top-n', '4', '--batch-size', '2'])
+    records = [json.loads(line) for line in output_path.read_text().splitlines()]
+    # Blank lines are skipped but still count towards line-number ids
+    assert [record['id'] for record in records] == ['a', 2, 3, 'd', 6, 7]
+    for record, query in zip(records, queries):
+        assert record['movies'] == query
+        assert record['recommendations'] == models.collab_model(query, 4)
+    assert records[-1]['recommendations'] is None
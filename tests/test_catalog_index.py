@@ -0,0 +1,74 @@
+"""
+
+    Tests of the title / movieId catalogue index.
+
+    Author: Explore Data Science Academy.
+
+    Description: Duplicate titles resolve like the old column scans did,
+    unknown titles or ids are reported or skipped explicitly, and the
+    registry's catalogue follows changes to the movie database.
+
+"""
+# Script dependencies
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import registry as registry_module
+from utils.catalog_index import CatalogIndex
+
+MOVIES = pd.DataFrame({'movieId': [10, 20, 30, 40],
+                       'title': ['Heat (1995)', 'Emma (1996)', 'Heat (1995)', 'Up (2009)']})
+
+
+@pytest.fixture
+def index():
+    return CatalogIndex.from_movies(MOVIES)
+
+
+def test_duplicate_titles_resolve_to_the_first_movie(index):
+    scanned = MOVIES[MOVIES['title'] == 'Heat (1995)']['movieId'].iloc[0]
+    assert index.movie_id('Heat (1995)') == scanned == 10
+    assert index.movie_ids_for_title('Heat (1995)') == [10, 30]
+    assert index.duplicates == {'Heat (1995)': [10, 30]}
+
+
+def test_lookups(index):
+    assert len(index) == 4
+    assert 'Emma (1996)' in index
+    assert index.movie_ids(['Up (2009)', 'Emma (1996)']) == [40, 20]
+    np.testing.assert_array_equal(index.rows([30, 10]), [2, 0])
+    assert index.title(30) == 'Heat (1995)'
+
+
+def test_unknown_title_raises(index):
+    with pytest.raises(KeyError, match='Unknown movie title'):
+        index.movie_id('Missing (2000)')
+    assert index.movie_ids_for_title('Missing (2000)') == []
+
+
+def test_unknown_ids(index):
+    assert index.titles([40, 999, 20]) == ['Up (2009)', 'Emma (1996)']
+    with pytest.raises(KeyError):
+        index.row(999)
+    with pytest.raises(KeyError):
+        index.title(999)
+
+
+def test_registry_catalog_follows_the_movie_file(tmp_path, monkeypatch):
+    path = tmp_path / 'movies.csv'
+    MOVIES.to_csv(path, index=False)
+    monkeypatch.setattr(registry_module, 'MOVIES_PATH', str(path))
+    monkeypatch.setattr(registry_module, 'load_movies', pd.read_csv)
+    registry = registry_module.registry
+    try:
+        assert registry.get('catalog').movie_id('Up (2009)') == 40
+        assert registry.get('catalog') is registry.get('catalog')
+        MOVIES.assign(movieId=[10, 20, 30, 41]).to_csv(path, index=False)
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+        assert registry.get('catalog').movie_id('Up (2009)') == 41
+    finally:
+        registry.invalidate('movies')
+        registry.invalidate('catalog')
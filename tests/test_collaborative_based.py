@@ -0,0 +1,95 @@
+"""
+
+    Tests of the collaborative recommenders.
+
+    Author: Explore Data Science Academy.
+
+    Description: The batched entry point used by the recommendation
+    service returns what `collab_model` returns for the same query,
+    under every collaborative switch, and favourites unknown to the
+    model fall back to the most rated movies.
+
+"""
+# Script dependencies
+import numpy as np
+import pandas as pd
+import pytest
+
+from recommenders import collaborative_based
+from recommenders.ann_index import IVFIndex
+from recommenders.item_neighbours import NeighbourTable
+from recommenders.svd_engine import SVDScorer
+from utils.catalog_index import CatalogIndex
+from utils.registry import ResourceRegistry
+
+N_USERS, N_ITEMS = 40, 30
+MOVIES = pd.DataFrame({'movieId': np.arange(100, 100 + N_ITEMS),
+                       'title': [f"Movie {i} ({1980 + i})" for i in range(N_ITEMS)]})
+QUERIES = [list(MOVIES['title'][[0, 5, 9]]), list(MOVIES['title'][[3]]),
+           list(MOVIES['title'][[12, 20, 21, 29]])]
+
+
+@pytest.fixture
+def models(monkeypatch):
+    rng = np.random.default_rng(0)
+    scorer = SVDScorer(3.5, rng.normal(0, 0.3, N_USERS), rng.normal(0, 0.3, N_ITEMS),
+                       rng.normal(0, 0.3, (N_USERS, 4)), rng.normal(0, 0.3, (N_ITEMS, 4)),
+                       np.arange(1, N_USERS + 1), MOVIES['movieId'].to_numpy())
+    users, items = np.nonzero(rng.random((N_USERS, N_ITEMS)) < 0.3)
+    ratings_df = pd.DataFrame({'userId': users + 1, 'movieId': items + 100,
+                               'rating': rng.integers(1, 6, users.shape[0]).astype(float)})
+    registry = ResourceRegistry()
+    registry.register('catalog', lambda: CatalogIndex.from_movies(MOVIES))
+    registry.register('ratings', lambda: ratings_df)
+    registry.register('movie_popularity', collaborative_based._movie_popularity)
+    registry.register('svd_scorer', lambda: scorer)
+    registry.register('item_neighbours', lambda: NeighbourTable.build(ratings_df, k=10))
+    registry.register('ann_index', lambda: IVFIndex.build(scorer.qi, scorer.raw_iids, n_lists=4))
+    monkeypatch.setattr(collaborative_based, 'registry', registry)
+    return collaborative_based
+
+
+@pytest.mark.parametrize('switch', [None, 'USE_ANN_INDEX', 'USE_NEIGHBOUR_TABLE'])
+def test_batch_matches_single_queries(models, monkeypatch, switch):
+    monkeypatch.setattr(models, 'USE_ANN_INDEX', switch == 'USE_ANN_INDEX')
+    monkeypatch.setattr(models, 'USE_NEIGHBOUR_TABLE', switch == 'USE_NEIGHBOUR_TABLE')
+    batch = models.collab_model_batch(QUERIES, top_n=5)
+    for query, result in zip(QUERIES, batch):
+        assert models.collab_model_batch([query], top_n=5)[0] == models.collab_model(query, 5)
+        assert result == models.collab_model(query, 5)
+        assert result and not set(result) & set(query)
+
+
+@pytest.mark.parametrize('switch', [None, 'USE_ANN_INDEX', 'USE_NEIGHBOUR_TABLE'])
+def test_unknown_titles_give_none(models, monkeypatch, switch):
+    monkeypatch.setattr(models, 'USE_ANN_INDEX', switch == 'USE_ANN_INDEX')
+    monkeypatch.setattr(models, 'USE_NEIGHBOUR_TABLE', switch == 'USE_NEIGHBOUR_TABLE')
+    batch = models.collab_model_batch([['Not A Movie (2099)'], QUERIES[0]], top_n=5)
+    assert batch[0] is None
+    assert batch[1] == models.collab_model(QUERIES[0], 5)
+
+
+def test_batch_matches_single_queries_on_tied_scores(models):
+    # Items share factors and biases in groups of five: every score ties
+    qi = np.repeat(np.eye(3)[[0, 1, 2, 0, 1, 2]], 5, axis=0)
+    tied = SVDScorer(3.5, np.zeros(N_USERS), np.zeros(N_ITEMS), np.ones((N_USERS, 3)), qi,
+                     np.arange(1, N_USERS + 1), MOVIES['movieId'].to_numpy())
+    models.registry.register('svd_scorer', lambda: tied, replace=True)
+    batch = models.collab_model_batch(QUERIES, top_n=7)
+    assert batch == [models.collab_model(query, 7) for query in QUERIES]
+
+
+def test_unknown_favourites_fall_back_to_the_most_rated(models):
+    # A model trained without the first five movies
+    scorer = models.registry.get('svd_scorer')
+    known = SVDScorer(scorer.global_mean, scorer.bu, scorer.bi[5:], scorer.pu, scorer.qi[5:],
+                      scorer.raw_uids, scorer.raw_iids[5:])
+    models.registry.register('svd_scorer', lambda: known, replace=True)
+    query = list(MOVIES['title'][[0, 3]])
+    counts = models.registry.get('ratings')['movieId'].value_counts()
+    ranked = sorted(counts.index, key=lambda movie_id: (-counts[movie_id], movie_id))
+    expected = [MOVIES['title'][movie_id - 100] for movie_id in ranked
+                if movie_id not in (100, 103)][:5]
+    assert models.collab_model(query, 5) == expected
+    assert models.collab_model_batch([query, QUERIES[0]], top_n=5) == [
+        expected, models.collab_model(QUERIES[0], 5)]
@@ -0,0 +1,66 @@
+"""
+
+    Tests of the genre content index.
+
+    Author: Explore Data Science Academy.
+
+    Description: Batched recommendations rank like a direct cosine
+    computation whatever the chunk size, and the registry's content
+    index follows changes to the movie database.
+
+"""
+# Script dependencies
+import os
+
+import numpy as np
+import pandas as pd
+
+from recommenders import content_based, content_index
+from utils import registry as registry_module
+from utils.shared_store import SharedStore
+
+GENRES = ['Action|Crime', 'Drama', 'Action', 'Comedy|Drama', 'Crime|Drama|Thriller',
+          'Comedy', 'Action|Thriller', '(no genres listed)', 'Drama|Romance', 'Comedy|Romance']
+MOVIES = pd.DataFrame({'movieId': np.arange(1, 11),
+                       'title': [f"Movie {i} ({1990 + i})" for i in range(1, 11)],
+                       'genres': GENRES})
+
+
+def test_batches_rank_like_direct_cosine():
+    index = content_index.ContentIndex.from_movies(MOVIES)
+    seed_lists = [np.array([0]), np.array([1, 5]), np.array([4, 6, 9])]
+    onehot = np.array([[genre in genres.split('|') for genre in index.vocabulary.genres]
+                       for genres in GENRES], dtype=float)
+    norms = np.linalg.norm(onehot, axis=1)
+    for chunk_size in (1, 2, 32):
+        batch = index.recommend_batch(seed_lists, top_n=4, chunk_size=chunk_size)
+        for seeds, rows in zip(seed_lists, batch):
+            np.testing.assert_array_equal(rows, index.recommend(seeds, top_n=4))
+            sims = onehot[seeds] @ onehot.T / np.maximum(np.outer(norms[seeds], norms), 1e-12)
+            expected = sims.max(axis=0)
+            expected[seeds] = -np.inf
+            np.testing.assert_allclose(np.sort(expected)[::-1][:4], expected[rows], rtol=1e-6)
+            assert not set(rows) & set(seeds)
+
+
+def test_registry_index_follows_the_movie_file(tmp_path, monkeypatch):
+    path = tmp_path / 'movies.csv'
+    MOVIES.to_csv(path, index=False)
+    monkeypatch.setattr(registry_module, 'MOVIES_PATH', str(path))
+    monkeypatch.setattr(registry_module, 'load_movies', pd.read_csv)
+    monkeypatch.setattr(content_based, 'MOVIES_PATH', str(path))
+    monkeypatch.setattr(content_index, 'shared_store', SharedStore(str(tmp_path / 'shared')))
+    registry = registry_module.registry
+    names = ('movies', 'catalog', 'genre_vocabulary', 'content_index')
+    try:
+        first = content_based.content_model(['Movie 3 (1993)'], top_n=2)
+        assert first == ['Movie 1 (1991)', 'Movie 7 (1997)']
+        # Movie 2 becomes the closest match to Movie 3; Movie 8 gets a new genre
+        changed = ['Action|Crime', 'Action'] + GENRES[2:7] + ['Western'] + GENRES[8:]
+        MOVIES.assign(genres=changed).to_csv(path, index=False)
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+        assert 'Western' in registry.get('genre_vocabulary').genres
+        assert content_based.content_model(['Movie 3 (1993)'], top_n=1) == ['Movie 2 (1992)']
+    finally:
+        for name in names:
+            registry.invalidate(name)
@@ -0,0 +1,101 @@
+"""
+
+    Tests of the columnar CSV cache.
+
+    Author: Explore Data Science Academy.
+
+    Description: A cached table decodes to the same values as the CSV,
+    whatever string dtype pandas parses text into, and a changed CSV is
+    converted again instead of served from the old cache, without
+    touching the caches of other files.
+
+"""
+# Script dependencies
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils import data_loader
+from utils.data_loader import load_table
+
+MOVIES = pd.DataFrame({'movieId': [1, 2, 3, 4],
+                       'title': ['Heat (1995)', 'Emma (1996)', None, 'Up (2009)'],
+                       'genres': ['Action|Crime', 'Drama', 'Drama', 'Animation']})
+
+
+def write_csv(path, frame):
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+def test_round_trip(tmp_path):
+    path = write_csv(tmp_path / 'movies.csv', MOVIES)
+    table = load_table(path, cache_dir=str(tmp_path / 'cache'))
+    assert table.names == ['movieId', 'title', 'genres']
+    assert table.columns['movieId'].dtype == np.int32
+    assert table.columns['title'].dtype == np.int32
+    frame = table.to_frame()
+    assert frame['movieId'].tolist() == [1, 2, 3, 4]
+    assert frame['title'].tolist()[:2] == ['Heat (1995)', 'Emma (1996)']
+    assert pd.isna(frame['title'].iloc[2])
+    genres = table.to_frame(['genres'], categorical=('genres',))['genres']
+    assert isinstance(genres.dtype, pd.CategoricalDtype)
+    assert genres.tolist() == MOVIES['genres'].tolist()
+
+
+def test_text_detected_in_later_chunks(tmp_path, monkeypatch):
+    # The first chunk parses as numbers, later ones hold text
+    frame = pd.DataFrame({'movieId': [1, 2, 3, 4], 'tag': ['7', '8', 'x', 'y']})
+    path = write_csv(tmp_path / 'tags.csv', frame)
+    write_cache = data_loader._write_cache
+    monkeypatch.setattr(data_loader, '_write_cache',
+                        lambda path, target: write_cache(path, target, chunk_size=2))
+    table = load_table(path, cache_dir=str(tmp_path / 'cache'))
+    assert [str(value) for value in table.values('tag')] == ['7', '8', 'x', 'y']
+
+
+def test_numbers_before_text_keep_their_text(tmp_path, monkeypatch):
+    # The first chunk parses as floats (7.0) and drops leading zeros
+    frame = pd.DataFrame({'movieId': [1, 2, 3, 4, 5], 'tag': ['7', None, '007', 'x', '7.50']})
+    path = write_csv(tmp_path / 'tags.csv', frame)
+    write_cache = data_loader._write_cache
+    monkeypatch.setattr(data_loader, '_write_cache',
+                        lambda path, target: write_cache(path, target, chunk_size=3))
+    values = load_table(path, cache_dir=str(tmp_path / 'cache')).values('tag').tolist()
+    assert values[0] == '7' and pd.isna(values[1]) and values[2:] == ['007', 'x', '7.50']
+
+
+def test_changed_csv_invalidates_the_cache(tmp_path):
+    path = write_csv(tmp_path / 'movies.csv', MOVIES)
+    cache_dir = str(tmp_path / 'cache')
+    first = load_table(path, cache_dir=cache_dir)
+    assert load_table(path, cache_dir=cache_dir) is first
+
+    changed = MOVIES.assign(title=['Heat (1995)', 'Emma (1996)', 'Jaws (1975)', 'Up (2009)'])
+    write_csv(tmp_path / 'movies.csv', changed)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+    second = load_table(path, cache_dir=cache_dir)
+    assert second is not first
+    assert second.values('title').tolist() == changed['title'].tolist()
+    # The outdated conversion was removed
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_files_sharing_a_name_keep_their_caches(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    paths = [write_csv(tmp_path / 'a' / 'movies.csv', MOVIES),
+             write_csv(tmp_path / 'b' / 'movies.csv', MOVIES.iloc[:2]),
+             write_csv(tmp_path / 'a' / 'movies-small.csv', MOVIES.iloc[:1])]
+    for path in paths:
+        load_table(path, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 3
+
+    write_csv(tmp_path / 'a' / 'movies.csv', MOVIES.iloc[:3])
+    os.utime(paths[0], ns=(0, os.stat(paths[0]).st_mtime_ns + 10 ** 9))
+    load_table(paths[0], cache_dir=cache_dir)
+    # Only the outdated conversion of a/movies.csv was replaced
+    assert len(os.listdir(cache_dir)) == 3
+    assert [len(load_table(path, cache_dir=cache_dir)) for path in paths] == [3, 2, 1]
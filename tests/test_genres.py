@@ -0,0 +1,44 @@
+"""
+
+    Tests of the bitmask genre encoding.
+
+    Author: Explore Data Science Academy.
+
+    Description: Genre filters and the bitmask cosine agree with the
+    `|`-separated genre strings they encode.
+
+"""
+# Script dependencies
+import numpy as np
+
+from utils.genres import GenreVocabulary, cosine
+
+GENRES = ['Action|Crime', 'Drama', 'Action|Drama|Crime', '(no genres listed)', None]
+
+
+def test_has_any_and_all():
+    vocabulary = GenreVocabulary.from_genres(GENRES)
+    masks = vocabulary.encode(GENRES)
+    assert vocabulary.has(masks, 'Drama').tolist() == [False, True, True, False, False]
+    assert vocabulary.has(masks, ['Crime', 'Drama']).tolist() == [True, True, True, False, False]
+    assert vocabulary.has(masks, ['Crime', 'Drama'], require_all=True).tolist() == [
+        False, False, True, False, False]
+
+
+def test_unknown_genres_match_nothing():
+    vocabulary = GenreVocabulary.from_genres(GENRES)
+    masks = vocabulary.encode(GENRES)
+    assert not vocabulary.has(masks, 'Western').any()
+    assert not vocabulary.has(masks, 'Western', require_all=True).any()
+    assert not vocabulary.has(masks, ['Drama', 'Western'], require_all=True).any()
+    assert vocabulary.has(masks, ['Drama', 'Western']).tolist() == [False, True, True, False, False]
+
+
+def test_cosine_matches_one_hot_vectors():
+    vocabulary = GenreVocabulary.from_genres(GENRES)
+    masks = vocabulary.encode(GENRES)
+    one_hot = vocabulary.bits(masks).astype(float)
+    norms = np.linalg.norm(one_hot, axis=1)
+    expected = np.divide(one_hot @ one_hot.T, np.outer(norms, norms),
+                         out=np.zeros((len(GENRES), len(GENRES))), where=np.outer(norms, norms) > 0)
+    np.testing.assert_allclose(cosine(masks, masks), expected, rtol=1e-6)
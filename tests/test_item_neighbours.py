@@ -0,0 +1,76 @@
+"""
+
+    Tests of the precomputed item-item neighbour table.
+
+    Author: Explore Data Science Academy.
+
+    Description: Neighbours match a brute-force cosine ranking, saved
+    tables are swapped in atomically, and the table is only built ahead
+    of time when it is switched on.
+
+"""
+# Script dependencies
+import os
+import numpy as np
+import pandas as pd
+
+from recommenders.item_neighbours import NeighbourTable, get_neighbour_table
+from utils.registry import ResourceRegistry
+
+
+def toy_ratings(n_users=30, n_items=12, seed=0):
+    rng = np.random.default_rng(seed)
+    users, items = np.nonzero(rng.random((n_users, n_items)) < 0.4)
+    return pd.DataFrame({'userId': users + 1, 'movieId': items + 100,
+                         'rating': rng.integers(1, 6, users.shape[0]).astype(float)})
+
+
+def test_neighbours_match_brute_force_cosine():
+    ratings_df = toy_ratings()
+    table = NeighbourTable.build(ratings_df, k=3, block_size=5)
+    dense = ratings_df.pivot_table(index='movieId', columns='userId', values='rating',
+                                   fill_value=0.0)
+    unit = dense.to_numpy() / np.linalg.norm(dense.to_numpy(), axis=1, keepdims=True)
+    cosine = unit @ unit.T
+    np.fill_diagonal(cosine, -np.inf)
+    for movie_id, row in zip(dense.index, cosine):
+        position = table.positions([movie_id])[0]
+        expected = np.sort(row)[::-1][:3]
+        np.testing.assert_allclose(table.similarities[position], expected, rtol=1e-5)
+
+
+def test_save_swaps_versions_atomically(tmp_path):
+    directory = str(tmp_path / 'item_neighbours')
+    first = NeighbourTable.build(toy_ratings(seed=1), k=3)
+    first.save(directory)
+    second = NeighbourTable.build(toy_ratings(seed=2), k=3)
+    second.save(directory)
+    assert os.path.islink(directory)
+    loaded = NeighbourTable.load(directory)
+    assert not loaded.neighbours.flags.owndata
+    np.testing.assert_array_equal(loaded.neighbours, second.neighbours)
+    np.testing.assert_array_equal(loaded.raw_iids, second.raw_iids)
+
+
+def test_saved_table_is_reused_while_current(tmp_path, monkeypatch):
+    ratings_path = str(tmp_path / 'ratings.csv')
+    toy_ratings().to_csv(ratings_path, index=False)
+    directory = str(tmp_path / 'item_neighbours')
+    built = []
+    monkeypatch.setattr('recommenders.item_neighbours._build_streaming',
+                        lambda path, **kwargs: built.append(path) or NeighbourTable.build(
+                            pd.read_csv(path), **kwargs))
+    get_neighbour_table(ratings_path, directory)
+    get_neighbour_table(ratings_path, directory, build=False)
+    assert built == [ratings_path]
+
+
+def test_default_warm_up_skips_resources_registered_cold():
+    registry = ResourceRegistry()
+    registry.register('catalog', lambda: 'catalog')
+    registry.register('item_neighbours', lambda: 'table', warm=False)
+    registry.warm_up(background=False)
+    assert registry.is_loaded('catalog')
+    assert not registry.is_loaded('item_neighbours')
+    registry.warm_up(['item_neighbours'], background=False)
+    assert registry.is_loaded('item_neighbours')
@@ -0,0 +1,166 @@
+"""
+
+    Tests of the matrix-factorisation trainer.
+
+    Author: Explore Data Science Academy.
+
+    Description: ALS recovers a small low-rank rating matrix, the
+    process pool solves exactly what the in-process loop does,
+    incremental updates keep the global mean of the whole rating set and
+    wait for other writers of the bundle, and the command line passes its
+    options through.
+
+"""
+# Script dependencies
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+
+from recommenders import mf_trainer
+from recommenders.mf_trainer import main, train, update
+from recommenders.model_bundle import export_bundle, load_bundle, read_meta
+from recommenders.svd_engine import SVDScorer
+from utils.atomic_dir import fcntl, write_lock
+
+
+def toy_ratings(n_users=60, n_items=50, n_factors=2, observed=0.5, seed=0):
+    """A random `observed` share of a rank-`n_factors` matrix plus biases."""
+    rng = np.random.default_rng(seed)
+    pu = rng.normal(0, 0.5, (n_users, n_factors))
+    qi = rng.normal(0, 0.5, (n_items, n_factors))
+    ratings = 3.0 + rng.normal(0, 0.3, (n_users, 1)) + rng.normal(0, 0.3, (1, n_items)) + pu @ qi.T
+    users, items = np.indices(ratings.shape)
+    ratings_df = pd.DataFrame({'userId': users.ravel() + 1, 'movieId': items.ravel() + 100,
+                               'rating': ratings.ravel()})
+    return ratings_df.sample(frac=observed, random_state=seed)
+
+
+def rmse(scorer, ratings_df):
+    users = scorer.inner_uids(ratings_df['userId'].to_numpy())
+    items = scorer.inner_iids(ratings_df['movieId'].to_numpy())
+    est = (scorer.global_mean + scorer.bu[users] + scorer.bi[items]
+           + np.einsum('ij,ij->i', scorer.pu[users], scorer.qi[items]))
+    return float(np.sqrt(np.mean((ratings_df['rating'].to_numpy() - est) ** 2)))
+
+
+def fit(ratings_df, n_epochs, workers=1):
+    return train(ratings_df, n_factors=2, n_epochs=n_epochs, reg=0.001, workers=workers,
+                 verbose=False)
+
+
+def test_als_converges_on_a_low_rank_matrix():
+    ratings_df = toy_ratings()
+    errors = [rmse(fit(ratings_df, n_epochs), ratings_df) for n_epochs in (1, 3, 10)]
+    assert errors[0] > errors[1] > errors[2]
+    assert errors[2] < 0.02
+
+
+def test_pool_matches_in_process_training():
+    ratings_df = toy_ratings(seed=1)
+    serial = fit(ratings_df, n_epochs=2)
+    pooled = fit(ratings_df, n_epochs=2, workers=2)
+    np.testing.assert_allclose(pooled.pu, serial.pu, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(pooled.bi, serial.bi, rtol=1e-5, atol=1e-6)
+
+
+def make_bundle(bundle_dir, extra):
+    rng = np.random.default_rng(0)
+    scorer = SVDScorer(3.5, rng.normal(0, 0.1, 20), rng.normal(0, 0.1, 10),
+                       rng.normal(0, 0.1, (20, 2)), rng.normal(0, 0.1, (10, 2)),
+                       np.arange(1, 21), np.arange(100, 110), rating_scale=(0.5, 5.0))
+    export_bundle(scorer, bundle_dir, extra=extra)
+    return load_bundle(bundle_dir, mmap_mode=None)
+
+
+# Two new users rate three items 5.0: far above the model's mean of 3.5
+SKEWED_DELTA = pd.DataFrame({'userId': [50, 50, 51], 'movieId': [100, 101, 102],
+                             'rating': [5.0, 5.0, 5.0], 'timestamp': [200, 201, 202]})
+
+
+def test_update_keeps_the_mean_when_the_bundle_size_is_unknown(tmp_path):
+    bundle_dir = str(tmp_path / 'bundle')
+    before = make_bundle(bundle_dir, {'max_timestamp': 100})
+    after = update(SKEWED_DELTA, bundle_dir=bundle_dir, verbose=False)
+    assert after.global_mean == pytest.approx(3.5)
+    assert 'n_ratings' not in read_meta(bundle_dir)
+    # Users and items the delta does not touch score exactly as before
+    users, items = np.arange(1, 21), np.arange(103, 110)
+    np.testing.assert_allclose(after.score(items, users), before.score(items, users), atol=1e-6)
+
+
+def test_update_weights_the_mean_by_the_recorded_size(tmp_path):
+    bundle_dir = str(tmp_path / 'bundle')
+    make_bundle(bundle_dir, {'max_timestamp': 100, 'n_ratings': 997})
+    after = update(SKEWED_DELTA, bundle_dir=bundle_dir, verbose=False)
+    assert after.global_mean == pytest.approx((3.5 * 997 + 15.0) / 1000)
+    assert read_meta(bundle_dir)['n_ratings'] == 1000
+
+
+def test_exported_surprise_models_record_their_size(tmp_path):
+    surprise = pytest.importorskip('surprise')
+    ratings_df = toy_ratings(n_users=10, n_items=8)
+    data = surprise.Dataset.load_from_df(ratings_df[['userId', 'movieId', 'rating']],
+                                         surprise.Reader(rating_scale=(0, 6)))
+    model = surprise.SVD(n_factors=2, n_epochs=2, random_state=0)
+    model.fit(data.build_full_trainset())
+    bundle_dir = str(tmp_path / 'bundle')
+    export_bundle(model, bundle_dir)
+    assert read_meta(bundle_dir)['n_ratings'] == len(ratings_df)
+
+
+def test_update_fits_the_new_ratings(tmp_path):
+    ratings_df = toy_ratings(seed=2).assign(timestamp=0)
+    base = train(ratings_df, n_factors=2, n_epochs=5, workers=1, verbose=False)
+    bundle_dir = str(tmp_path / 'bundle')
+    export_bundle(base, bundle_dir, extra={'max_timestamp': 0, 'n_ratings': len(ratings_df)})
+    # Every known user shifts its taste upwards
+    delta = ratings_df.sample(frac=0.5, random_state=3)
+    delta = delta.assign(rating=delta['rating'] + 0.5, timestamp=1)
+    updated = update(delta, bundle_dir=bundle_dir, n_epochs=20, lr=0.002, verbose=False)
+    assert rmse(updated, delta) < 0.5 * rmse(base, delta)
+
+
+@pytest.mark.skipif(fcntl is None, reason='needs flock')
+def test_update_waits_for_other_writers(tmp_path):
+    bundle_dir = str(tmp_path / 'bundle')
+    make_bundle(bundle_dir, {'max_timestamp': 100})
+    done = threading.Event()
+
+    def run_update():
+        update(SKEWED_DELTA, bundle_dir=bundle_dir, verbose=False)
+        done.set()
+
+    with write_lock(bundle_dir):
+        thread = threading.Thread(target=run_update)
+        thread.start()
+        assert not done.wait(0.3)
+        # Another writer publishes while the update waits
+        export_bundle(load_bundle(bundle_dir, mmap_mode=None), bundle_dir,
+                      extra={'max_timestamp': 201, 'n_ratings': 997}, locked=True)
+    thread.join()
+    # The update starts from that bundle: only the rating newer than it is added
+    assert read_meta(bundle_dir)['max_timestamp'] == 202
+    assert read_meta(bundle_dir)['n_ratings'] == 998
+
+
+def test_main_passes_update_options(tmp_path, monkeypatch):
+    bundle_dir = str(tmp_path / 'bundle')
+    make_bundle(bundle_dir, {})
+    calls = []
+    monkeypatch.setattr(mf_trainer, 'load_ratings', lambda path: SKEWED_DELTA)
+    monkeypatch.setattr(mf_trainer, 'update', lambda ratings_df, **kwargs: calls.append(kwargs))
+    main(['--update', '--output', bundle_dir, '--epochs', '0', '--reg', '0.1'])
+    main(['--update', '--output', bundle_dir])
+    assert [(call['n_epochs'], call['reg']) for call in calls] == [(0, 0.1), (3, 0.02)]
+
+
+def test_main_needs_since_for_bundles_without_timestamps(tmp_path, monkeypatch, capsys):
+    bundle_dir = str(tmp_path / 'bundle')
+    make_bundle(bundle_dir, {})
+    monkeypatch.setattr(mf_trainer, 'load_ratings', lambda path: SKEWED_DELTA)
+    with pytest.raises(SystemExit):
+        main(['--update', '--output', bundle_dir])
+    assert 'pass `since` explicitly' in capsys.readouterr().err
+    main(['--update', '--output', bundle_dir, '--since', '200'])
+    assert read_meta(bundle_dir)['max_timestamp'] == 202
@@ -0,0 +1,136 @@
+"""
+
+    Tests of the memory-mappable model bundle.
+
+    Author: Explore Data Science Academy.
+
+    Description: Export/load round trips, the atomic version swap, the
+    staleness of bundles against the pickle and the rule that
+    `load_scorer` never re-exports under a writer's lock.
+
+"""
+# Script dependencies
+import os
+import pickle
+import threading
+import numpy as np
+import pytest
+
+from recommenders.svd_engine import SVDScorer
+from recommenders.model_bundle import export_bundle, is_stale, load_bundle, load_scorer
+from utils.atomic_dir import write_lock
+
+
+def make_scorer(seed=0, n_users=30, n_items=50, n_factors=4):
+    rng = np.random.default_rng(seed)
+    return SVDScorer(3.5, rng.normal(size=n_users), rng.normal(size=n_items),
+                     rng.normal(size=(n_users, n_factors)), rng.normal(size=(n_items, n_factors)),
+                     np.arange(1, n_users + 1), np.arange(100, 100 + n_items))
+
+
+def test_round_trip(tmp_path):
+    scorer = make_scorer()
+    bundle_dir = str(tmp_path / 'bundle')
+    export_bundle(scorer, bundle_dir)
+    loaded = load_bundle(bundle_dir)
+    assert not loaded.qi.flags.owndata
+    np.testing.assert_allclose(loaded.qi, scorer.qi, rtol=1e-6)
+    np.testing.assert_array_equal(loaded.raw_iids, scorer.raw_iids)
+    np.testing.assert_allclose(loaded.score([100, 101], [1, 2]), scorer.score([100, 101], [1, 2]),
+                               rtol=1e-5)
+
+
+def versions(directory):
+    return [entry for entry in os.listdir(directory) if entry.startswith('bundle.v')]
+
+
+def test_swap_is_a_symlink_switch(tmp_path, monkeypatch):
+    bundle_dir = str(tmp_path / 'bundle')
+    for seed in range(4):
+        export_bundle(make_scorer(seed), bundle_dir)
+    assert os.path.islink(bundle_dir)
+    # Superseded versions stay readable for the grace period
+    assert len(versions(tmp_path)) == 4
+    monkeypatch.setattr('utils.atomic_dir.GRACE_SECONDS', 0)
+    export_bundle(make_scorer(3), bundle_dir)
+    assert len(versions(tmp_path)) == 2
+    np.testing.assert_allclose(load_bundle(bundle_dir).bu, make_scorer(3).bu, rtol=1e-6)
+
+
+def test_plain_directory_is_migrated(tmp_path):
+    bundle_dir = tmp_path / 'bundle'
+    bundle_dir.mkdir()
+    (bundle_dir / 'stale.txt').write_text('old layout')
+    export_bundle(make_scorer(), str(bundle_dir))
+    assert os.path.islink(bundle_dir)
+    assert not (bundle_dir / 'stale.txt').exists()
+
+
+def test_readers_never_see_a_missing_or_mixed_bundle(tmp_path):
+    bundle_dir = str(tmp_path / 'bundle')
+    export_bundle(make_scorer(0), bundle_dir)
+    expected = {seed: make_scorer(seed).bu.astype(np.float32) for seed in range(2)}
+    done = threading.Event()
+
+    def writer():
+        for n in range(30):
+            export_bundle(make_scorer(n % 2), bundle_dir)
+        done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    while not done.is_set():
+        loaded = load_bundle(bundle_dir, mmap_mode=None)
+        assert any(np.array_equal(loaded.bu, bu) for bu in expected.values())
+    thread.join()
+
+
+@pytest.fixture
+def pickled_model(tmp_path):
+    surprise = pytest.importorskip('surprise')
+    import pandas as pd
+    rng = np.random.default_rng(0)
+    ratings = pd.DataFrame({'userId': rng.integers(1, 20, 200), 'movieId': rng.integers(1, 30, 200),
+                            'rating': rng.integers(1, 11, 200) / 2}).drop_duplicates(['userId', 'movieId'])
+    data = surprise.Dataset.load_from_df(ratings, surprise.Reader(rating_scale=(0.5, 5)))
+    model = surprise.SVD(n_factors=4, n_epochs=5, random_state=0).fit(data.build_full_trainset())
+    path = tmp_path / 'SVD.pkl'
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+    return str(path)
+
+
+def test_load_scorer_exports_a_stale_bundle(tmp_path, pickled_model):
+    bundle_dir = str(tmp_path / 'bundle')
+    assert is_stale(bundle_dir, pickled_model)
+    scorer = load_scorer(pickled_model, bundle_dir)
+    assert not scorer.qi.flags.owndata
+    assert not is_stale(bundle_dir, pickled_model)
+
+
+def test_load_scorer_does_not_export_while_a_writer_holds_the_lock(tmp_path, pickled_model):
+    bundle_dir = str(tmp_path / 'bundle')
+    # A trainer's bundle (no recorded source) being rewritten right now
+    export_bundle(make_scorer(), bundle_dir)
+    os.remove(os.path.join(os.path.realpath(bundle_dir), 'meta.json'))
+    with write_lock(bundle_dir):
+        scorer = load_scorer(pickled_model, bundle_dir)
+    assert scorer.qi.dtype == np.float64
+    assert not os.path.exists(os.path.join(bundle_dir, 'meta.json'))
+
+
+def test_a_newer_pickle_replaces_a_trainer_bundle(tmp_path, pickled_model):
+    bundle_dir = str(tmp_path / 'bundle')
+    # A trainer's bundle records no source: only the modification times tell
+    export_bundle(make_scorer(), bundle_dir)
+    meta_path = os.path.join(os.path.realpath(bundle_dir), 'meta.json')
+    published = os.path.getmtime(meta_path)
+    os.utime(pickled_model, (published - 10, published - 10))
+    assert not is_stale(bundle_dir, pickled_model)
+    os.utime(pickled_model, (published + 10, published + 10))
+    assert is_stale(bundle_dir, pickled_model)
+    scorer = load_scorer(pickled_model, bundle_dir)
+    # The pickle's 29 items, now served from a re-exported bundle
+    assert scorer.raw_iids.shape[0] < make_scorer().raw_iids.shape[0]
+    assert not scorer.qi.flags.owndata
+    assert not is_stale(bundle_dir, pickled_model)
@@ -0,0 +1,72 @@
+"""
+
+    Tests of the streaming ratings ingestion.
+
+    Author: Explore Data Science Academy.
+
+    Description: Whatever the chunk size, and whether the arrays are kept
+    in memory, spilled to disk or published to the shared store, the
+    streamed CSR matrix and aggregates equal those of a `pd.read_csv`
+    pivot of the whole file.
+
+"""
+# Script dependencies
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.ratings_stream import get_ratings_matrix, ingest_ratings
+from utils.shared_store import SharedStore
+
+
+@pytest.fixture
+def ratings_path(tmp_path):
+    rng = np.random.default_rng(0)
+    ratings = pd.DataFrame({'userId': rng.integers(1, 60, 800) * 7,
+                            'movieId': rng.integers(1, 90, 800) * 13,
+                            'rating': rng.integers(1, 11, 800) / 2,
+                            'timestamp': rng.integers(0, 10 ** 9, 800)})
+    path = tmp_path / 'ratings.csv'
+    ratings.drop_duplicates(['userId', 'movieId']).to_csv(path, index=False)
+    return str(path)
+
+
+def assert_matches_pivot(matrix, path):
+    ratings = pd.read_csv(path)
+    # Dense ids in order of first appearance, like pd.factorize
+    np.testing.assert_array_equal(matrix.user_ids, pd.factorize(ratings['userId'])[1])
+    np.testing.assert_array_equal(matrix.item_ids, pd.factorize(ratings['movieId'])[1])
+    pivot = ratings.pivot(index='userId', columns='movieId', values='rating')
+    pivot = pivot.reindex(index=matrix.user_ids, columns=matrix.item_ids).fillna(0)
+    assert matrix.nnz == len(ratings)
+    np.testing.assert_array_equal(matrix.tocsr().toarray(), pivot.to_numpy(dtype=np.float32))
+    for side, key in (('user', 'userId'), ('item', 'movieId')):
+        grouped = ratings.groupby(key)['rating']
+        expected = pd.DataFrame({'count': grouped.count(), 'mean': grouped.mean(),
+                                 'std': grouped.std(ddof=0)})
+        aggregates = matrix.aggregates(side)
+        expected = expected.reindex(aggregates.index)
+        np.testing.assert_array_equal(aggregates['count'], expected['count'])
+        np.testing.assert_allclose(aggregates[['mean', 'std']], expected[['mean', 'std']],
+                                   rtol=1e-6, atol=1e-9)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 97, 10 ** 6])
+def test_streamed_matrix_matches_a_pivot(ratings_path, chunk_size):
+    assert_matches_pivot(ingest_ratings(ratings_path, chunk_size=chunk_size), ratings_path)
+
+
+def test_spilled_matrix_matches_a_pivot(ratings_path, tmp_path):
+    out_dir = tmp_path / 'matrix'
+    matrix = ingest_ratings(ratings_path, chunk_size=50, out_dir=str(out_dir))
+    assert_matches_pivot(matrix, ratings_path)
+    # Spilled chunks are removed once scattered into the CSR arrays
+    assert not list(out_dir.glob('part-*'))
+
+
+def test_shared_matrix_matches_a_pivot(ratings_path, tmp_path):
+    store = SharedStore(str(tmp_path / 'shared'))
+    matrix = get_ratings_matrix(ratings_path, store=store)
+    assert not matrix.data.flags.writeable
+    assert_matches_pivot(matrix, ratings_path)
+    assert [row['name'] for row in store.segments()] == ['ratings_matrix']
@@ -0,0 +1,68 @@
+"""
+
+    Tests of the recommendation result cache.
+
+    Author: Explore Data Science Academy.
+
+    Description: Cache keys ignore the order of the favourites but change
+    with the data version, so new data or a new model is never answered
+    from results computed before it.
+
+"""
+# Script dependencies
+import os
+
+from utils import result_cache
+from utils.result_cache import RecommendationCache, data_version, make_key
+
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def test_key_ignores_favourite_order():
+    assert (make_key('collab', ['b', 'a'], 10, 'v1')
+            == make_key('collab', ['a', 'b'], 10, 'v1'))
+    assert make_key('collab', ['a'], 10, 'v1') != make_key('content', ['a'], 10, 'v1')
+    assert make_key('collab', ['a'], 10, 'v1') != make_key('collab', ['a'], 5, 'v1')
+
+
+def test_version_changes_with_data_and_models(tmp_path):
+    movies = write(tmp_path / 'movies.csv', 'movieId,title\n1,Heat (1995)\n')
+    model = write(tmp_path / 'model.pkl', 'a')
+    paths = {'data_paths': (movies,), 'model_paths': (model, str(tmp_path / 'missing'))}
+    before = data_version(**paths)
+    assert data_version(**paths) == before
+    assert make_key('collab', ['Heat (1995)'], 10, before) != make_key(
+        'collab', ['Heat (1995)'], 10, 'other')
+
+    write(tmp_path / 'movies.csv', 'movieId,title\n1,Emma (1996)\n')
+    after_data = data_version(**paths)
+    assert after_data != before
+
+    write(tmp_path / 'model.pkl', 'bb')
+    os.utime(model, ns=(0, os.stat(model).st_mtime_ns + 10 ** 9))
+    assert data_version(**paths) not in (before, after_data)
+
+
+def test_results_are_recomputed_for_a_new_version(tmp_path, monkeypatch):
+    version = ['v1']
+    monkeypatch.setattr(result_cache, 'data_version', lambda: version[0])
+    cache = RecommendationCache(disk_path=str(tmp_path / 'results.sqlite'))
+    calls = []
+
+    def compute(movies, top_n):
+        calls.append(version[0])
+        return [f"{version[0]}:{title}" for title in movies][:top_n]
+
+    assert cache.get_or_compute('collab', ['a', 'b'], 10, compute) == ['v1:a', 'v1:b']
+    assert cache.get_or_compute('collab', ['b', 'a'], 10, compute) == ['v1:a', 'v1:b']
+    assert calls == ['v1']
+
+    version[0] = 'v2'
+    assert cache.get_or_compute('collab', ['a', 'b'], 10, compute) == ['v2:a', 'v2:b']
+    assert calls == ['v1', 'v2']
+    # Rows of the old version were dropped from the disk tier too
+    versions = cache._db.execute('SELECT DISTINCT version FROM results').fetchall()
+    assert versions == [('v2',)]
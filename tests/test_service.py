@@ -0,0 +1,69 @@
+"""
+
+    Tests of the local recommendation service and its client.
+
+    Author: Explore Data Science Academy.
+
+    Description: Title search and recommendations answered over HTTP
+    match what the in-process objects return, so a thin-client app
+    needs no local index or model.
+
+"""
+# Script dependencies
+import threading
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from recommenders import collaborative_based, service as service_module
+from recommenders.service import RecommendationService, _Handler
+from recommenders.service_client import ServiceClient, ServiceError
+from utils.registry import ResourceRegistry
+from utils.result_cache import RecommendationCache
+from utils.title_search import TitleSearchIndex
+
+TITLES = ['Matrix, The (1999)', 'Matrix Reloaded, The (2003)', 'Toy Story (1995)']
+
+
+@pytest.fixture
+def client(monkeypatch):
+    registry = ResourceRegistry()
+    registry.register('title_search',
+                      lambda: TitleSearchIndex.from_titles(TITLES, np.array([30, 20, 10])))
+    monkeypatch.setattr(service_module, 'registry', registry)
+    monkeypatch.setattr(service_module, 'recommendation_cache', RecommendationCache())
+    service = RecommendationService(max_wait=0.001)
+    service.batchers['content'].batch_fn = lambda movie_lists, top_n=10: [
+        None if any(title.startswith('Unknown') for title in movies) else movies[::-1][:top_n]
+        for movies in movie_lists]
+    handler = type('Handler', (_Handler,), {'service': service})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield ServiceClient(f"http://127.0.0.1:{server.server_address[1]}", timeout=5)
+    server.shutdown()
+    server.server_close()
+
+
+def test_search_is_served(client):
+    local = TitleSearchIndex.from_titles(TITLES, np.array([30, 20, 10]))
+    assert client.search('matr') == local.search('matr') == TITLES[:2]
+    assert client.search('matr', limit=1) == TITLES[:1]
+    assert client.search('') == []
+
+
+def test_recommend_and_errors(client):
+    assert client.recommend('content', ['Heat (1995)', 'Emma (1996)'], 1) == ['Emma (1996)']
+    with pytest.raises(ServiceError, match='404'):
+        client.recommend('content', ['Unknown (2099)'])
+    with pytest.raises(ServiceError, match='400'):
+        client.recommend('nonsense', ['Heat (1995)'])
+
+
+@pytest.mark.parametrize('switch, resource', [('USE_ANN_INDEX', 'ann_index'),
+                                              ('USE_NEIGHBOUR_TABLE', 'item_neighbours')])
+def test_served_resources_follow_the_switches(monkeypatch, switch, resource):
+    assert resource not in service_module.served_resources()
+    monkeypatch.setattr(collaborative_based, switch, True)
+    assert resource in service_module.served_resources()
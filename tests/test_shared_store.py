@@ -0,0 +1,154 @@
+"""
+
+    Tests of the host-wide shared array store.
+
+    Author: Explore Data Science Academy.
+
+    Description: Concurrent builders of a missing segment build it once
+    under the file lock, and `collect` only deletes segments older than
+    the current version that no live process references, even while
+    other processes are publishing.
+
+"""
+# Script dependencies
+import os
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+import pytest
+
+from utils import shared_store as shared_store_module
+from utils.shared_store import SharedStore, save_arrays
+
+
+def build_ones(directory):
+    save_arrays(directory, {'ones': np.ones(4)})
+    return {'rows': 4}
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def add_ref(store, name, version, pid):
+    with open(os.path.join(store._path(name, version), 'refs', str(pid)), 'w'):
+        pass
+
+
+@pytest.mark.skipif(shared_store_module.fcntl is None, reason='needs flock')
+def test_concurrent_builders_build_once(tmp_path):
+    builds = []
+
+    def slow_build(directory):
+        builds.append(directory)
+        time.sleep(0.2)
+        return build_ones(directory)
+
+    # Separate stores open separate lock files, like separate processes
+    stores = [SharedStore(str(tmp_path)) for _ in range(4)]
+    segments = [None] * len(stores)
+
+    def attach(n):
+        segments[n] = stores[n].get('content_index', 'v1', slow_build)
+
+    threads = [threading.Thread(target=attach, args=(n,)) for n in range(len(stores))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    for segment in segments:
+        np.testing.assert_array_equal(segment.arrays['ones'], np.ones(4))
+        assert segment.meta == {'rows': 4}
+    assert not [entry for entry in os.listdir(tmp_path) if '.tmp' in entry]
+
+
+def test_failed_build_leaves_nothing_behind(tmp_path):
+    store = SharedStore(str(tmp_path))
+
+    def failing_build(directory):
+        raise RuntimeError('no data')
+
+    with pytest.raises(RuntimeError):
+        store.get('content_index', 'v1', failing_build)
+    assert [entry for entry in os.listdir(tmp_path) if not entry.startswith('.')] == []
+
+
+def test_collect_respects_live_references(tmp_path):
+    store = SharedStore(str(tmp_path))
+    store.get('title_search', 'v1', build_ones)
+    store.get('title_search', 'v2', build_ones)
+    assert store.refcount('title_search', 'v1') == 1
+    # Attached here: never collected, even when outdated
+    assert store.collect('title_search', keep='v2') == []
+
+    store.release('title_search', 'v1')
+    add_ref(store, 'title_search', 'v1', os.getppid())
+    assert store.refcount('title_search', 'v1') == 1
+    assert store.collect('title_search', keep='v2') == []
+
+    os.remove(os.path.join(store._path('title_search', 'v1'), 'refs', str(os.getppid())))
+    add_ref(store, 'title_search', 'v1', dead_pid())
+    # The reference of a process that died does not count
+    assert store.refcount('title_search', 'v1') == 0
+    assert store.collect('title_search', keep='v2') == [store._path('title_search', 'v1')]
+    assert not os.path.exists(store._path('title_search', 'v1'))
+
+
+def test_attaching_a_new_version_collects_the_old_one(tmp_path):
+    store = SharedStore(str(tmp_path))
+    store.get('title_search', 'v1', build_ones)
+    store.get('content_index', 'v1', build_ones)
+    store.release('title_search', 'v1')
+    store.get('title_search', 'v2', build_ones)
+    assert [(row['name'], row['version'], row['refs']) for row in store.segments()] == [
+        ('content_index', 'v1', 1), ('title_search', 'v2', 1)]
+
+
+def test_collect_keeps_versions_newer_than_keep(tmp_path):
+    store = SharedStore(str(tmp_path))
+    store.get('title_search', 'v1', build_ones)
+    store.get('title_search', 'v2', build_ones)
+    store.release('title_search', 'v2')
+    # v2 is unreferenced, but it is not outdated relative to v1
+    assert store.collect('title_search', keep='v1') == []
+    assert os.path.exists(store._path('title_search', 'v2'))
+
+
+@pytest.mark.skipif(shared_store_module.fcntl is None, reason='needs flock')
+def test_publish_and_collect_run_concurrently(tmp_path):
+    publisher, collector = SharedStore(str(tmp_path)), SharedStore(str(tmp_path))
+    collector.get('title_search', 'v0', build_ones)
+    versions = [f"v{n}" for n in range(1, 30)]
+    done = threading.Event()
+    errors = []
+
+    def collect():
+        # A process still on the oldest version collects while others publish
+        while not done.is_set():
+            collector.collect('title_search', keep='v0')
+            collector.collect()
+
+    def publish():
+        try:
+            for version in versions:
+                segment = publisher.get('title_search', version, build_ones)
+                np.testing.assert_array_equal(segment.arrays['ones'], np.ones(4))
+        except Exception as error:
+            errors.append(error)
+        finally:
+            done.set()
+
+    threads = [threading.Thread(target=collect), threading.Thread(target=publish)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    # Every version the publisher attached is still there
+    for version in versions:
+        assert os.path.exists(os.path.join(publisher._path('title_search', version), 'segment.json'))
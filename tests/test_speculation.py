@@ -0,0 +1,70 @@
+"""
+
+    Tests of speculative recommendation precomputation.
+
+    Author: Explore Data Science Academy.
+
+    Description: A session's new selection cancels the work for its
+    previous one, and the app's process-wide speculator keeps the models
+    it was first given across reruns.
+
+"""
+# Script dependencies
+import threading
+
+from utils import speculation
+from utils.speculation import Speculator
+
+
+def test_new_selection_cancels_the_previous_one():
+    release = threading.Event()
+    calls = []
+
+    def model(name):
+        def run(movie_list, top_n):
+            calls.append((name, tuple(movie_list)))
+            release.wait(5)
+            return [name]
+        return run
+
+    # One worker: the first job's second model is still queued
+    speculator = Speculator({'content': model('content'), 'collab': model('collab')},
+                            max_workers=1)
+    first = speculator.speculate('session', ['Heat (1995)'])
+    assert speculator.speculate('session', ['Heat (1995)']) == first
+    second = speculator.speculate('session', ['Emma (1996)'])
+    assert first['collab'].cancelled()
+    release.set()
+    assert second['content'].result(5) == ['content']
+    assert second['collab'].result(5) == ['collab']
+    assert ('collab', ('Heat (1995)',)) not in calls
+    stats = speculator.stats()
+    assert stats['jobs_started'] == 2
+    assert stats['jobs_cancelled'] == 1
+    assert stats['sessions'] == 1
+
+
+def test_sessions_do_not_cancel_each_other():
+    speculator = Speculator({'content': lambda movies, n: list(movies)})
+    first = speculator.speculate('a', ['Heat (1995)'])
+    second = speculator.speculate('b', ['Emma (1996)'])
+    assert first['content'].result(5) == ['Heat (1995)']
+    assert second['content'].result(5) == ['Emma (1996)']
+    assert speculator.stats()['jobs_cancelled'] == 0
+
+
+def test_process_wide_speculator_keeps_its_first_models(monkeypatch):
+    shared = Speculator()
+    monkeypatch.setattr(speculation, 'speculator', shared)
+
+    def first(movies, n):
+        return ['first']
+
+    def rerun(movies, n):
+        return ['rerun']
+
+    # What every rerun of the app script does
+    speculation.speculator.register('content', first)
+    speculation.speculator.register('content', rerun)
+    assert speculation.speculator is shared
+    assert shared.models == {'content': first}
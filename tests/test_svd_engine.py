@@ -0,0 +1,96 @@
+"""
+
+    Tests of the vectorised SVD scoring engine.
+
+    Author: Explore Data Science Academy.
+
+    Description: `SVDScorer` estimates and top-k selections must match
+    the `surprise` `model.predict` path they replace, and folded-in
+    users must be the ridge regression fit they stand for.
+
+"""
+# Script dependencies
+import numpy as np
+import pandas as pd
+import pytest
+
+surprise = pytest.importorskip('surprise')
+
+from recommenders.svd_engine import SVDScorer, top_k, top_k_rows
+
+
+@pytest.fixture(scope='module')
+def model():
+    rng = np.random.default_rng(0)
+    ratings = pd.DataFrame({'userId': rng.integers(1, 40, 600),
+                            'movieId': rng.integers(1, 60, 600),
+                            'rating': rng.integers(1, 11, 600) / 2})
+    ratings = ratings.drop_duplicates(['userId', 'movieId'])
+    data = surprise.Dataset.load_from_df(ratings, surprise.Reader(rating_scale=(0.5, 5)))
+    svd = surprise.SVD(n_factors=8, n_epochs=10, random_state=0)
+    svd.fit(data.build_full_trainset())
+    return svd
+
+
+def test_score_matches_predict(model):
+    scorer = SVDScorer.from_model(model)
+    trainset = model.trainset
+    raw_iids = [trainset.to_raw_iid(i) for i in range(trainset.n_items)] + [9999]
+    raw_uids = [trainset.to_raw_uid(u) for u in range(0, trainset.n_users, 3)] + [8888]
+    estimates = scorer.score(raw_iids, raw_uids)
+    expected = np.array([[model.predict(uid, iid).est for uid in raw_uids] for iid in raw_iids])
+    np.testing.assert_allclose(estimates, expected, rtol=1e-10, atol=1e-10)
+
+
+def test_top_users_match_sorted_predictions(model):
+    scorer = SVDScorer.from_model(model)
+    trainset = model.trainset
+    raw_uids = [trainset.to_raw_uid(u) for u in range(trainset.n_users)]
+    raw_iid = trainset.to_raw_iid(0)
+    best, estimates = scorer.top_users(raw_iid, raw_uids, k=5)
+    predictions = sorted(((model.predict(uid, raw_iid).est, -pos, uid)
+                          for pos, uid in enumerate(raw_uids)), reverse=True)[:5]
+    np.testing.assert_allclose(estimates, [est for est, _, _ in predictions])
+    assert list(best) == [uid for _, _, uid in predictions]
+
+
+def test_top_k_is_a_stable_descending_sort():
+    scores = np.array([0.5, 2.0, 2.0, -1.0, 3.0, 2.0])
+    assert list(top_k(scores, 3)) == [4, 1, 2]
+    assert list(top_k(scores, 10)) == list(np.argsort(-scores, kind='stable'))
+    assert top_k(scores, 0).shape == (0,)
+
+
+def test_top_k_rows_matches_top_k():
+    rng = np.random.default_rng(1)
+    scores = np.stack([rng.permutation(20) for _ in range(6)]).astype(float)
+    rows = top_k_rows(scores, 4)
+    for row, expected in zip(rows, scores):
+        assert list(row) == list(top_k(expected, 4))
+
+
+def test_top_k_rows_breaks_ties_like_top_k():
+    rng = np.random.default_rng(2)
+    # Few distinct values: ties at the k-th place in almost every row
+    scores = rng.integers(0, 4, size=(200, 30)).astype(float)
+    scores[:5, :] = 1.0
+    scores[5, 3] = -np.inf
+    for k in (1, 5, 29, 30):
+        rows = top_k_rows(scores, k)
+        for row, expected in zip(rows, scores):
+            assert list(row) == list(top_k(expected, k))
+
+
+@pytest.mark.parametrize('n_seeds', [3, 20])
+def test_fold_in_is_a_ridge_fit(model, n_seeds):
+    # Fewer seeds than factors take the dual solve, more the primal one
+    scorer = SVDScorer.from_model(model)
+    seeds = np.random.default_rng(n_seeds).choice(scorer.qi.shape[0], n_seeds, replace=False)
+    pu, bu = scorer.fold_in([seeds], rating=4.5, reg=0.1)
+    x = np.hstack([scorer.qi[seeds], np.ones((n_seeds, 1))])
+    y = 4.5 - scorer.global_mean - scorer.bi[seeds]
+    # argmin |x w - y|^2 + reg |w|^2, as least squares on the stacked system
+    stacked = np.vstack([x, np.sqrt(0.1) * np.eye(x.shape[1])])
+    w = np.linalg.lstsq(stacked, np.concatenate([y, np.zeros(x.shape[1])]), rcond=None)[0]
+    np.testing.assert_allclose(pu[0], w[:-1], rtol=1e-6, atol=1e-9)
+    assert bu[0] == pytest.approx(w[-1], rel=1e-6, abs=1e-9)
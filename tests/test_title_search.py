@@ -0,0 +1,69 @@
+"""
+
+    Tests of the title search index.
+
+    Author: Explore Data Science Academy.
+
+    Description: Prefix matches rank by popularity (shorter titles
+    first on ties), MovieLens' trailing articles are searchable in
+    front, and misspellings fall back to trigram matches scored within
+    [0, 1].
+
+"""
+# Script dependencies
+import numpy as np
+
+from utils.title_search import TitleSearchIndex, normalise, search_keys
+
+TITLES = ['Matrix, The (1999)', 'Matrix Reloaded, The (2003)', 'Matrix Revolutions, The (2003)',
+          'Mad Max (1979)', 'Amélie (2001)', 'Toy Story (1995)', 'Toy Story 2 (1999)',
+          'Story of Us, The (1999)']
+POPULARITY = np.array([900, 400, 400, 300, 200, 800, 500, 10])
+
+
+def index():
+    return TitleSearchIndex.from_titles(TITLES, POPULARITY)
+
+
+def test_normalised_keys():
+    assert normalise('Amélie (2001)') == 'amelie 2001'
+    assert search_keys('Matrix, The (1999)') == ['matrix the 1999', 'the matrix 1999']
+
+
+def test_prefix_matches_rank_by_popularity():
+    assert index().search('matr') == ['Matrix, The (1999)', 'Matrix Reloaded, The (2003)',
+                                      'Matrix Revolutions, The (2003)']
+    # Every query word must prefix a word of the title
+    assert index().search('toy st') == ['Toy Story (1995)', 'Toy Story 2 (1999)']
+    assert index().search('story') == ['Toy Story (1995)', 'Toy Story 2 (1999)',
+                                       'Story of Us, The (1999)']
+
+
+def test_popularity_ties_prefer_shorter_titles():
+    assert index().search('matrix re', limit=2) == ['Matrix Reloaded, The (2003)',
+                                                    'Matrix Revolutions, The (2003)']
+
+
+def test_leading_articles_and_accents():
+    assert index().search('the matrix', limit=1) == ['Matrix, The (1999)']
+    assert index().search('amelie') == ['Amélie (2001)']
+
+
+def test_misspellings_fall_back_to_fuzzy_matches():
+    assert index().search('matrix revolutoins', limit=1) == ['Matrix Revolutions, The (2003)']
+    assert index().search('amelei') == ['Amélie (2001)']
+    assert index().search('toy storu') == ['Toy Story (1995)', 'Toy Story 2 (1999)']
+
+
+def test_limit_and_empty_queries():
+    assert len(index().search('the', limit=2)) == 2
+    assert index().search('') == []
+    assert index().search('  ?! ') == []
+
+
+def test_fuzzy_scores_stay_within_one():
+    search = TitleSearchIndex.from_titles(['Matrix, The (1999)'], np.array([1]))
+    # The query shares trigrams with both the title and its article-moved key
+    query = 'matrix the the matrix 1999'
+    assert search.fuzzy_rows(query, min_score=0.5).tolist() == [0]
+    assert search.fuzzy_rows(query, min_score=1.0).tolist() == []
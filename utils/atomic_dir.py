@@ -0,0 +1,146 @@
+"""
+
+    Atomic replacement of on-disk artifact directories.
+
+    Author: Explore Data Science Academy.
+
+    Description: Model bundles, ANN indexes and neighbour tables are
+    directories of `.npy` files plus a `meta.json`. Rewriting them in
+    place (or renaming the old directory away before moving the new one
+    in) lets a concurrent reader see a mix of old and new files, or no
+    artifact at all. Instead every write goes to a fresh versioned
+    directory next to the target, and the target itself is a symlink
+    that is switched to the new version with a single `os.replace`.
+    Readers `resolve` the link once and load every file from the version
+    it pointed to. Superseded versions are only deleted once they have
+    been replaced for a grace period, so a reader that has just resolved
+    the link can still open its files.
+
+"""
+# Script dependencies
+import os
+import time
+import shutil
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, writers must not overlap
+    fcntl = None
+
+VERSION_MARK = '.v'
+# Seconds a superseded version stays readable
+GRACE_SECONDS = 60
+
+
+def new_version(target):
+    """Create an empty versioned directory for the next write of `target`.
+
+    Parameters
+    ----------
+    target : str
+        Path readers use, e.g. 'resources/models/svd_bundle'.
+
+    Returns
+    -------
+    str
+        The new directory, next to `target`.
+
+    """
+    parent = os.path.dirname(os.path.abspath(target))
+    os.makedirs(parent, exist_ok=True)
+    path = f"{os.path.abspath(target)}{VERSION_MARK}{time.time_ns():020d}-{os.getpid()}"
+    os.makedirs(path)
+    return path
+
+
+def resolve(target):
+    """The version directory `target` currently points to."""
+    return os.path.realpath(target)
+
+
+def _versions(target):
+    parent = os.path.dirname(os.path.abspath(target))
+    prefix = os.path.basename(os.path.abspath(target)) + VERSION_MARK
+    return sorted(os.path.join(parent, entry) for entry in os.listdir(parent)
+                  if entry.startswith(prefix))
+
+
+def _created_ns(path):
+    # Version directories are named <target>.v<time_ns>-<pid>
+    stamp = os.path.basename(path).rpartition(VERSION_MARK)[2].partition('-')[0]
+    return int(stamp) if stamp.isdigit() else 0
+
+
+def publish(version_dir, target, keep=2, grace=None):
+    """Make `target` point to `version_dir` with one atomic rename.
+
+    A `target` that is still a plain directory (written before versioned
+    directories were used) is first renamed to a version of its own;
+    only that one-off migration leaves a moment without a target.
+
+    Parameters
+    ----------
+    version_dir : str
+        Fully written directory from `new_version`.
+    target : str
+        Path readers use.
+    keep : int
+        Versions kept regardless of age, the new one included.
+    grace : float, optional
+        Seconds a version stays after being superseded, `GRACE_SECONDS`
+        by default.
+
+    """
+    target = os.path.abspath(target)
+    if os.path.isdir(target) and not os.path.islink(target):
+        os.replace(target, f"{target}{VERSION_MARK}{0:020d}-legacy")
+    link = f"{target}.link-{os.getpid()}"
+    try:
+        os.remove(link)
+    except FileNotFoundError:
+        pass
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, target)
+
+    grace = GRACE_SECONDS if grace is None else grace
+    current = resolve(target)
+    versions = _versions(target)
+    now = time.time_ns()
+    for path, successor in zip(versions[:max(len(versions) - keep, 0)], versions[1:]):
+        # A version was superseded when its successor was created
+        if os.path.realpath(path) != current and now - _created_ns(successor) > grace * 1e9:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def write_lock(target, blocking=True):
+    """Exclusive advisory lock for writers of `target`.
+
+    Parameters
+    ----------
+    target : str
+        Artifact path; the lock file sits next to it.
+    blocking : bool
+        Wait for the lock instead of giving up.
+
+    Yields
+    ------
+    bool
+        Whether the lock is held (always True when blocking).
+
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    with open(f"{os.path.abspath(target)}.lock", 'w') as lock:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,96 @@
+"""
+
+    Title / movieId lookup index shared by the recommenders.
+
+    Author: Explore Data Science Academy.
+
+    Description: Resolving a title with `indices[indices == title]` or a
+    movie id with `movies_df[movies_df['movieId'] == i]` scans a whole
+    column every time. The catalogue index is built once per version of
+    the movie database (see the 'catalog' entry of `utils.registry`) and
+    answers title -> movieId, movieId -> row and movieId -> title lookups
+    with dictionaries.
+
+    Duplicate titles are handled explicitly: `movie_id` returns the first
+    movie carrying a title (in file order, as the column scans did), while
+    `movie_ids_for_title` and `duplicates` expose every match.
+
+"""
+# Data handling dependencies
+import numpy as np
+
+
+class CatalogIndex:
+    """O(1) lookups between titles, movie ids and row positions.
+
+    Parameters
+    ----------
+    movie_ids : array-like (int)
+        MovieLens movie ids in catalogue order.
+    titles : array-like (str)
+        Movie title of each id.
+
+    """
+
+    def __init__(self, movie_ids, titles):
+        self.movie_ids_array = np.asarray(movie_ids)
+        self.titles_array = np.asarray(titles, dtype=object)
+        self._row_by_id = {}
+        self._ids_by_title = {}
+        for row, (movie_id, title) in enumerate(zip(self.movie_ids_array.tolist(),
+                                                    self.titles_array.tolist())):
+            self._row_by_id.setdefault(movie_id, row)
+            self._ids_by_title.setdefault(title, []).append(movie_id)
+        self.duplicates = {title: ids for title, ids in self._ids_by_title.items()
+                           if len(ids) > 1}
+
+    @classmethod
+    def from_movies(cls, movies_df):
+        """Build the index from a frame with `movieId` and `title` columns."""
+        return cls(movies_df['movieId'].to_numpy(), movies_df['title'].to_numpy())
+
+    def __len__(self):
+        return self.movie_ids_array.shape[0]
+
+    def __contains__(self, title):
+        return title in self._ids_by_title
+
+    def movie_id(self, title):
+        """MovieLens id of a title (the first one for duplicate titles).
+
+        Raises
+        ------
+        KeyError
+            If the title is not in the catalogue.
+
+        """
+        try:
+            return self._ids_by_title[title][0]
+        except KeyError:
+            raise KeyError(f"Unknown movie title: {title}") from None
+
+    def movie_ids(self, titles):
+        """MovieLens ids of several titles, see `movie_id`."""
+        return [self.movie_id(title) for title in titles]
+
+    def movie_ids_for_title(self, title):
+        """Every MovieLens id carrying the given title."""
+        return list(self._ids_by_title.get(title, []))
+
+    def row(self, movie_id):
+        """Row position of a movie id within the catalogue."""
+        return self._row_by_id[movie_id]
+
+    def rows(self, movie_ids):
+        """Row positions of several movie ids."""
+        return np.array([self._row_by_id[i] for i in movie_ids], dtype=np.int64)
+
+    def title(self, movie_id):
+        """Title of a movie id."""
+        return self.titles_array[self._row_by_id[movie_id]]
+
+    def titles(self, movie_ids):
+        """Titles of several movie ids, skipping ids not in the catalogue."""
+        return [self.titles_array[self._row_by_id[i]] for i in movie_ids
+                if i in self._row_by_id]
+
@@ -4,11 +4,389 @@
 
     Author: Explore Data Science Academy.
 
+    Description: CSV files are converted on first use into a binary
+    columnar cache (one `.npy` file per column) keyed by the source
+    file's path and a hash of its content. Numeric columns are stored with compact dtypes (int32
+    ids, float32 ratings) and text columns as int32 category codes plus a
+    category list. Cached columns are loaded memory-mapped and shared by
+    every module in the process, so later loads cost neither a CSV parse
+    nor a copy. Conversion itself streams the CSV in chunks, so even the
+    largest MovieLens dumps never have to fit in memory as a DataFrame.
+
 """
 # Data handling dependencies
+import os
+import json
+import shutil
+import hashlib
+import threading
 import pandas as pd
 import numpy as np
 
+from utils.instrumentation import stage, timed
+
+MOVIES_PATH = 'resources/data/movies.csv'
+RATINGS_PATH = 'resources/data/ratings.csv'
+CACHE_DIR = 'resources/cache'
+CACHE_VERSION = 1
+# Rows parsed at a time when a CSV file is converted.
+CHUNK_ROWS = 1000000
+
+# Compact dtypes for known columns; anything else keeps its parsed dtype.
+COLUMN_DTYPES = {
+    'userId': np.int32,
+    'movieId': np.int32,
+    'rating': np.float32,
+    'timestamp': np.int64,
+}
+
+_lock = threading.Lock()
+_digests = {}
+_tables = {}
+
+
+def file_digest(path):
+    """Content hash of a file, memoised on its size and modification time.
+
+    Parameters
+    ----------
+    path : str
+        File to hash.
+
+    Returns
+    -------
+    str
+        Hex digest of the file contents.
+
+    """
+    info = os.stat(path)
+    key = (os.path.abspath(path), info.st_size, info.st_mtime_ns)
+    digest = _digests.get(key)
+    if digest is None:
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        _digests[key] = digest
+    return digest
+
+
+def source_fingerprint(paths):
+    """Summarise the state of the files a cached object was built from.
+
+    Parameters
+    ----------
+    paths : tuple (str)
+        Files whose content hash is recorded.
+
+    Returns
+    -------
+    np.ndarray
+        `file_digest` of each file, '-' for missing files.
+
+    """
+    stamp = []
+    for path in paths:
+        try:
+            stamp.append(file_digest(path))
+        except OSError:
+            stamp.append('-')
+    return np.array(stamp, dtype=str)
+
+
+class ColumnarTable:
+    """Memory-mapped columns of a cached CSV file.
+
+    Parameters
+    ----------
+    names : list (str)
+        Column names in file order.
+    columns : dict
+        Column name -> array. Text columns hold int32 category codes
+        (-1 for missing values).
+    categories : dict
+        Text column name -> list of category strings.
+
+    """
+
+    def __init__(self, names, columns, categories):
+        self.names = list(names)
+        self.columns = columns
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.columns[self.names[0]]) if self.names else 0
+
+    def values(self, name):
+        """Decoded values of a column (object array for text columns)."""
+        if name not in self.categories:
+            return self.columns[name]
+        lookup = np.array(self.categories[name] + [np.nan], dtype=object)
+        return lookup[self.columns[name]]
+
+    def to_frame(self, columns=None, categorical=()):
+        """Build a DataFrame over the cached columns.
+
+        Parameters
+        ----------
+        columns : list (str), optional
+            Columns to include, all by default.
+        categorical : tuple (str)
+            Text columns returned as `pd.Categorical` instead of strings.
+
+        Returns
+        -------
+        pd.DataFrame
+            Frame whose numeric columns reference the memory-mapped data.
+
+        """
+        data = {}
+        for name in (self.names if columns is None else columns):
+            if name in categorical and name in self.categories:
+                data[name] = pd.Categorical.from_codes(self.columns[name],
+                                                       categories=self.categories[name])
+            else:
+                data[name] = self.values(name)
+        return pd.DataFrame(data, copy=False)
+
+
+def _cache_prefix(path):
+    # Files with the same name in different directories get their own
+    # cache entries
+    stem = os.path.splitext(os.path.basename(path))[0]
+    location = hashlib.blake2b(os.path.abspath(path).encode('utf-8'), digest_size=4).hexdigest()
+    return f"{stem}-{location}"
+
+
+def _cache_path(path, digest, cache_dir):
+    return os.path.join(cache_dir, f"{_cache_prefix(path)}-{digest}")
+
+
+class _ColumnSpool:
+    """Collects one column chunk by chunk in temporary part files.
+
+    Parameters
+    ----------
+    directory : str
+        Directory for the part files.
+    name : str
+        Column name.
+    path : str
+        CSV file being converted; earlier chunks are read again from it
+        when the column turns out to hold text.
+    chunk_size : int
+        Rows per chunk.
+
+    """
+
+    def __init__(self, directory, name, path, chunk_size=CHUNK_ROWS):
+        self.directory = directory
+        self.name = name
+        self.path = path
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.rows = 0
+        self.categories = None
+        self.has_nan = False
+
+    def _encode(self, series):
+        # Incremental factorize: codes stay stable as categories are added
+        for value in pd.unique(series.dropna()):
+            self.categories.setdefault(value, len(self.categories))
+        return series.map(self.categories).fillna(-1).to_numpy(dtype=np.int32)
+
+    def _save(self, values):
+        part = os.path.join(self.directory, f"{self.name}.part{len(self.parts)}.npy")
+        np.save(part, values)
+        self.parts.append(part)
+
+    def append(self, series):
+        text = pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+        if text and self.categories is None:
+            # The column turned out to hold text: encode the earlier rows
+            # from their original text, as the parsed numbers lose it
+            # (7 becomes '7.0' in a column with missing values)
+            self.categories = {}
+            for part in self.parts:
+                os.remove(part)
+            self.parts = []
+            if self.rows:
+                with pd.read_csv(self.path, usecols=[self.name], dtype=str,
+                                 chunksize=self.chunk_size, nrows=self.rows) as reader:
+                    for chunk in reader:
+                        self._save(self._encode(chunk[self.name]))
+        if self.categories is not None:
+            values = self._encode(series)
+        else:
+            self.has_nan = self.has_nan or bool(series.isna().any())
+            values = series.to_numpy()
+        self._save(values)
+        self.rows += len(series)
+
+    def finish(self, rows):
+        """Concatenate the parts into the final column file."""
+        if self.categories is not None:
+            dtype = np.dtype(np.int32)
+            target = os.path.join(self.directory, f"{self.name}.codes.npy")
+        else:
+            dtype = np.result_type(*[np.load(part, mmap_mode='r').dtype for part in self.parts])
+            if self.name in COLUMN_DTYPES and not self.has_nan:
+                dtype = np.dtype(COLUMN_DTYPES[self.name])
+            target = os.path.join(self.directory, f"{self.name}.npy")
+        out = np.lib.format.open_memmap(target, mode='w+', dtype=dtype, shape=(rows,))
+        offset = 0
+        for part in self.parts:
+            values = np.load(part, mmap_mode='r')
+            out[offset:offset + values.shape[0]] = values
+            offset += values.shape[0]
+            del values
+            os.remove(part)
+        out.flush()
+        del out
+        if self.categories is None:
+            return {'name': self.name, 'kind': 'numeric', 'dtype': dtype.str}
+        blob = '\x00'.join(str(u) for u in self.categories).encode('utf-8')
+        np.save(os.path.join(self.directory, f"{self.name}.categories.npy"),
+                np.frombuffer(blob, dtype=np.uint8))
+        return {'name': self.name, 'kind': 'text', 'size': len(self.categories)}
+
+
+def _write_cache(path, target, chunk_size=CHUNK_ROWS):
+    """Parse a CSV file chunk by chunk and write its columns into `target`.
+
+    Each chunk is spooled to per-column part files, so peak memory is
+    bounded by `chunk_size` rather than by the size of the file.
+
+    """
+    tmp_dir = f"{target}.tmp-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    spools, rows = {}, 0
+    with pd.read_csv(path, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            for name in chunk.columns:
+                if name not in spools:
+                    spools[name] = _ColumnSpool(tmp_dir, name, path, chunk_size)
+                spools[name].append(chunk[name])
+            rows += len(chunk)
+    columns_meta = [spool.finish(rows) for spool in spools.values()]
+    meta = {'version': CACHE_VERSION, 'source': os.path.basename(path),
+            'rows': rows, 'columns': columns_meta}
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    try:
+        os.replace(tmp_dir, target)
+    except OSError:
+        # Another process finished the same cache first.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _read_cache(target):
+    with open(os.path.join(target, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != CACHE_VERSION:
+        raise ValueError(f"Unsupported cache version in {target}")
+    names, columns, categories = [], {}, {}
+    for column in meta['columns']:
+        name = column['name']
+        names.append(name)
+        if column['kind'] == 'text':
+            columns[name] = np.load(os.path.join(target, f"{name}.codes.npy"), mmap_mode='r')
+            blob = np.load(os.path.join(target, f"{name}.categories.npy"))
+            categories[name] = blob.tobytes().decode('utf-8').split('\x00') if column['size'] else []
+        else:
+            columns[name] = np.load(os.path.join(target, f"{name}.npy"), mmap_mode='r')
+    return ColumnarTable(names, columns, categories)
+
+
+def _remove_stale(path, keep, cache_dir):
+    # Only earlier conversions of this very file: `<prefix>-<digest>`
+    prefix = _cache_prefix(path)
+    for entry in os.listdir(cache_dir):
+        full = os.path.join(cache_dir, entry)
+        if entry.rpartition('-')[0] == prefix and full != keep:
+            shutil.rmtree(full, ignore_errors=True)
+
+
+def load_table(path, cache_dir=CACHE_DIR):
+    """Load a CSV file through the columnar cache.
+
+    Parameters
+    ----------
+    path : str
+        Relative or absolute path to a .csv file.
+    cache_dir : str
+        Directory holding the converted columns.
+
+    Returns
+    -------
+    ColumnarTable
+        Memory-mapped columns, shared by every caller in the process.
+
+    """
+    digest = file_digest(path)
+    key = (os.path.abspath(path), digest)
+    table = _tables.get(key)
+    if table is not None:
+        return table
+    with _lock:
+        table = _tables.get(key)
+        if table is not None:
+            return table
+        target = _cache_path(path, digest, cache_dir)
+        if not os.path.exists(os.path.join(target, 'meta.json')):
+            os.makedirs(cache_dir, exist_ok=True)
+            with stage('convert_csv'):
+                _write_cache(path, target)
+            _remove_stale(path, target, cache_dir)
+        with stage('open_cache'):
+            table = _read_cache(target)
+        _tables[key] = table
+        return table
+
+
+def load_movies(path_to_movies=MOVIES_PATH, columns=None, categorical=()):
+    """Load the movie database as a DataFrame via the columnar cache.
+
+    Parameters
+    ----------
+    path_to_movies : str
+        Relative or absolute path to movie database stored
+        in .csv format.
+    columns : list (str), optional
+        Columns to load, all by default.
+    categorical : tuple (str)
+        Text columns (e.g. 'genres') returned as categoricals.
+
+    Returns
+    -------
+    pd.DataFrame
+        Movie records.
+
+    """
+    return load_table(path_to_movies).to_frame(columns, categorical)
+
+
+def load_ratings(path_to_ratings=RATINGS_PATH, columns=None):
+    """Load the ratings as a DataFrame via the columnar cache.
+
+    Parameters
+    ----------
+    path_to_ratings : str
+        Relative or absolute path to the ratings stored in .csv format.
+    columns : list (str), optional
+        Columns to load, all by default.
+
+    Returns
+    -------
+    pd.DataFrame
+        Ratings with int32 ids and float32 ratings.
+
+    """
+    return load_table(path_to_ratings).to_frame(columns)
+
+
+@timed('load_movie_titles')
 def load_movie_titles(path_to_movies):
     """Load movie titles from database records.
 
@@ -24,7 +402,7 @@ def load_movie_titles(path_to_movies):
         Movie titles.
 
     """
-    df = pd.read_csv(path_to_movies)
+    df = load_movies(path_to_movies)
     df = df.dropna()
     movie_list = df['title'].to_list()
     return movie_list
@@ -0,0 +1,386 @@
+"""
+
+    Pre-aggregated EDA cube.
+
+    Author: Explore Data Science Academy.
+
+    Description: The EDA page used to re-join ratings, movies and IMDB
+    data and re-split cast/genre strings on every widget interaction.
+    Instead, ratings are reduced once to per-movie counts and sums, and a
+    cube of genre x release year x director (rating counts, rating sums,
+    runtime sums, movie counts) plus a cast-frequency table are derived
+    from them and persisted. Each tab is a slice of these small tables.
+
+    When the source files change the cube is refreshed incrementally: an
+    appended ratings file is only read from where the previous build
+    stopped, and the movie-level tables are rebuilt from the stored
+    per-movie aggregates without re-reading the ratings.
+
+"""
+# Script dependencies
+import os
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import MOVIES_PATH, RATINGS_PATH, file_digest, load_movies, load_table
+from utils.genres import GenreVocabulary
+from utils.instrumentation import stage
+
+IMDB_PATH = 'resources/data/imdb_data.csv'
+CUBE_PATH = 'resources/cache/eda_cube.pkl'
+CUBE_VERSION = 2
+ALL = 'All'
+# Titles need more ratings than this to appear in the EDA
+MIN_TITLE_RATINGS = 100
+CHUNK_ROWS = 1000000
+# Selections whose cast counters / year counts are memoised per cube
+MEMO_SIZE = 512
+
+_lock = threading.Lock()
+_cached = {}
+
+
+def _is_prefix(path, size, digest):
+    """Whether the first `size` bytes of `path` hash to `digest`.
+
+    The prefix must also end on a line break, so an appended file can be
+    parsed from byte `size` onwards.
+
+    """
+    if os.path.getsize(path) <= size:
+        return False
+    hasher = hashlib.blake2b(digest_size=16)
+    remaining = size
+    last = b''
+    with open(path, 'rb') as f:
+        while remaining:
+            block = f.read(min(1 << 20, remaining))
+            if not block:
+                return False
+            hasher.update(block)
+            remaining -= len(block)
+            last = block[-1:]
+    return last == b'\n' and hasher.hexdigest() == digest
+
+
+def _rating_chunks(path, offset=0):
+    """Yield (movieId, rating) chunks of the ratings file from byte `offset`."""
+    with open(path, 'rb') as f:
+        names = f.readline().decode('utf-8').strip().split(',')
+        if offset:
+            f.seek(offset)
+        reader = pd.read_csv(f, header=None, names=names, usecols=['movieId', 'rating'],
+                             chunksize=CHUNK_ROWS)
+        for chunk in reader:
+            yield chunk
+
+
+def _accumulate(counts, sums, chunks):
+    """Add per-movie rating counts and sums (indexed by movieId)."""
+    for chunk in chunks:
+        ids = chunk['movieId'].to_numpy(dtype=np.int64)
+        if ids.shape[0] == 0:
+            continue
+        size = int(ids.max()) + 1
+        if size > counts.shape[0]:
+            counts = np.concatenate([counts, np.zeros(size - counts.shape[0], dtype=np.int64)])
+            sums = np.concatenate([sums, np.zeros(size - sums.shape[0], dtype=np.float64)])
+        counts[:size] += np.bincount(ids, minlength=size)
+        sums[:size] += np.bincount(ids, weights=chunk['rating'].to_numpy(dtype=np.float64),
+                                   minlength=size)
+    return counts, sums
+
+
+def _movie_table(movies_path, imdb_path, counts, sums):
+    """One row per rated movie with its attributes and rating aggregates.
+
+    Genres are stored as a uint32 `genre_mask` column; the vocabulary
+    giving each bit's genre is returned alongside the table.
+
+    """
+    movies = load_movies(movies_path, columns=['movieId', 'title', 'genres'])
+    vocabulary = GenreVocabulary.from_genres(movies['genres'])
+    imdb = load_table(imdb_path).to_frame(['movieId', 'title_cast', 'director', 'runtime',
+                                          'plot_keywords'])
+    df = movies.merge(imdb.drop_duplicates('movieId'), on='movieId', how='inner').dropna()
+    ids = df['movieId'].to_numpy(dtype=np.int64)
+    known = ids < counts.shape[0]
+    df['n_ratings'] = np.where(known, counts[np.where(known, ids, 0)], 0)
+    df['rating_sum'] = np.where(known, sums[np.where(known, ids, 0)], 0.0)
+    df = df[df['n_ratings'] > 0]
+    df = df[df.groupby('title')['n_ratings'].transform('sum') > MIN_TITLE_RATINGS]
+    df = df.assign(
+        # The last four-digit group of the title is the release year
+        release_year=pd.to_numeric(df['title'].str.findall(r'\d{4}').str[-1]).astype('Int64'),
+        genre_mask=vocabulary.encode(df['genres']),
+        title_cast=df['title_cast'].astype(str).str.split('|'),
+        director=df['director'].astype(str),
+        runtime=pd.to_numeric(df['runtime'], errors='coerce').fillna(0))
+    return df.drop(columns=['genres', 'plot_keywords']).reset_index(drop=True), vocabulary
+
+
+def _cube_tables(movies, vocabulary):
+    """Aggregate the movie table to genre x year x director and cast tables."""
+    # Every movie counts once under 'All' and once under each of its genres
+    rows, bits = np.nonzero(vocabulary.bits(movies['genre_mask'].to_numpy()))
+    by_genre = pd.DataFrame({'movieId': movies['movieId'].to_numpy()[rows],
+                             'genre': np.array(vocabulary.genres, dtype=object)[bits]})
+    membership = pd.concat([movies[['movieId']].assign(genre=ALL), by_genre], ignore_index=True)
+    facts = membership.merge(movies[['movieId', 'release_year', 'director', 'runtime',
+                                     'n_ratings', 'rating_sum', 'title_cast']], on='movieId')
+    keys = ['genre', 'release_year', 'director']
+    cube = (facts.groupby(keys, dropna=False)
+            .agg(n_ratings=('n_ratings', 'sum'), rating_sum=('rating_sum', 'sum'),
+                 runtime_sum=('runtime', 'sum'), n_movies=('movieId', 'nunique'))
+            .reset_index())
+    # Actors are weighted by the ratings of their movies
+    cast = (facts[keys + ['title_cast', 'n_ratings']].explode('title_cast')
+            .groupby(keys + ['title_cast'], dropna=False)['n_ratings'].sum()
+            .reset_index().rename(columns={'title_cast': 'actor', 'n_ratings': 'weight'}))
+    return cube, cast
+
+
+def _selected(value):
+    return not (isinstance(value, str) and value == ALL)
+
+
+def _years_key(years):
+    # Hashable form of a year selection
+    return years if np.isscalar(years) else tuple(sorted(years))
+
+
+def _mask(frame, genre=ALL, years=ALL, director=ALL):
+    """Rows of a cube table matching a selection.
+
+    `genre=None` selects the rows of every individual genre (but not the
+    'All' rows); `years` is a year, a list of years or 'All'.
+
+    """
+    if genre is None:
+        mask = (frame['genre'] != ALL).to_numpy()
+    else:
+        mask = (frame['genre'] == genre).to_numpy()
+    if _selected(years):
+        years = [years] if np.isscalar(years) else list(years)
+        mask &= frame['release_year'].isin(years).to_numpy()
+    if director != ALL:
+        mask &= (frame['director'] == director).to_numpy()
+    return mask
+
+
+class EDACube:
+    """Movie, cube and cast tables behind the EDA page.
+
+    Parameters
+    ----------
+    movies : pd.DataFrame
+        One row per movie shown in the EDA.
+    cube : pd.DataFrame
+        Aggregates by genre (including 'All'), release year and director.
+    cast : pd.DataFrame
+        Actor weights by genre, release year and director.
+    vocabulary : GenreVocabulary
+        Genre of each bit of the movies' `genre_mask`.
+    state : dict
+        Per-movie rating aggregates and source digests used to refresh.
+
+    """
+
+    def __init__(self, movies, cube, cast, vocabulary, state):
+        self.movies = movies
+        self.cube = cube
+        self.cast = cast
+        self.vocabulary = vocabulary
+        self.state = state
+        self._memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+    @property
+    def version(self):
+        """Digests of the source files the cube was built from."""
+        return tuple(self.state[key] for key in ('ratings_digest', 'movies_digest', 'imdb_digest'))
+
+    def _memoised(self, key, compute):
+        with self._memo_lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        value = compute()
+        with self._memo_lock:
+            self._memo[key] = value
+            while len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return value
+
+    @classmethod
+    def build(cls, ratings_path=RATINGS_PATH, movies_path=MOVIES_PATH, imdb_path=IMDB_PATH,
+              previous=None):
+        """Build the cube, reusing whatever `previous` still covers.
+
+        Parameters
+        ----------
+        ratings_path, movies_path, imdb_path : str
+            Source files.
+        previous : EDACube, optional
+            An earlier build to refresh incrementally.
+
+        Returns
+        -------
+        EDACube
+            Cube for the current source files.
+
+        """
+        prev = previous.state if previous is not None else None
+        ratings_digest = file_digest(ratings_path)
+        size = os.path.getsize(ratings_path)
+        if prev is not None and prev['ratings_digest'] == ratings_digest:
+            counts, sums = prev['counts'], prev['sums']
+        elif prev is not None and _is_prefix(ratings_path, prev['ratings_size'],
+                                             prev['ratings_digest']):
+            with stage('eda_cube:append_ratings'):
+                counts, sums = _accumulate(prev['counts'].copy(), prev['sums'].copy(),
+                                           _rating_chunks(ratings_path, prev['ratings_size']))
+        else:
+            with stage('eda_cube:scan_ratings'):
+                counts, sums = _accumulate(np.zeros(0, dtype=np.int64),
+                                           np.zeros(0, dtype=np.float64),
+                                           _rating_chunks(ratings_path))
+        state = {'version': CUBE_VERSION, 'counts': counts, 'sums': sums,
+                 'ratings_digest': ratings_digest, 'ratings_size': size,
+                 'movies_digest': file_digest(movies_path), 'imdb_digest': file_digest(imdb_path)}
+        if prev is not None and all(prev[key] == state[key] for key in
+                                    ('ratings_digest', 'movies_digest', 'imdb_digest')):
+            return previous
+        with stage('eda_cube:aggregate'):
+            movies, vocabulary = _movie_table(movies_path, imdb_path, counts, sums)
+            cube, cast = _cube_tables(movies, vocabulary)
+        return cls(movies, cube, cast, vocabulary, state)
+
+    def save(self, path=CUBE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'movies': self.movies, 'cube': self.cube, 'cast': self.cast,
+                         'vocabulary': self.vocabulary, 'state': self.state}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        if data['state'].get('version') != CUBE_VERSION:
+            raise ValueError(f"Unsupported EDA cube version in {path}")
+        return cls(**data)
+
+    # Slices used by the EDA tabs
+
+    def genres(self, years=ALL):
+        """'All' followed by the genres present in a selection."""
+        present = self.cube.loc[_mask(self.cube, None, years), 'genre']
+        return [ALL] + sorted(present.unique())
+
+    def years(self, genre=ALL, years=ALL):
+        """'All' followed by the release years present in a selection."""
+        present = self.cube.loc[_mask(self.cube, genre, years), 'release_year'].dropna()
+        return [ALL] + sorted(int(y) for y in present.unique())
+
+    def directors(self, genre=ALL, years=ALL):
+        """'All' followed by the directors present in a selection."""
+        present = self.cube.loc[_mask(self.cube, genre, years), 'director']
+        return [ALL] + sorted(present.unique())
+
+    def latest_years(self, n=3):
+        """The `n` most recent release years."""
+        years = self.cube['release_year'].dropna().unique()
+        return sorted((int(y) for y in years), reverse=True)[:n]
+
+    def cast_frequencies(self, genre=ALL, years=ALL, director=ALL):
+        """Actor -> weight (ratings of their movies) for a selection.
+
+        The counter is computed once per selection and memoised, ready
+        for `WordCloud.generate_from_frequencies`.
+
+        """
+        def compute():
+            selected = self.cast[_mask(self.cast, genre, years, director)]
+            return selected.groupby('actor')['weight'].sum().to_dict()
+        return dict(self._memoised(('cast', genre, _years_key(years), director), compute))
+
+    def year_counts(self, genre=ALL, years=ALL, director=ALL):
+        """Ratings per release year for a selection, most rated first."""
+        def compute():
+            selected = self.cube[_mask(self.cube, genre, years, director)]
+            counts = selected.groupby('release_year')['n_ratings'].sum()
+            counts = counts.sort_values(ascending=False)
+            counts.index = counts.index.astype(int).astype(str)
+            return counts[counts > 0]
+        return self._memoised(('years', genre, _years_key(years), director), compute).copy()
+
+    def genre_counts(self, genre=ALL, years=ALL, director=ALL):
+        """Ratings per genre (excluding 'All') for a selection."""
+        selected = self.cube[_mask(self.cube, None if genre == ALL else genre, years, director)]
+        return selected.groupby('genre')['n_ratings'].sum().sort_values(ascending=False)
+
+    def popular_movies(self, genre=ALL, years=ALL, k=10):
+        """Titles with the highest rating count x mean rating."""
+        movies = self.movies
+        if genre != ALL:
+            movies = movies[self.vocabulary.has(movies['genre_mask'].to_numpy(), genre)]
+        if _selected(years):
+            years = [years] if np.isscalar(years) else list(years)
+            movies = movies[movies['release_year'].isin(years)]
+        # count * mean is the sum of the ratings
+        popularity = movies.groupby('title')['rating_sum'].sum()
+        return popularity.sort_values(ascending=False).head(k).index.to_list()
+
+    def popular_directors(self, genre=ALL, years=ALL, k=20):
+        """Directors with the highest mean rating in a selection."""
+        selected = self.cube[_mask(self.cube, genre, years)]
+        totals = selected.groupby('director')[['rating_sum', 'n_ratings']].sum()
+        means = totals['rating_sum'] / totals['n_ratings']
+        return means.sort_values(ascending=False).head(k).index.to_list()
+
+    def runtime_hours(self, genre=ALL, years=ALL, director=ALL):
+        """Total runtime of the movies in a selection, in hours."""
+        selected = self.cube[_mask(self.cube, genre, years, director)]
+        return round(float(selected['runtime_sum'].sum()) / 60, 1)
+
+
+def get_eda_cube(ratings_path=RATINGS_PATH, movies_path=MOVIES_PATH, imdb_path=IMDB_PATH,
+                 path=CUBE_PATH):
+    """Return the EDA cube for the current source files.
+
+    The cube is kept in memory and refreshed (and re-persisted) only when
+    one of the source files changes.
+
+    """
+    key = tuple((p, os.stat(p).st_size, os.stat(p).st_mtime_ns)
+                for p in (ratings_path, movies_path, imdb_path))
+    cached = _cached.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with _lock:
+        cached = _cached.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        previous = cached[1] if cached is not None else None
+        if previous is None and os.path.exists(path):
+            try:
+                previous = EDACube.load(path)
+            except (OSError, ValueError, KeyError, pickle.UnpicklingError):
+                previous = None
+        cube = EDACube.build(ratings_path, movies_path, imdb_path, previous=previous)
+        if cube is not previous or not os.path.exists(path):
+            try:
+                cube.save(path)
+            except OSError:
+                pass
+        _cached[path] = (key, cube)
+        return cube
@@ -0,0 +1,212 @@
+"""
+
+    Lightweight per-stage timing and memory instrumentation.
+
+    Author: Explore Data Science Academy.
+
+    Description: Stages of the recommenders, loaders and EDA are wrapped
+    in `stage(...)` blocks or `@timed(...)` functions. Each stage records
+    its wall time and the change in resident memory; nested stages are
+    named by path (e.g. `collab_model/fold_in`). Measurements are
+    aggregated in-process, shown on the app's Diagnostics page, and can be
+    exported as JSON or Prometheus text, or logged as one JSON line per
+    stage for a metrics pipeline.
+
+    Switches (environment):
+        RECOMMENDER_INSTRUMENT=0        disable (near zero overhead)
+        RECOMMENDER_METRICS_LOG=<path>  append a JSON line per stage
+
+"""
+# Script dependencies
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger('recommender.metrics')
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+
+def rss_bytes():
+    """Current resident set size, or the peak where it is unavailable."""
+    if _PAGE_SIZE is not None:
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * _PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return 0
+
+
+class StageStats:
+    """Aggregated measurements of one stage."""
+
+    def __init__(self, name, window=1000):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.last_s = 0.0
+        self.rss_delta_max = 0
+        self.rss_after = 0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds, rss_delta, rss_after, failed):
+        self.count += 1
+        self.errors += int(failed)
+        self.total_s += seconds
+        self.max_s = max(self.max_s, seconds)
+        self.last_s = seconds
+        self.rss_delta_max = max(self.rss_delta_max, rss_delta)
+        self.rss_after = rss_after
+        self.recent.append(seconds)
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def percentile(q):
+            return recent[min(len(recent) - 1, int(q * len(recent)))] if recent else 0.0
+
+        return {'stage': self.name, 'count': self.count, 'errors': self.errors,
+                'total_ms': self.total_s * 1000,
+                'mean_ms': self.total_s * 1000 / max(self.count, 1),
+                'p50_ms': percentile(0.5) * 1000, 'p95_ms': percentile(0.95) * 1000,
+                'max_ms': self.max_s * 1000, 'last_ms': self.last_s * 1000,
+                'rss_delta_max_mb': self.rss_delta_max / (1 << 20),
+                'rss_mb': self.rss_after / (1 << 20)}
+
+
+class Instrumentation:
+    """Thread-safe, switchable collector of stage measurements.
+
+    Parameters
+    ----------
+    enabled : bool
+        Record measurements; when off, `stage` is a no-op.
+    log_path : str, optional
+        File to append one JSON line per completed stage to.
+
+    """
+
+    def __init__(self, enabled=True, log_path=None):
+        self.enabled = enabled
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if log_path:
+            handler = logging.FileHandler(log_path)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the enclosed block as stage `name`.
+
+        Stages opened inside another stage (on the same thread) are
+        recorded under `<outer>/<name>`.
+
+        """
+        if not self.enabled:
+            yield
+            return
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        full_name = f"{stack[-1]}/{name}" if stack else name
+        stack.append(full_name)
+        rss_before = rss_bytes()
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            seconds = time.perf_counter() - start
+            rss_after = rss_bytes()
+            stack.pop()
+            self._record(full_name, seconds, rss_after - rss_before, rss_after, failed)
+
+    def timed(self, name=None):
+        """Decorator measuring every call of a function as a stage."""
+        def decorator(func):
+            stage_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.stage(stage_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _record(self, name, seconds, rss_delta, rss_after, failed):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = StageStats(name)
+            stats.add(seconds, rss_delta, rss_after, failed)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'ts': time.time(), 'stage': name, 'ms': seconds * 1000,
+                                    'rss_delta_bytes': rss_delta, 'error': failed,
+                                    'pid': os.getpid()}))
+
+    def snapshot(self):
+        """Summary of every stage, in the order stages were first seen."""
+        with self._lock:
+            return [stats.summary() for stats in self._stats.values()]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def export_json(self, path=None):
+        """Snapshot as a JSON document, written to `path` if given."""
+        document = json.dumps({'ts': time.time(), 'pid': os.getpid(), 'stages': self.snapshot()},
+                              indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(document)
+        return document
+
+    def prometheus_text(self, prefix='recommender_stage'):
+        """Snapshot in the Prometheus text exposition format."""
+        lines = [f"# TYPE {prefix}_seconds summary",
+                 f"# TYPE {prefix}_rss_delta_max_bytes gauge"]
+        for summary in self.snapshot():
+            label = summary['stage'].replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'{prefix}_seconds_count{{stage="{label}"}} {summary["count"]}')
+            lines.append(f'{prefix}_seconds_sum{{stage="{label}"}} {summary["total_ms"] / 1000:.6f}')
+            for q in ('p50', 'p95'):
+                lines.append(f'{prefix}_seconds{{stage="{label}",quantile="0.{q[1:]}"}} '
+                             f'{summary[q + "_ms"] / 1000:.6f}')
+            lines.append(f'{prefix}_rss_delta_max_bytes{{stage="{label}"}} '
+                         f'{int(summary["rss_delta_max_mb"] * (1 << 20))}')
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide collector used by the app, recommenders, loaders and EDA.
+instrumentation = Instrumentation(
+    enabled=os.environ.get('RECOMMENDER_INSTRUMENT', '1') != '0',
+    log_path=os.environ.get('RECOMMENDER_METRICS_LOG') or None)
+stage = instrumentation.stage
+timed = instrumentation.timed
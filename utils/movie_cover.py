@@ -1,19 +1,148 @@
+"""
+
+    In-memory movie cover rendering.
+
+    Author: Explore Data Science Academy.
+
+    Description: Covers are the base image with the movie title written
+    on it. The base image and font are loaded once per renderer and the
+    composited background frame is prepared once, so a cover only costs
+    drawing its title and encoding a PNG. Covers are returned as PNG
+    bytes (no shared output file, so concurrent sessions cannot clobber
+    each other), a whole list can be rendered concurrently on a thread
+    pool, and rendered covers are kept in a bounded LRU keyed by title.
+
+"""
+# Script dependencies
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 from PIL import Image, ImageDraw, ImageFont
 
+BASE_IMAGE = 'resources/app_images/IMG.PNG'
+FONT_PATH = 'resources/image_styles/FreeMono.ttf'
+
+
+class CoverRenderer:
+    """Renders title covers as PNG bytes.
+
+    Parameters
+    ----------
+    base_path : str
+        Cover background image.
+    font_path : str
+        TrueType font for the title.
+    font_size : int
+        Font size of the title.
+    background : tuple (int)
+        RGBA colour composited over the base image.
+    maxsize : int
+        Covers kept in the LRU cache.
+    workers : int
+        Threads used by `render_many`.
+
+    """
+
+    def __init__(self, base_path=BASE_IMAGE, font_path=FONT_PATH, font_size=20,
+                 background=(255, 255, 255, 255), maxsize=256, workers=4):
+        self.base_path = base_path
+        self.font_path = font_path
+        self.font_size = font_size
+        self.background = background
+        self.maxsize = maxsize
+        self.workers = workers
+        self._frame = None
+        self._font = None
+        self._covers = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _load(self):
+        # Base image, font and background frame are prepared once
+        if self._frame is None:
+            with self._lock:
+                if self._frame is None:
+                    base = Image.open(self.base_path).convert('RGBA')
+                    # Get the light colour of the image
+                    txt = Image.new('RGBA', base.size, self.background)
+                    self._font = ImageFont.truetype(self.font_path, self.font_size)
+                    self._frame = Image.alpha_composite(base, txt)
+        return self._frame, self._font
+
+    def _draw(self, movie_name):
+        frame, font = self._load()
+        output = frame.copy()
+        ImageDraw.Draw(output).text((10, 10), movie_name, font=font, fill='black')
+        buffer = io.BytesIO()
+        output.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def render(self, movie_name):
+        """PNG bytes of the cover for one title.
+
+        Parameters
+        ----------
+        movie_name : str
+            Title written on the cover.
+
+        Returns
+        -------
+        bytes
+            The cover encoded as PNG.
+
+        """
+        with self._lock:
+            if movie_name in self._covers:
+                self._covers.move_to_end(movie_name)
+                return self._covers[movie_name]
+        png = self._draw(movie_name)
+        with self._lock:
+            self._covers[movie_name] = png
+            while len(self._covers) > self.maxsize:
+                self._covers.popitem(last=False)
+        return png
+
+    def render_many(self, movie_names):
+        """PNG covers for a list of titles (e.g. a top-10), in order.
+
+        Parameters
+        ----------
+        movie_names : list (str)
+            Titles to render.
+
+        Returns
+        -------
+        list (bytes)
+            One PNG per title.
+
+        """
+        movie_names = list(movie_names)
+        if len(movie_names) <= 1 or self.workers <= 1:
+            return [self.render(name) for name in movie_names]
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix='movie-cover')
+        # Load once up front rather than racing on the first cover
+        self._load()
+        return list(self._pool.map(self.render, movie_names))
+
+    def clear(self):
+        with self._lock:
+            self._covers.clear()
+
+
+# Process-wide renderer shared by every session of the app.
+renderer = CoverRenderer()
+
+
 def cover(movie_name):
+    """Render the cover for `movie_name` and return it as PNG bytes."""
+    return renderer.render(movie_name)
+
 
-    # get an image
-    base = Image.open('resources/app_images/IMG.PNG').convert('RGBA')
-    # Get the light colour of the image
-    txt = Image.new('RGBA', base.size, (255,255,255,255))
-    # Select the font that will be used on the image
-    fnt = ImageFont.truetype('resources/image_styles/FreeMono.ttf', 20)
-    # Get a drawing context
-    draw = ImageDraw.Draw(txt)
-    # draw text, half opacity
-    draw.text((10,10), movie_name, font=fnt, fill='black')
-    # draw text, full opacity
-
-    output = Image.alpha_composite(base, txt)
-
-    return output.save('resources/app_images/flie1.png')
\ No newline at end of file
+def covers(movie_names):
+    """Render the covers for a list of titles concurrently, as PNG bytes."""
+    return renderer.render_many(movie_names)
@@ -0,0 +1,370 @@
+"""
+
+    Out-of-core streaming ingestion of ratings files.
+
+    Author: Explore Data Science Academy.
+
+    Description: Reads a ratings CSV in fixed-size chunks, remaps user and
+    movie ids to dense int32 indices (in order of first appearance, as
+    `pd.factorize` would) and builds a CSR user-item matrix plus per-user
+    and per-item rating aggregates on the fly. Apart from the result,
+    memory is bounded by the chunk size; with `out_dir` the intermediate
+    and final arrays live in memory-mapped files instead, so even the
+    25M/33M MovieLens dumps can be ingested on small workers.
+
+    Usage: python -m utils.ratings_stream [ratings.csv] [--out-dir DIR]
+               [--chunk-size 1000000]
+
+"""
+# Script dependencies
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import scipy as sp
+import scipy.sparse
+
+from utils.data_loader import RATINGS_PATH, COLUMN_DTYPES, file_digest
+from utils.shared_store import shared_store
+
+CHUNK_ROWS = 1000000
+FORMAT_VERSION = 1
+
+
+def _grow(array, size):
+    # Amortised growth of a 1-d accumulator, new slots are zero.
+    if array.shape[0] >= size:
+        return array
+    grown = np.zeros(max(size, 2 * array.shape[0]), dtype=array.dtype)
+    grown[:array.shape[0]] = array
+    return grown
+
+
+class DenseIdMap:
+    """Maps raw integer ids to dense int32 indices in first-seen order."""
+
+    def __init__(self):
+        self._sorted_ids = np.empty(0, dtype=np.int64)
+        self._sorted_idx = np.empty(0, dtype=np.int32)
+        self._ids = []
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def ids(self):
+        """Raw ids, indexed by their dense index."""
+        if len(self._ids) > 1:
+            self._ids = [np.concatenate(self._ids)]
+        return self._ids[0] if self._ids else np.empty(0, dtype=np.int64)
+
+    def lookup(self, raw_ids):
+        """Dense indices of known ids, -1 for ids never seen."""
+        raw_ids = np.asarray(raw_ids, dtype=np.int64)
+        if self._size == 0:
+            return np.full(raw_ids.shape, -1, dtype=np.int32)
+        pos = np.clip(np.searchsorted(self._sorted_ids, raw_ids), 0, self._size - 1)
+        return np.where(self._sorted_ids[pos] == raw_ids, self._sorted_idx[pos], -1).astype(np.int32)
+
+    def map(self, raw_ids):
+        """Dense indices of `raw_ids`, assigning new indices to unseen ids."""
+        raw_ids = np.asarray(raw_ids, dtype=np.int64)
+        idx = self.lookup(raw_ids)
+        unseen = idx < 0
+        if unseen.any():
+            new_ids = pd.unique(raw_ids[unseen])
+            new_idx = np.arange(self._size, self._size + new_ids.shape[0], dtype=np.int32)
+            self._ids.append(new_ids)
+            self._size += new_ids.shape[0]
+            ids = np.concatenate([self._sorted_ids, new_ids])
+            order = np.argsort(ids, kind='stable')
+            self._sorted_ids = ids[order]
+            self._sorted_idx = np.concatenate([self._sorted_idx, new_idx])[order]
+            idx = self.lookup(raw_ids)
+        return idx
+
+
+class RatingsMatrix:
+    """CSR user-item ratings matrix with per-user/per-item aggregates.
+
+    Parameters
+    ----------
+    indptr, indices, data : np.ndarray
+        CSR arrays (int64 row pointers, int32 item indices, float32
+        ratings); rows are users, in the order of `user_ids`.
+    user_ids, item_ids : np.ndarray
+        Raw MovieLens id of each dense user/item index.
+    user_stats, item_stats : dict
+        'count', 'sum' and 'sumsq' arrays of the ratings per user/item.
+
+    """
+
+    def __init__(self, indptr, indices, data, user_ids, item_ids, user_stats, item_stats):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.user_stats = user_stats
+        self.item_stats = item_stats
+
+    @property
+    def shape(self):
+        return self.user_ids.shape[0], self.item_ids.shape[0]
+
+    @property
+    def nnz(self):
+        return int(self.indices.shape[0])
+
+    def tocsr(self):
+        """The ratings as a `scipy.sparse.csr_matrix` over the same arrays."""
+        return sp.sparse.csr_matrix((self.data, self.indices, self.indptr), shape=self.shape,
+                                    copy=False)
+
+    def aggregates(self, side='user'):
+        """Per-user or per-item rating count, mean and standard deviation.
+
+        Parameters
+        ----------
+        side : str
+            'user' or 'item'.
+
+        Returns
+        -------
+        pd.DataFrame
+            Indexed by raw `userId` / `movieId`.
+
+        """
+        stats, ids, name = ((self.user_stats, self.user_ids, 'userId') if side == 'user'
+                            else (self.item_stats, self.item_ids, 'movieId'))
+        count = np.asarray(stats['count'])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.asarray(stats['sum']) / count
+            var = np.asarray(stats['sumsq']) / count - mean ** 2
+        return pd.DataFrame({'count': count, 'mean': mean, 'std': np.sqrt(np.maximum(var, 0))},
+                            index=pd.Index(ids, name=name))
+
+    def save(self, directory):
+        """Write every array as `.npy` plus a JSON header."""
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self._arrays().items():
+            path = os.path.join(directory, name + '.npy')
+            # Arrays already memory-mapped from `directory` are in place
+            if getattr(array, 'filename', None) != os.path.abspath(path):
+                np.save(path, np.ascontiguousarray(array))
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'version': FORMAT_VERSION, 'shape': list(self.shape), 'nnz': self.nnz}, f)
+
+    def _arrays(self):
+        arrays = {'indptr': self.indptr, 'indices': self.indices, 'data': self.data,
+                  'user_ids': self.user_ids, 'item_ids': self.item_ids}
+        for side, stats in (('user', self.user_stats), ('item', self.item_stats)):
+            for stat, array in stats.items():
+                arrays[f"{side}_{stat}"] = array
+        return arrays
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """Load a matrix written by `save`, memory-mapped by default."""
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported ratings matrix version: {meta.get('version')}")
+
+        def load(name):
+            return np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+
+        return cls(load('indptr'), load('indices'), load('data'), load('user_ids'),
+                   load('item_ids'),
+                   {stat: load(f"user_{stat}") for stat in ('count', 'sum', 'sumsq')},
+                   {stat: load(f"item_{stat}") for stat in ('count', 'sum', 'sumsq')})
+
+
+class RatingsIngestor:
+    """Incrementally builds a `RatingsMatrix` from chunks of ratings.
+
+    Parameters
+    ----------
+    out_dir : str, optional
+        Directory for spilled chunks and the final arrays; `None` keeps
+        everything in memory.
+
+    """
+
+    def __init__(self, out_dir=None):
+        self.out_dir = out_dir
+        self.users = DenseIdMap()
+        self.items = DenseIdMap()
+        self._stats = {side: {'count': np.zeros(0, dtype=np.int64),
+                              'sum': np.zeros(0, dtype=np.float64),
+                              'sumsq': np.zeros(0, dtype=np.float64)}
+                       for side in ('user', 'item')}
+        self._chunks = []
+        self.n_ratings = 0
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+
+    def feed(self, chunk):
+        """Add a chunk with `userId`, `movieId` and `rating` columns."""
+        user_idx = self.users.map(chunk['userId'].to_numpy())
+        item_idx = self.items.map(chunk['movieId'].to_numpy())
+        values = chunk['rating'].to_numpy(dtype=np.float32)
+        for side, idx, size in (('user', user_idx, len(self.users)),
+                                ('item', item_idx, len(self.items))):
+            stats = self._stats[side]
+            for stat, weights in (('count', None), ('sum', values), ('sumsq', values.astype(np.float64) ** 2)):
+                stats[stat] = _grow(stats[stat], size)
+                stats[stat][:size] += np.bincount(idx, weights=weights, minlength=size).astype(
+                    stats[stat].dtype)
+        if self.out_dir is not None:
+            # Spill the chunk so only the current one is held in memory
+            part = os.path.join(self.out_dir, f"part-{len(self._chunks)}")
+            for name, array in (('users', user_idx), ('items', item_idx), ('ratings', values)):
+                np.save(f"{part}.{name}.npy", array)
+            self._chunks.append(part)
+        else:
+            self._chunks.append((user_idx, item_idx, values))
+        self.n_ratings += values.shape[0]
+
+    def _chunk(self, chunk):
+        if isinstance(chunk, tuple):
+            return chunk
+        return tuple(np.load(f"{chunk}.{name}.npy", mmap_mode='r')
+                     for name in ('users', 'items', 'ratings'))
+
+    def _allocate(self, name, dtype, size):
+        if self.out_dir is None:
+            return np.empty(size, dtype=dtype)
+        return np.lib.format.open_memmap(os.path.join(self.out_dir, name + '.npy'), mode='w+',
+                                         dtype=dtype, shape=(size,))
+
+    def finish(self):
+        """Scatter the buffered chunks into CSR arrays.
+
+        Rows are filled chunk by chunk with a per-user cursor, so the
+        ratings of a user keep their file order and no global sort of
+        the whole COO data is needed.
+
+        Returns
+        -------
+        RatingsMatrix
+            The ingested ratings.
+
+        """
+        n_users, n_items = len(self.users), len(self.items)
+        counts = self._stats['user']['count'][:n_users]
+        indptr = self._allocate('indptr', np.int64, n_users + 1)
+        indptr[0] = 0
+        np.cumsum(counts, out=indptr[1:])
+        indices = self._allocate('indices', np.int32, self.n_ratings)
+        data = self._allocate('data', np.float32, self.n_ratings)
+        cursor = np.array(indptr[:-1])
+        while self._chunks:
+            chunk = self._chunks.pop(0)
+            user_idx, item_idx, values = self._chunk(chunk)
+            order = np.argsort(user_idx, kind='stable')
+            rows = np.asarray(user_idx)[order]
+            in_chunk = np.bincount(rows, minlength=n_users)
+            starts = np.concatenate([[0], np.cumsum(in_chunk)[:-1]])
+            dest = cursor[rows] + (np.arange(rows.shape[0]) - starts[rows])
+            indices[dest] = np.asarray(item_idx)[order]
+            data[dest] = np.asarray(values)[order]
+            cursor += in_chunk
+            if not isinstance(chunk, tuple):
+                for name in ('users', 'items', 'ratings'):
+                    os.remove(f"{chunk}.{name}.npy")
+        stats = {side: {stat: array[:size] for stat, array in self._stats[side].items()}
+                 for side, size in (('user', n_users), ('item', n_items))}
+        matrix = RatingsMatrix(indptr, indices, data, self.users.ids, self.items.ids,
+                               stats['user'], stats['item'])
+        if self.out_dir is not None:
+            for array in (indptr, indices, data):
+                array.flush()
+            matrix.save(self.out_dir)
+        return matrix
+
+
+def iter_rating_chunks(path=RATINGS_PATH, chunk_size=CHUNK_ROWS,
+                       columns=('userId', 'movieId', 'rating')):
+    """Yield the ratings file as DataFrames of at most `chunk_size` rows."""
+    dtypes = {name: COLUMN_DTYPES[name] for name in columns if name in COLUMN_DTYPES}
+    with pd.read_csv(path, usecols=list(columns), dtype=dtypes, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def ingest_ratings(path=RATINGS_PATH, chunk_size=CHUNK_ROWS, out_dir=None, verbose=False):
+    """Stream a ratings CSV into a `RatingsMatrix`.
+
+    Parameters
+    ----------
+    path : str
+        Ratings file with `userId`, `movieId` and `rating` columns.
+    chunk_size : int
+        Rows parsed at a time.
+    out_dir : str, optional
+        Keep spilled chunks and the resulting arrays in this directory,
+        memory-mapped, instead of in memory.
+    verbose : bool
+        Print progress after every chunk.
+
+    Returns
+    -------
+    RatingsMatrix
+        Users x items ratings with dense int32 indices.
+
+    """
+    ingestor = RatingsIngestor(out_dir)
+    start = time.perf_counter()
+    for chunk in iter_rating_chunks(path, chunk_size):
+        ingestor.feed(chunk)
+        if verbose:
+            print(f"{ingestor.n_ratings} ratings, {len(ingestor.users)} users, "
+                  f"{len(ingestor.items)} movies ({time.perf_counter() - start:.1f}s)")
+    return ingestor.finish()
+
+
+def get_ratings_matrix(path=RATINGS_PATH, store=None):
+    """The ratings matrix of `path`, shared by every process on the host.
+
+    The first process to ask ingests the file straight into a shared
+    store segment; the others (and later starts) attach to it.
+
+    Parameters
+    ----------
+    path : str
+        Ratings file.
+    store : SharedStore, optional
+        Store to use, the process-wide one by default.
+
+    Returns
+    -------
+    RatingsMatrix
+        Memory-mapped, read-only ratings matrix.
+
+    """
+    store = shared_store if store is None else store
+
+    def build(directory):
+        ingest_ratings(path, out_dir=directory)
+
+    segment = store.get('ratings_matrix', file_digest(path), build)
+    return RatingsMatrix.load(segment.path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream a ratings file into a CSR matrix.')
+    parser.add_argument('ratings', nargs='?', default=RATINGS_PATH)
+    parser.add_argument('--out-dir', default=None)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+    matrix = ingest_ratings(args.ratings, chunk_size=args.chunk_size, out_dir=args.out_dir,
+                            verbose=True)
+    print(f"{matrix.nnz} ratings from {matrix.shape[0]} users on {matrix.shape[1]} movies")
+
+
+if __name__ == '__main__':
+    main()
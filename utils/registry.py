@@ -0,0 +1,183 @@
+"""
+
+    Lazy registry of the app's datasets and models.
+
+    Author: Explore Data Science Academy.
+
+    Description: Modules register a loader for each resource they need
+    instead of loading it at import time. A resource is loaded the first
+    time it is requested (once per process, even under concurrent
+    requests) and the time each load took is recorded. `warm_up` can load
+    resources ahead of time on a background thread so that pages which
+    never need them still render immediately.
+
+"""
+# Script dependencies
+import time
+import threading
+
+from utils.data_loader import MOVIES_PATH, RATINGS_PATH, load_movies, load_ratings, source_fingerprint
+from utils.catalog_index import CatalogIndex
+from utils.genres import GenreVocabulary
+from utils.title_search import get_title_search
+from utils.instrumentation import stage
+
+
+def _same(a, b):
+    # Versions may be arrays (file fingerprints) or plain values.
+    try:
+        return bool(a == b) if not hasattr(a, 'shape') else bool((a == b).all())
+    except (TypeError, ValueError):
+        return False
+
+
+class ResourceRegistry:
+    """Named, lazily loaded resources with load timings."""
+
+    def __init__(self):
+        self._loaders = {}
+        self._values = {}
+        self._versions = {}
+        self._warm = set()
+        self._locks = {}
+        self._timings = {}
+        self._lock = threading.Lock()
+        self._warm_up_thread = None
+
+    def register(self, name, loader, replace=False, version=None, warm=True):
+        """Register a zero-argument loader under `name`.
+
+        Parameters
+        ----------
+        name : str
+            Resource name.
+        loader : callable
+            Returns the resource when called.
+        replace : bool
+            Replace an existing loader (dropping any loaded value).
+        version : callable, optional
+            Returns a value that changes when the resource's source
+            changes (e.g. a file fingerprint); the resource is reloaded
+            on the next `get` after it changes.
+        warm : bool
+            Include the resource in a default `warm_up`; resources only
+            some configurations use can opt out.
+
+        """
+        with self._lock:
+            if name in self._loaders and not replace:
+                return
+            self._loaders[name] = loader
+            self._versions[name] = version
+            if warm:
+                self._warm.add(name)
+            else:
+                self._warm.discard(name)
+            self._locks.setdefault(name, threading.Lock())
+            self._values.pop(name, None)
+
+    def get(self, name):
+        """Return a resource, loading it on first use.
+
+        Raises
+        ------
+        KeyError
+            If no loader is registered under `name`.
+
+        """
+        version = self._versions.get(name)
+        current = None if version is None else version()
+        try:
+            value, loaded = self._values[name]
+            if version is None or _same(loaded, current):
+                return value
+        except KeyError:
+            pass
+        if name not in self._loaders:
+            raise KeyError(f"No resource registered as: {name}")
+        with self._locks[name]:
+            entry = self._values.get(name)
+            if entry is None or (version is not None and not _same(entry[1], current)):
+                start = time.perf_counter()
+                with stage(f"load:{name}"):
+                    value = self._loaders[name]()
+                self._timings[name] = time.perf_counter() - start
+                entry = (value, current)
+                self._values[name] = entry
+        return entry[0]
+
+    def is_loaded(self, name):
+        return name in self._values
+
+    def invalidate(self, name=None):
+        """Drop a loaded resource (or all of them) so it reloads on next use."""
+        with self._lock:
+            if name is None:
+                self._values.clear()
+            else:
+                self._values.pop(name, None)
+
+    def names(self):
+        return list(self._loaders)
+
+    def timings(self):
+        """Seconds taken by each load so far, by resource name."""
+        return dict(self._timings)
+
+    def warm_up(self, names=None, background=True):
+        """Load resources ahead of their first use.
+
+        Parameters
+        ----------
+        names : list (str), optional
+            Resources to load, every one registered with `warm` by
+            default.
+        background : bool
+            Load on a daemon thread and return immediately.
+
+        Returns
+        -------
+        threading.Thread or None
+            The warm-up thread when loading in the background and
+            anything is left to load.
+
+        """
+        names = [name for name in self.names() if name in self._warm] if names is None else list(names)
+        names = [name for name in names if not self.is_loaded(name)]
+        if not names:
+            return None
+
+        def _load():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    # Failures surface again when the resource is used.
+                    pass
+
+        if not background:
+            _load()
+            return None
+        with self._lock:
+            if self._warm_up_thread is not None and self._warm_up_thread.is_alive():
+                return self._warm_up_thread
+            self._warm_up_thread = threading.Thread(target=_load, name='resource-warm-up',
+                                                    daemon=True)
+            self._warm_up_thread.start()
+            return self._warm_up_thread
+
+
+# Process-wide registry shared by the app, recommenders and EDA.
+registry = ResourceRegistry()
+
+registry.register('movies', lambda: load_movies(MOVIES_PATH),
+                  version=lambda: source_fingerprint((MOVIES_PATH,)))
+registry.register('ratings', lambda: load_ratings(RATINGS_PATH, columns=['userId', 'movieId', 'rating']))
+registry.register('catalog', lambda: CatalogIndex.from_movies(registry.get('movies')),
+                  version=lambda: source_fingerprint((MOVIES_PATH,)))
+# Genre -> bit assignment shared by the recommenders' genre masks
+registry.register('genre_vocabulary', lambda: GenreVocabulary.from_genres(registry.get('movies')['genres']),
+                  version=lambda: source_fingerprint((MOVIES_PATH,)))
+# Autocomplete over every title, ranked by number of ratings
+registry.register('title_search', lambda: get_title_search(registry.get('movies'),
+                                                           registry.get('ratings')['movieId'].to_numpy()))
@@ -0,0 +1,98 @@
+"""
+
+    Bounded cache of rendered images.
+
+    Author: Explore Data Science Academy.
+
+    Description: Word clouds and other images drawn for the app are
+    expensive to render and depend only on the data and the widget
+    selection. Rendered PNG bytes are kept in an LRU bounded by both entry
+    count and total size, keyed on the selection (e.g. tab, genre, year,
+    director) plus a data version, so repeated views of the same
+    selection skip rendering entirely. The cache lives in this module so
+    it survives Streamlit's script reruns.
+
+"""
+# Script dependencies
+import io
+import threading
+from collections import OrderedDict
+
+
+def png_bytes(image):
+    """Encode a PIL image as PNG bytes."""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class RenderCache:
+    """LRU of rendered PNG bytes.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of images kept.
+    max_bytes : int
+        Maximum total size of the kept images.
+
+    """
+
+    def __init__(self, maxsize=64, max_bytes=64 << 20):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key, render):
+        """Cached image for `key`, rendering it with `render()` on a miss.
+
+        Parameters
+        ----------
+        key : hashable
+            Selection and data version the image depends on.
+        render : callable
+            Returns PNG bytes, or `None` when there is nothing to draw.
+
+        Returns
+        -------
+        bytes or None
+            PNG bytes of the image.
+
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        # Rendering happens outside the lock; a concurrent miss on the
+        # same key just renders twice.
+        value = render()
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = value
+                self._bytes += len(value or b'')
+                while self._entries and (len(self._entries) > self.maxsize
+                                         or self._bytes > self.max_bytes):
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted or b'')
+        return value
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries),
+                    'bytes': self._bytes, 'maxsize': self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# Process-wide cache shared by every session of the app.
+render_cache = RenderCache()
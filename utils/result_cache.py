@@ -0,0 +1,240 @@
+"""
+
+    Recommendation result cache.
+
+    Author: Explore Data Science Academy.
+
+    Description: Popular favourite combinations are requested over and
+    over. Results are cached on (algorithm, favourites as an unordered
+    set, top_n, data version) in a bounded in-memory LRU, optionally
+    backed by an SQLite file that survives restarts. The data version is
+    derived from the movies/ratings files and the model artifacts, so any
+    change to them invalidates every cached result. Concurrent misses on
+    the same key are computed once: later callers wait for the first one
+    (e.g. a request arriving while speculative work for it is running).
+
+"""
+# Script dependencies
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+
+from utils.data_loader import MOVIES_PATH, RATINGS_PATH, file_digest
+from utils.instrumentation import stage
+
+MODEL_SOURCES = ('resources/models/SVD.pkl', 'resources/models/svd_bundle/meta.json')
+
+
+def data_version(data_paths=(MOVIES_PATH, RATINGS_PATH), model_paths=MODEL_SOURCES):
+    """Version string for the current data files and model artifacts.
+
+    Data files contribute their (memoised) content hash, model artifacts
+    their size and modification time. Missing files are skipped.
+
+    """
+    parts = []
+    for path in data_paths:
+        if os.path.exists(path):
+            parts.append(file_digest(path))
+    for path in model_paths:
+        try:
+            info = os.stat(path)
+            parts.append(f"{info.st_size}:{info.st_mtime_ns}")
+        except OSError:
+            parts.append('-')
+    return hashlib.blake2b('|'.join(parts).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def make_key(algorithm, movie_list, top_n, version):
+    """Cache key; the order of the favourites does not matter."""
+    favourites = '\x1f'.join(sorted(str(title) for title in movie_list))
+    return f"{algorithm}\x1e{top_n}\x1e{version}\x1e{favourites}"
+
+
+class RecommendationCache:
+    """Bounded LRU of recommendation lists with an optional disk tier.
+
+    Parameters
+    ----------
+    maxsize : int
+        Entries kept in memory.
+    disk_path : str, optional
+        SQLite file used as a second tier, `None` for memory only.
+
+    """
+
+    def __init__(self, maxsize=1024, disk_path=None):
+        self.maxsize = maxsize
+        self.disk_path = disk_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._pending = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self._db = None
+        if disk_path is not None:
+            directory = os.path.dirname(disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS results '
+                             '(key TEXT PRIMARY KEY, version TEXT, value TEXT, created REAL)')
+            self._db.commit()
+
+    def _check_version(self, version):
+        # Drop everything computed against older data or models.
+        if version == self._version:
+            return
+        self._entries.clear()
+        if self._db is not None:
+            self._db.execute('DELETE FROM results WHERE version != ?', (version,))
+            self._db.commit()
+        self._version = version
+
+    def get(self, key, version):
+        """Cached value for `key`, or `None` on a miss."""
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            if self._db is not None:
+                row = self._db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._store(key, value)
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key, value, version):
+        """Store `value` under `key` in memory and on disk."""
+        with self._lock:
+            self._check_version(version)
+            self._store(key, value)
+            if self._db is not None:
+                self._db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                                 (key, version, json.dumps(value), time.time()))
+                self._db.commit()
+
+    def get_or_compute(self, algorithm, movie_list, top_n, compute):
+        """Return cached recommendations, computing them on a miss.
+
+        Parameters
+        ----------
+        algorithm : str
+            Name of the recommender, part of the key.
+        movie_list : list (str)
+            Favourite movies.
+        top_n : int
+            Number of recommendations.
+        compute : callable
+            Called as `compute(movie_list, top_n)` on a miss.
+
+        Returns
+        -------
+        list (str)
+            Recommended titles (a fresh list on every call).
+
+        """
+        version = data_version()
+        key = make_key(algorithm, movie_list, top_n, version)
+        value = self.get(key, version)
+        if value is not None:
+            return list(value)
+        with self._lock:
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = threading.Event()
+            else:
+                self.coalesced += 1
+        if not owner:
+            # Wait for the computation already in flight; if it failed,
+            # compute here and let the error surface to this caller.
+            pending.wait()
+            with self._lock:
+                value = self._entries.get(key)
+            if value is not None:
+                return list(value)
+            value = list(compute(movie_list, top_n))
+            self.put(key, value, version)
+            return list(value)
+        try:
+            value = list(compute(movie_list, top_n))
+            self.put(key, value, version)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.set()
+        return list(value)
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'coalesced': self.coalesced,
+                    'size': len(self._entries),
+                    'maxsize': self.maxsize}
+
+    def clear(self):
+        """Drop every cached entry, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM results')
+                self._db.commit()
+
+
+# Process-wide cache; set RECOMMENDER_RESULT_CACHE to a file path to
+# persist results across restarts.
+recommendation_cache = RecommendationCache(
+    maxsize=int(os.environ.get('RECOMMENDER_RESULT_CACHE_SIZE', '1024')),
+    disk_path=os.environ.get('RECOMMENDER_RESULT_CACHE') or None)
+
+
+def cached_model(algorithm, model, cache=None):
+    """Wrap a `model(movie_list, top_n=10)` function with the result cache.
+
+    Parameters
+    ----------
+    algorithm : str
+        Name of the recommender, part of the cache key.
+    model : callable
+        `collab_model` or `content_model`.
+    cache : RecommendationCache, optional
+        Cache to use, the process-wide one by default.
+
+    Returns
+    -------
+    callable
+        Function with the same signature as `model`.
+
+    """
+    cache = recommendation_cache if cache is None else cache
+
+    @functools.wraps(model)
+    def wrapper(movie_list, top_n=10):
+        with stage(f"recommend:{algorithm}"):
+            return cache.get_or_compute(algorithm, movie_list, top_n,
+                                        lambda movies, n: model(movies, n))
+    wrapper.cache = cache
+    return wrapper
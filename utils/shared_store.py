@@ -0,0 +1,298 @@
+"""
+
+    Host-wide store of read-only numeric arrays shared between processes.
+
+    Author: Explore Data Science Academy.
+
+    Description: Several Streamlit (or service) processes on one host
+    derive the same arrays from the same data files. The store publishes
+    each group of arrays once, as `.npy` files in a segment directory on
+    a memory-backed filesystem (/dev/shm where available), and every
+    process attaches them with read-only memory maps, so the pages exist
+    once per host however many processes use them.
+
+    A segment is identified by a name and a data version (e.g. the
+    source file's content hash). The first process to ask for a missing
+    segment builds it under a file lock while the others wait, then it
+    is renamed into place atomically. Each attaching process holds a
+    reference (a file named after its pid in the segment's `refs/`);
+    references of processes that have died are ignored, and a segment
+    of an outdated version (one published before the current version)
+    is deleted once nothing references it. Publishing, attaching and
+    collecting a name all happen under the same per-name file lock.
+
+    Switches (environment):
+        RECOMMENDER_SHARED_DIR=<path>  where segments live
+
+"""
+# Script dependencies
+import os
+import json
+import atexit
+import shutil
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent builders just race to the rename
+    fcntl = None
+
+DEFAULT_ROOT = ('/dev/shm/movie-recommender' if os.path.isdir('/dev/shm')
+                else 'resources/cache/shared')
+SEGMENT_META = 'segment.json'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def save_arrays(directory, arrays):
+    """Write a dict of arrays as `.npy` files, a helper for builders."""
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(array))
+
+
+class Segment:
+    """Arrays of one published segment, memory-mapped read-only.
+
+    Attributes
+    ----------
+    name, version : str
+        Identity of the segment.
+    path : str
+        Segment directory (for loaders with their own file layout).
+    meta : dict
+        Whatever the builder returned.
+    arrays : dict
+        Every `.npy` file in the segment, by file stem.
+
+    """
+
+    def __init__(self, name, version, path, meta):
+        self.name = name
+        self.version = version
+        self.path = path
+        self.meta = meta
+        self.arrays = {entry[:-4]: np.load(os.path.join(path, entry), mmap_mode='r')
+                       for entry in sorted(os.listdir(path)) if entry.endswith('.npy')}
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+
+class SharedStore:
+    """Publishes and attaches array segments under one root directory.
+
+    Parameters
+    ----------
+    root : str
+        Directory holding the segments, ideally on tmpfs.
+
+    """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+        self._attached = {}
+        self._lock = threading.Lock()
+        atexit.register(self.release_all)
+
+    def _path(self, name, version):
+        return os.path.join(self.root, f"{name}-{version}")
+
+    def _ref_path(self, name, version):
+        return os.path.join(self._path(name, version), 'refs', str(os.getpid()))
+
+    def get(self, name, version, build):
+        """Attach a segment, building and publishing it if it is missing.
+
+        Parameters
+        ----------
+        name : str
+            Segment name, e.g. 'content_index'.
+        version : str
+            Version of the data the arrays derive from.
+        build : callable
+            `build(directory)` writes the `.npy` files into an empty
+            directory and may return a JSON-serialisable meta dict.
+
+        Returns
+        -------
+        Segment
+            The attached segment; this process holds a reference to it
+            until `release` (or exit).
+
+        """
+        key = (name, version)
+        with self._lock:
+            if key in self._attached:
+                return self._attached[key]
+            path = self._path(name, version)
+            # The reference is written under the name lock, so `collect`
+            # never sees a published segment without it
+            with self._name_lock(name):
+                if not os.path.exists(os.path.join(path, SEGMENT_META)):
+                    self._publish(name, version, build)
+                with open(os.path.join(path, SEGMENT_META)) as f:
+                    meta = json.load(f)
+                os.makedirs(os.path.dirname(self._ref_path(name, version)), exist_ok=True)
+                with open(self._ref_path(name, version), 'w'):
+                    pass
+            segment = Segment(name, version, path, meta)
+            self._attached[key] = segment
+        self.collect(name, keep=version)
+        return segment
+
+    @contextmanager
+    def _name_lock(self, name):
+        """Exclusive lock on every segment of `name`, across processes."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, f".{name}.lock"), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _publish(self, name, version, build):
+        # Called with the name lock held
+        path = self._path(name, version)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        try:
+            meta = build(tmp_path) or {}
+            with open(os.path.join(tmp_path, SEGMENT_META), 'w') as f:
+                json.dump(meta, f)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    def _published_ns(self, name, version):
+        try:
+            return os.stat(os.path.join(self._path(name, version), SEGMENT_META)).st_mtime_ns
+        except OSError:
+            return None
+
+    def refcount(self, name, version):
+        """Number of live processes attached to a segment."""
+        refs = os.path.join(self._path(name, version), 'refs')
+        try:
+            pids = os.listdir(refs)
+        except FileNotFoundError:
+            return 0
+        count = 0
+        for pid in pids:
+            if pid.isdigit() and _alive(int(pid)):
+                count += 1
+            else:
+                # Left behind by a process that died without releasing
+                try:
+                    os.remove(os.path.join(refs, pid))
+                except OSError:
+                    pass
+        return count
+
+    def release(self, name, version):
+        """Drop this process's reference to a segment."""
+        with self._lock:
+            self._attached.pop((name, version), None)
+        try:
+            os.remove(self._ref_path(name, version))
+        except OSError:
+            pass
+
+    def release_all(self):
+        for name, version in list(self._attached):
+            self.release(name, version)
+
+    def collect(self, name=None, keep=None):
+        """Delete unreferenced segments older than the current version.
+
+        Only versions published before `keep` (or, without `keep`, before
+        the newest version of their name) are candidates, so a version
+        that another process has just published is never removed. Each
+        name is collected under the same lock its segments are published
+        and attached under.
+
+        Parameters
+        ----------
+        name : str, optional
+            Only consider segments of this name.
+        keep : str, optional
+            Current version; it and every newer version are kept.
+
+        Returns
+        -------
+        list (str)
+            Directories deleted.
+
+        """
+        versions = {}
+        for segment_name, version in self._segment_ids():
+            if name is None or segment_name == name:
+                versions.setdefault(segment_name, []).append(version)
+        removed = []
+        for segment_name, names_versions in versions.items():
+            with self._name_lock(segment_name):
+                published = {version: self._published_ns(segment_name, version)
+                             for version in names_versions}
+                published = {version: ns for version, ns in published.items() if ns is not None}
+                if keep is not None and name is not None:
+                    cutoff = self._published_ns(segment_name, keep)
+                else:
+                    cutoff = max(published.values(), default=None)
+                if cutoff is None:
+                    continue
+                for version, published_ns in published.items():
+                    if published_ns >= cutoff or (segment_name, version) in self._attached:
+                        continue
+                    if self.refcount(segment_name, version) == 0:
+                        path = self._path(segment_name, version)
+                        shutil.rmtree(path, ignore_errors=True)
+                        removed.append(path)
+        return removed
+
+    def _segment_ids(self):
+        try:
+            entries = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        ids = []
+        for entry in entries:
+            if entry.startswith('.') or '.tmp' in entry:
+                continue
+            if not os.path.exists(os.path.join(self.root, entry, SEGMENT_META)):
+                continue
+            name, _, version = entry.rpartition('-')
+            ids.append((name, version))
+        return ids
+
+    def segments(self):
+        """Name, version, size and reference count of every segment."""
+        rows = []
+        for name, version in sorted(self._segment_ids()):
+            path = self._path(name, version)
+            size = sum(os.path.getsize(os.path.join(path, entry)) for entry in os.listdir(path)
+                       if entry.endswith('.npy'))
+            rows.append({'name': name, 'version': version, 'mb': size / (1 << 20),
+                         'refs': self.refcount(name, version),
+                         'attached_here': (name, version) in self._attached})
+        return rows
+
+
+# Process-wide store; every process on the host pointing at the same
+# root shares its segments.
+shared_store = SharedStore(os.environ.get('RECOMMENDER_SHARED_DIR') or DEFAULT_ROOT)
@@ -0,0 +1,150 @@
+"""
+
+    Speculative background computation of recommendations.
+
+    Author: Explore Data Science Academy.
+
+    Description: As soon as a session's favourite selection changes, the
+    recommendations of every algorithm for it are started on a shared
+    background pool, in parallel. Work for a selection the session has
+    since moved away from is cancelled: queued tasks never start, and a
+    cancelled task that is already running is not waited for. Models are
+    expected to be wrapped by the result cache, so a finished speculative
+    result (or one still in flight) is picked up by the real request.
+
+    Streamlit reruns the app script on every interaction, so the app
+    uses the process-wide `speculator` below rather than its own
+    instance: the pool, each session's latest job (which is what gets
+    cancelled) and the counters must outlive a rerun.
+
+"""
+# Script dependencies
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _Job:
+    """Speculative work for one session's selection."""
+
+    def __init__(self, key):
+        self.key = key
+        self.futures = {}
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self.futures.values():
+            future.cancel()
+
+
+class Speculator:
+    """Runs recommendation models ahead of the user's request.
+
+    Parameters
+    ----------
+    models : dict, optional
+        Algorithm name -> `model(movie_list, top_n)`; more can be added
+        with `register`.
+    max_workers : int
+        Background threads shared by every session.
+    max_sessions : int
+        Sessions whose latest job is tracked (least recent dropped).
+
+    """
+
+    def __init__(self, models=None, max_workers=4, max_sessions=256):
+        self.models = dict(models or {})
+        self.max_sessions = max_sessions
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='speculate')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.started = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.failed = 0
+
+    def register(self, name, model, replace=False):
+        """Add a model to speculate on.
+
+        Parameters
+        ----------
+        name : str
+            Algorithm name.
+        model : callable
+            `model(movie_list, top_n)`, wrapped by the result cache.
+        replace : bool
+            Replace a model already registered under `name`; by default
+            the first registration (e.g. from the app's first run) wins.
+
+        """
+        with self._lock:
+            if name not in self.models or replace:
+                self.models[name] = model
+
+    def _run(self, job, model, movie_list, top_n):
+        if job.cancelled.is_set():
+            return None
+        try:
+            result = model(movie_list, top_n)
+        except Exception:
+            # The real request will raise (and report) the same error.
+            with self._lock:
+                self.failed += 1
+            return None
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def speculate(self, session, movie_list, top_n=10):
+        """Start computing recommendations for a session's selection.
+
+        Does nothing when the selection is unchanged; otherwise the
+        session's previous job is cancelled first.
+
+        Parameters
+        ----------
+        session : hashable
+            Identifies the browser session.
+        movie_list : list (str)
+            The currently selected favourites.
+        top_n : int
+            Number of recommendations the request will ask for.
+
+        Returns
+        -------
+        dict
+            Algorithm name -> Future of its recommendations.
+
+        """
+        key = (tuple(movie_list), top_n)
+        with self._lock:
+            job = self._jobs.get(session)
+            if job is not None and job.key == key:
+                self._jobs.move_to_end(session)
+                return dict(job.futures)
+            if job is not None:
+                job.cancel()
+                self.cancelled += 1
+            job = _Job(key)
+            for name, model in self.models.items():
+                job.futures[name] = self._pool.submit(self._run, job, model, list(movie_list),
+                                                      top_n)
+            self.started += 1
+            self._jobs[session] = job
+            self._jobs.move_to_end(session)
+            while len(self._jobs) > self.max_sessions:
+                self._jobs.popitem(last=False)
+            return dict(job.futures)
+
+    def stats(self):
+        """Counts of started, cancelled, completed and failed work."""
+        with self._lock:
+            return {'jobs_started': self.started, 'jobs_cancelled': self.cancelled,
+                    'tasks_completed': self.completed, 'tasks_failed': self.failed,
+                    'sessions': len(self._jobs)}
+
+
+# Process-wide speculator shared by every session and every rerun of the
+# app script.
+speculator = Speculator()
@@ -0,0 +1,249 @@
+"""
+
+    Title search / autocomplete index.
+
+    Author: Explore Data Science Academy.
+
+    Description: Lets users find any movie in the catalogue by typing a
+    few characters instead of scrolling a list of 62k titles. Titles are
+    normalised (case, accents, punctuation, and MovieLens' trailing
+    article, so "Matrix, The (1999)" is also found as "the matrix") and
+    indexed twice:
+
+    - word prefixes: the sorted word vocabulary acts as a compact trie;
+      every word starting with a prefix is one contiguous range, and the
+      titles containing those words are one contiguous slice of the
+      postings. Every query word must prefix a word of the title.
+    - character trigrams: for misspelt queries, titles are scored by the
+      Dice overlap of their trigrams with the query's.
+
+    Prefix matches come first, most rated first; fuzzy matches fill up
+    the remaining places. All index arrays are plain numpy arrays,
+    published once per host through `utils.shared_store`.
+
+"""
+# Script dependencies
+import re
+import threading
+import unicodedata
+import numpy as np
+
+from utils.data_loader import MOVIES_PATH, RATINGS_PATH, file_digest
+from utils.shared_store import save_arrays, shared_store
+
+_ARTICLE = re.compile(r'^(?P<title>.*), (?P<article>the|a|an|les|la|le|l\'|il|der|die|das)'
+                      r'(?P<rest>\s*(\(.*)?)$', re.IGNORECASE)
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+# Fuzzy matches need at least this Dice similarity to the query
+MIN_FUZZY_SCORE = 0.3
+# Layout of the shared index arrays; bumped when `build_arrays` changes
+ARRAYS_VERSION = 2
+
+
+def normalise(text):
+    """Lowercase ASCII words of `text`, separated by single spaces."""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = text.encode('ascii', 'ignore').decode('ascii').lower()
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def search_keys(title):
+    """Normalised forms a title can be found by (with the article moved
+    to the front for titles like "Matrix, The (1999)")."""
+    keys = [normalise(title)]
+    match = _ARTICLE.match(str(title))
+    if match:
+        keys.append(normalise(f"{match['article']} {match['title']}{match['rest']}"))
+    return keys
+
+
+def trigrams(key):
+    """Distinct character trigrams of a normalised string, padded."""
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _postings(keys, rows):
+    """Sorted vocabulary plus CSR postings (rows per key) of key/row pairs."""
+    keys = np.array(keys, dtype=str)
+    rows = np.array(rows, dtype=np.int32)
+    order = np.lexsort((rows, keys))
+    keys, rows = keys[order], rows[order]
+    vocabulary, starts = np.unique(keys, return_index=True)
+    indptr = np.append(starts, keys.shape[0]).astype(np.int64)
+    return vocabulary, indptr, rows
+
+
+def build_arrays(titles, popularity):
+    """Index arrays for a list of titles.
+
+    Parameters
+    ----------
+    titles : list (str)
+        Titles to index; results refer to positions in this list.
+    popularity : np.ndarray
+        Number of ratings of each title.
+
+    Returns
+    -------
+    dict
+        Arrays of a `TitleSearchIndex`.
+
+    """
+    word_keys, word_rows, gram_keys, gram_rows = [], [], [], []
+    gram_counts = np.zeros(len(titles), dtype=np.int32)
+    for row, title in enumerate(titles):
+        words, grams = set(), set()
+        for key in search_keys(title):
+            words.update(key.split())
+            grams.update(trigrams(key))
+        word_keys.extend(words)
+        word_rows.extend([row] * len(words))
+        gram_keys.extend(grams)
+        gram_rows.extend([row] * len(grams))
+        # Postings hold the trigrams of every key, so the Dice
+        # denominator counts the same set and scores stay within [0, 1]
+        gram_counts[row] = len(grams)
+    words, word_indptr, word_postings = _postings(word_keys, word_rows)
+    grams, gram_indptr, gram_postings = _postings(gram_keys, gram_rows)
+    return {'words': words, 'word_indptr': word_indptr, 'word_postings': word_postings,
+            'grams': grams, 'gram_indptr': gram_indptr, 'gram_postings': gram_postings,
+            'gram_counts': gram_counts,
+            'popularity': np.asarray(popularity, dtype=np.int64)}
+
+
+class TitleSearchIndex:
+    """Ranked prefix and fuzzy title search.
+
+    Parameters
+    ----------
+    titles : array-like (str)
+        Indexed titles, in the order `build_arrays` saw them.
+    arrays : dict
+        Output of `build_arrays` (possibly memory-mapped).
+
+    """
+
+    def __init__(self, titles, arrays):
+        self.titles = np.asarray(titles, dtype=object)
+        self.words = arrays['words']
+        self.word_indptr = arrays['word_indptr']
+        self.word_postings = arrays['word_postings']
+        self.grams = arrays['grams']
+        self.gram_indptr = arrays['gram_indptr']
+        self.gram_postings = arrays['gram_postings']
+        self.gram_counts = arrays['gram_counts']
+        self.popularity = arrays['popularity']
+        # Title length breaks popularity ties, shorter (closer) first
+        self._lengths = np.array([len(title) for title in self.titles], dtype=np.int32)
+
+    @classmethod
+    def from_titles(cls, titles, popularity):
+        return cls(titles, build_arrays(titles, popularity))
+
+    def __len__(self):
+        return self.titles.shape[0]
+
+    def _ranked(self, rows):
+        order = np.lexsort((self._lengths[rows], -self.popularity[rows]))
+        return rows[order]
+
+    def prefix_rows(self, query):
+        """Rows whose words are prefixed by every word of the query,
+        most popular first."""
+        rows = None
+        for token in normalise(query).split():
+            lo = np.searchsorted(self.words, token, side='left')
+            hi = np.searchsorted(self.words, token + '\uffff', side='left')
+            matches = np.unique(self.word_postings[self.word_indptr[lo]:self.word_indptr[hi]])
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+            if rows.shape[0] == 0:
+                break
+        if rows is None:
+            return np.empty(0, dtype=np.int32)
+        return self._ranked(rows)
+
+    def fuzzy_rows(self, query, limit=10, min_score=MIN_FUZZY_SCORE):
+        """Rows most similar to the query by trigram overlap."""
+        grams = np.array(sorted(trigrams(normalise(query))), dtype=str)
+        positions = np.searchsorted(self.grams, grams)
+        found = positions < self.grams.shape[0]
+        found[found] = self.grams[positions[found]] == grams[found]
+        if not found.any():
+            return np.empty(0, dtype=np.int32)
+        postings = np.concatenate([self.gram_postings[self.gram_indptr[p]:self.gram_indptr[p + 1]]
+                                   for p in positions[found]])
+        shared = np.bincount(postings, minlength=len(self))
+        scores = 2 * shared / (grams.shape[0] + self.gram_counts)
+        candidates = np.flatnonzero(scores >= min_score)
+        order = np.lexsort((-self.popularity[candidates], -scores[candidates]))
+        return candidates[order[:limit]]
+
+    def search(self, query, limit=10):
+        """Best matching titles for a (partial) query.
+
+        Parameters
+        ----------
+        query : str
+            Text typed so far.
+        limit : int
+            Number of titles to return.
+
+        Returns
+        -------
+        list (str)
+            Prefix matches (most rated first), then fuzzy matches.
+
+        """
+        if not normalise(query):
+            return []
+        rows = list(self.prefix_rows(query)[:limit])
+        if len(rows) < limit:
+            seen = set(rows)
+            for row in self.fuzzy_rows(query, limit=limit):
+                if row not in seen:
+                    rows.append(row)
+                    if len(rows) == limit:
+                        break
+        return [self.titles[row] for row in rows]
+
+
+_lock = threading.Lock()
+_indexes = {}
+
+
+def get_title_search(movies_df, rated_movie_ids, path_to_movies=MOVIES_PATH,
+                     path_to_ratings=RATINGS_PATH):
+    """Return the process-wide title search index, building it on first use.
+
+    Parameters
+    ----------
+    movies_df : pd.DataFrame
+        Movies with `movieId` and `title` columns.
+    rated_movie_ids : np.ndarray
+        movieId of every rating, for popularity.
+    path_to_movies, path_to_ratings : str
+        Files the index derives from (they version the shared arrays).
+
+    Returns
+    -------
+    TitleSearchIndex
+        Shared title search index.
+
+    """
+    movies_df = movies_df.dropna(subset=['title'])
+    titles = movies_df['title'].to_list()
+    version = (f"{ARRAYS_VERSION}-{file_digest(path_to_movies)[:16]}"
+               f"{file_digest(path_to_ratings)[:16]}")
+    with _lock:
+        index = _indexes.get(version)
+        if index is None:
+            def build(directory):
+                movie_ids = movies_df['movieId'].to_numpy().astype(np.int64)
+                counts = np.bincount(np.asarray(rated_movie_ids, dtype=np.int64),
+                                     minlength=int(movie_ids.max()) + 1)
+                save_arrays(directory, build_arrays(titles, counts[movie_ids]))
+
+            segment = shared_store.get('title_search', version, build)
+            index = _indexes[version] = TitleSearchIndex(titles, segment.arrays)
+    return index